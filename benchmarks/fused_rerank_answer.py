@@ -0,0 +1,167 @@
+"""Compare time to first token and token usage of the two-call and fused graphs.
+
+Runs each question through the default graph (`rerank` then `answer`) and the
+fused graph (`rerank_answer`, see `FUSED_RERANK_ANSWER`), alternating between
+them, and prints per run:
+
+- `sidebar`: seconds until the relevant trials are known (the `rerank` update, or
+  the header of the fused reply);
+- `ttft`: seconds until the first answer token, both measured from the request;
+- `total`: seconds until the graph finished;
+- `in` / `out`: input and output tokens of the rerank and answer calls.
+
+Retrieval runs in both modes, so its time is included in the latencies but its
+tokens are not counted.
+
+Usage:
+    poetry run python benchmarks/fused_rerank_answer.py [--repeat 3]
+
+Requires `OPENAI_API_KEY`.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from functools import cache
+from typing import Any
+from uuid import UUID
+
+from langchain.chat_models import init_chat_model
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from langchain_core.outputs import LLMResult
+
+from clinical_trials_assistant import nodes
+from clinical_trials_assistant.deadline import new_deadline
+from clinical_trials_assistant.streaming import RelevantTrialsHeader
+
+QUESTIONS = [
+    "What is the effect of ibuprofen ± caffeine for back pain treatment?",
+    "Does metformin reduce HbA1c in adolescents with type 2 diabetes?",
+    "Which trials compared semaglutide and placebo for weight loss?",
+    "Is melatonin effective for insomnia in older adults?",
+    "What adverse events were reported for pembrolizumab in melanoma?",
+]
+COUNTED_NODES = {"rerank", "answer", "rerank_answer"}
+
+
+class NodeUsageHandler(BaseCallbackHandler):
+    """Sums the token usage of chat model calls made by the counted nodes."""
+
+    def __init__(self) -> None:
+        self._nodes: dict[UUID, str | None] = {}
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list,
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self._nodes[run_id] = (metadata or {}).get("langgraph_node")
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        if self._nodes.pop(run_id, None) not in COUNTED_NODES:
+            return
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(generation, "message", None)
+                usage = getattr(usage, "usage_metadata", None) or {}
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+
+
+async def run(graph: Any, question: str) -> dict[str, float]:
+    usage = NodeUsageHandler()
+    header = RelevantTrialsHeader()
+    state = nodes.State(
+        messages=[HumanMessage(question)],
+        is_valid_request=None,
+        retrieved_trials=None,
+        top_reranked_results_ids=None,
+        needs_additional_trials=None,
+        new_trial_ids=None,
+        deadline=new_deadline(),
+    )
+    started_at = time.perf_counter()
+    sidebar = ttft = None
+
+    async for mode, data in graph.astream(
+        state, {"callbacks": [usage]}, stream_mode=["updates", "messages"]
+    ):
+        elapsed = time.perf_counter() - started_at
+        if mode == "updates":
+            if "rerank" in data:
+                sidebar = elapsed
+            continue
+        token, metadata = data
+        if not isinstance(token, AIMessageChunk):
+            continue
+        node = metadata["langgraph_node"]
+        content = token.content if node == "answer" else ""
+        if node == "rerank_answer":
+            content = header.feed(token.content)
+            if header.complete and sidebar is None:
+                sidebar = elapsed
+        if content and ttft is None:
+            ttft = elapsed
+
+    total = time.perf_counter() - started_at
+    return {
+        "sidebar": sidebar if sidebar is not None else float("nan"),
+        "ttft": ttft if ttft is not None else float("nan"),
+        "total": total,
+        "in": usage.input_tokens,
+        "out": usage.output_tokens,
+    }
+
+
+async def benchmark(repeat: int) -> None:
+    # Streamed completions only report their token usage when asked to.
+    nodes.get_chat_model = cache(
+        lambda model: init_chat_model(model, stream_usage=True)
+    )
+    graphs = {"two-call": nodes.build_graph(), "fused": nodes.build_graph(fused=True)}
+    results: dict[str, list[dict[str, float]]] = {mode: [] for mode in graphs}
+
+    columns = ["sidebar", "ttft", "total", "in", "out"]
+    print(f"{'#':>2}  {'mode':<8}  " + "  ".join(f"{c:>7}" for c in columns))
+    for i, question in enumerate(QUESTIONS, start=1):
+        for _ in range(repeat):
+            for mode, graph in graphs.items():
+                result = await run(graph, question)
+                results[mode].append(result)
+                print(
+                    f"{i:>2}  {mode:<8}  "
+                    + "  ".join(f"{result[c]:>7.2f}" for c in columns[:3])
+                    + "  "
+                    + "  ".join(f"{result[c]:>7}" for c in columns[3:])
+                )
+
+    print("\nMedians:")
+    for mode, runs in results.items():
+        medians = {c: statistics.median(r[c] for r in runs) for c in columns}
+        print(
+            f"{mode:<8}  sidebar {medians['sidebar']:.2f}s  ttft {medians['ttft']:.2f}s"
+            f"  total {medians['total']:.2f}s"
+            f"  tokens {medians['in'] + medians['out']:.0f}"
+            f" ({medians['in']:.0f} in, {medians['out']:.0f} out)"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Runs per question and mode."
+    )
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
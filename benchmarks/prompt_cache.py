@@ -0,0 +1,50 @@
+"""Report how many input tokens are served from the provider's prompt cache.
+
+Sends the `retrieve` prompt for a series of different questions and prints the
+cached-token ratio of each call. The first call warms the cache; later calls
+should read the static Essie guide from it.
+
+Usage:
+    poetry run python benchmarks/prompt_cache.py [--model openai:gpt-4.1]
+
+Requires `OPENAI_API_KEY`.
+"""
+
+import argparse
+
+from langchain.chat_models import init_chat_model
+
+from clinical_trials_assistant.prompts import retrieve_prompt
+from clinical_trials_assistant.retrieval import RETRIEVAL_QUERY_COUNT
+
+QUESTIONS = [
+    "What is the effect of ibuprofen ± caffeine for back pain treatment?",
+    "Does metformin reduce HbA1c in adolescents with type 2 diabetes?",
+    "Which trials compared semaglutide and placebo for weight loss?",
+    "Is melatonin effective for insomnia in older adults?",
+    "What adverse events were reported for pembrolizumab in melanoma?",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="openai:gpt-4.1")
+    args = parser.parse_args()
+
+    chain = retrieve_prompt(RETRIEVAL_QUERY_COUNT) | init_chat_model(args.model)
+    total_input = total_cached = 0
+
+    print(f"{'#':>2}  {'input':>6}  {'cached':>6}  {'ratio':>6}")
+    for i, question in enumerate(QUESTIONS, start=1):
+        usage = chain.invoke({"message": question}).usage_metadata or {}
+        input_tokens = usage.get("input_tokens", 0)
+        cached = usage.get("input_token_details", {}).get("cache_read", 0)
+        total_input += input_tokens
+        total_cached += cached
+        print(f"{i:>2}  {input_tokens:>6}  {cached:>6}  {cached / input_tokens:>6.1%}")
+
+    print(f"Total cached-token ratio: {total_cached / total_input:.1%}")
+
+
+if __name__ == "__main__":
+    main()
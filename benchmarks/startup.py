@@ -0,0 +1,78 @@
+"""Measure cold start: import time per module and time to the first ready request.
+
+Runs the app in fresh interpreters, so results reflect a cold process (file
+system caches aside).
+
+Usage:
+    poetry run python benchmarks/startup.py [--top 15] [--port 8765]
+
+Requires `CHAINLIT_AUTH_SECRET` and `DATABASE_URL` like the app itself.
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+
+APP_MODULE = "clinical_trials_assistant.main"
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_times(top: int) -> None:
+    """Print the slowest imports, by cumulative time, two levels below the app."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {APP_MODULE}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if match := IMPORT_TIME_LINE.match(line):
+            _, cumulative, indent, module = match.groups()
+            depth = (len(indent) - 1) // 2
+            if depth <= 2:
+                rows.append((int(cumulative) / 1e6, depth, module))
+
+    print(f"{'cumulative [s]':>14}  module")
+    for seconds, depth, module in sorted(rows, reverse=True)[:top]:
+        print(f"{seconds:>14.3f}  {'  ' * depth}{module}")
+
+
+def time_to_first_request(port: int, timeout: float = 120) -> None:
+    """Start uvicorn and poll until the app answers its first request."""
+    started_at = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{APP_MODULE}:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started_at < timeout:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/app", timeout=1)
+                break
+            except OSError:
+                time.sleep(0.05)
+        else:
+            raise TimeoutError("Server did not become ready in time.")
+        print(f"Time to first ready request: {time.perf_counter() - started_at:.3f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    import_times(args.top)
+    time_to_first_request(args.port)
+
+
+if __name__ == "__main__":
+    main()
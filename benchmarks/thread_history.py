@@ -0,0 +1,141 @@
+"""Time the thread history sidebar and thread resume for a user with many threads.
+
+Seeds a SQLite database with one user owning `--threads` threads of a few steps
+each, plus one thread of `--long-steps` steps, then times listing the first page
+of threads, listing a later page, and resuming the long thread with Chainlit's
+`SQLAlchemyDataLayer` and with `PaginatedDataLayer`.
+
+Usage:
+    poetry run python benchmarks/thread_history.py [--threads 10000] [--no-indexes]
+"""
+
+import argparse
+import asyncio
+import re
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import sqlalchemy
+from chainlit.data.sql_alchemy import SQLAlchemyDataLayer
+from chainlit.types import Pagination, ThreadFilter
+
+from clinical_trials_assistant.persistence import PaginatedDataLayer
+
+DDL_PATH = Path(__file__).parent.parent / "scripts" / "ddl.sql"
+USER_ID = "00000000-0000-0000-0000-000000000001"
+LONG_THREAD_ID = "long"
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def seed(
+    url: str, threads: int, steps_per_thread: int, long_steps: int, indexes: bool
+) -> None:
+    """Create the schema and the threads and steps of a single user."""
+    with sqlalchemy.create_engine(url).begin() as conn:
+        for statement in re.split(r";\s*$", DDL_PATH.read_text(), flags=re.M):
+            if statement.strip() and (indexes or "CREATE INDEX" not in statement):
+                conn.execute(sqlalchemy.text(statement))
+        conn.execute(
+            sqlalchemy.text(
+                'INSERT INTO users ("id", "identifier", "createdAt", "metadata") '
+                "VALUES (:id, 'admin', '2025-01-01T00:00:00Z', '{}')"
+            ),
+            {"id": USER_ID},
+        )
+        thread_ids = [f"t{i:06d}" for i in range(threads)] + [LONG_THREAD_ID]
+        conn.execute(
+            sqlalchemy.text(
+                'INSERT INTO threads ("id", "createdAt", "name", "userId", '
+                "\"userIdentifier\") VALUES (:id, :createdAt, :id, :userId, 'admin')"
+            ),
+            [
+                {
+                    "id": thread_id,
+                    "createdAt": (START + timedelta(minutes=i)).isoformat(),
+                    "userId": USER_ID,
+                }
+                for i, thread_id in enumerate(thread_ids)
+            ],
+        )
+        steps = [
+            (thread_id, j)
+            for thread_id in thread_ids[:-1]
+            for j in range(steps_per_thread)
+        ] + [(LONG_THREAD_ID, j) for j in range(long_steps)]
+        conn.execute(
+            sqlalchemy.text(
+                'INSERT INTO steps ("id", "name", "type", "threadId", "streaming", '
+                '"output", "createdAt") VALUES (:id, \'Clinical Trial Assistant\', '
+                "'run', :threadId, false, :output, :createdAt)"
+            ),
+            [
+                {
+                    "id": f"{thread_id}-{j}",
+                    "threadId": thread_id,
+                    "output": f"Answer {j} about ibuprofen for back pain.",
+                    "createdAt": (START + timedelta(seconds=j)).isoformat(),
+                }
+                for thread_id, j in steps
+            ],
+        )
+
+
+async def timed(call, repeat: int) -> float:
+    """Median duration of `call()` in milliseconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+async def measure(layer: SQLAlchemyDataLayer, repeat: int) -> tuple[float, ...]:
+    filters = ThreadFilter(userId=USER_ID)
+    first = await layer.list_threads(Pagination(first=20), filters)
+    cursor = first.pageInfo.endCursor
+    return (
+        await timed(lambda: layer.list_threads(Pagination(first=20), filters), repeat),
+        await timed(
+            lambda: layer.list_threads(Pagination(first=20, cursor=cursor), filters),
+            repeat,
+        ),
+        await timed(lambda: layer.get_thread(LONG_THREAD_ID), repeat),
+    )
+
+
+async def benchmark(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{Path(directory) / 'db.sqlite'}"
+        seed(url, args.threads, args.steps, args.long_steps, not args.no_indexes)
+        conninfo = url.replace("sqlite:///", "sqlite+aiosqlite:///")
+
+        print(
+            f"{'data layer':<20}  {'first page':>10}  {'next page':>10}  {'resume':>10}"
+        )
+        for name, layer in [
+            ("SQLAlchemyDataLayer", SQLAlchemyDataLayer(conninfo=conninfo)),
+            ("PaginatedDataLayer", PaginatedDataLayer(conninfo=conninfo)),
+        ]:
+            row = await measure(layer, args.repeat)
+            print(f"{name:<20}" + "".join(f"  {ms:>8.1f}ms" for ms in row))
+            await layer.engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=10_000)
+    parser.add_argument("--steps", type=int, default=4, help="Steps per thread")
+    parser.add_argument("--long-steps", type=int, default=2_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--no-indexes", action="store_true", help="Skip the indexes of ddl.sql"
+    )
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+import os
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from clinical_trials_assistant.providers import ClinicalTrial
+
+# Replace raw outcome measures in the `answer` prompt with tables computed here.
+OUTCOME_TABLES = os.getenv("OUTCOME_TABLES", "true").lower() == "true"
+# Measures rendered as tables per trial, primary outcomes first; the outcomes of
+# the others are given to the model as raw data.
+MAX_MEASURES_PER_TRIAL = int(os.getenv("OUTCOME_TABLES_MAX_MEASURES", "10"))
+MAX_RANKED_DIFFERENCES = 10
+
+
+@dataclass
+class Measure:
+    """One outcome measure of a trial; a class or category of it counts as its own."""
+
+    nct_id: str
+    title: str
+    type: str
+    param_type: str
+    unit: str
+    time_frame: str
+    # Index of the outcome in the trial's `outcomeMeasures`.
+    outcome: int
+
+
+@dataclass
+class OutcomeData:
+    """Outcome measurements of several trials as parallel columns.
+
+    There is one row per reported group value; `measure` indexes `measures`.
+    Non-numeric values (e.g. "NA") are left out.
+    """
+
+    measures: list[Measure]
+    measure: np.ndarray
+    group: np.ndarray
+    value: np.ndarray
+    participants: np.ndarray
+
+
+@dataclass
+class OutcomeStats:
+    """Between-group comparison of each measure of an `OutcomeData`.
+
+    Per-measure arrays are indexed like `OutcomeData.measures`, and `highest` and
+    `lowest` hold row indices. `rank` is per row, 1 being the highest value of its
+    measure. Rows of measure `i` ordered by rank are
+    `order[start[i] : start[i] + group_count[i]]`. Whether higher is better depends
+    on the measure.
+    """
+
+    order: np.ndarray
+    start: np.ndarray
+    group_count: np.ndarray
+    highest: np.ndarray
+    lowest: np.ndarray
+    difference: np.ndarray
+    relative_difference: np.ndarray
+    rank: np.ndarray
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def extract_outcomes(trials: list[ClinicalTrial]) -> OutcomeData:
+    """Collect the `outcomeMeasures` of the trials' results sections into columns."""
+    measures: list[Measure] = []
+    measure_rows: list[int] = []
+    groups: list[str] = []
+    values: list[float] = []
+    participants: list[float] = []
+
+    for trial in trials:
+        outcome_measures = trial.results_section.get("outcomeMeasuresModule", {}).get(
+            "outcomeMeasures", []
+        )
+        for outcome_index, outcome in enumerate(outcome_measures):
+            group_titles = {
+                g["id"]: g.get("title", g["id"]) for g in outcome.get("groups", [])
+            }
+            denoms = outcome.get("denoms", [])
+            counts = {
+                count["groupId"]: _to_float(count.get("value"))
+                for count in (denoms[0].get("counts", []) if denoms else [])
+            }
+            for outcome_class in outcome.get("classes", []):
+                for category in outcome_class.get("categories", []):
+                    subtitle = " / ".join(
+                        t
+                        for t in (outcome_class.get("title"), category.get("title"))
+                        if t
+                    )
+                    measure_index = len(measures)
+                    measures.append(
+                        Measure(
+                            nct_id=trial.nct_id,
+                            title=f"{outcome.get('title', '')}"
+                            + (f" [{subtitle}]" if subtitle else ""),
+                            type=outcome.get("type", ""),
+                            param_type=outcome.get("paramType", ""),
+                            unit=outcome.get("unitOfMeasure", ""),
+                            time_frame=outcome.get("timeFrame", ""),
+                            outcome=outcome_index,
+                        )
+                    )
+                    for measurement in category.get("measurements", []):
+                        value = _to_float(measurement.get("value"))
+                        if np.isnan(value):
+                            continue
+                        group_id = measurement.get("groupId")
+                        measure_rows.append(measure_index)
+                        groups.append(group_titles.get(group_id, group_id))
+                        values.append(value)
+                        participants.append(counts.get(group_id, np.nan))
+
+    return OutcomeData(
+        measures=measures,
+        measure=np.array(measure_rows, dtype=np.int64),
+        group=np.array(groups, dtype=object),
+        value=np.array(values, dtype=np.float64),
+        participants=np.array(participants, dtype=np.float64),
+    )
+
+
+def compute_outcome_stats(data: OutcomeData) -> OutcomeStats:
+    """Rank groups and compute highest-lowest differences of every measure at once."""
+    measure_count = len(data.measures)
+    # Rows sorted by measure, then by descending value.
+    order = np.lexsort((-data.value, data.measure))
+    sorted_measure = data.measure[order]
+    starts = np.searchsorted(sorted_measure, np.arange(measure_count), side="left")
+    ends = np.searchsorted(sorted_measure, np.arange(measure_count), side="right")
+    group_count = ends - starts
+
+    has_values = group_count > 0
+    highest = np.full(measure_count, -1, dtype=np.int64)
+    lowest = np.full(measure_count, -1, dtype=np.int64)
+    highest[has_values] = order[starts[has_values]]
+    lowest[has_values] = order[ends[has_values] - 1]
+
+    difference = np.full(measure_count, np.nan)
+    difference[has_values] = (
+        data.value[highest[has_values]] - data.value[lowest[has_values]]
+    )
+    lowest_value = np.full(measure_count, np.nan)
+    lowest_value[has_values] = data.value[lowest[has_values]]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative_difference = np.where(
+            lowest_value != 0, difference / np.abs(lowest_value), np.nan
+        )
+
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - starts[sorted_measure] + 1
+
+    return OutcomeStats(
+        order=order,
+        start=starts,
+        group_count=group_count,
+        highest=highest,
+        lowest=lowest,
+        difference=difference,
+        relative_difference=relative_difference,
+        rank=rank,
+    )
+
+
+def _format_number(value: float) -> str:
+    return f"{value:.4g}"
+
+
+def _format_difference(stats: OutcomeStats, index: int) -> str:
+    difference = f"difference {_format_number(stats.difference[index])}"
+    if not np.isnan(stats.relative_difference[index]):
+        difference += f" ({stats.relative_difference[index]:+.1%} of lowest)"
+    return difference
+
+
+def _measure_heading(measure: Measure) -> str:
+    details = ", ".join(
+        d
+        for d in (measure.type, measure.param_type, measure.unit, measure.time_frame)
+        if d
+    )
+    return f"{measure.title} ({details})" if details else measure.title
+
+
+def _table_measures(
+    data: OutcomeData, stats: OutcomeStats, nct_id: str | None = None
+) -> list[int]:
+    """Indices of the measures rendered as tables: those with numeric values."""
+    indices = [
+        i
+        for i, measure in enumerate(data.measures)
+        if stats.group_count[i] > 0 and nct_id in (None, measure.nct_id)
+    ]
+    # `sorted` is stable: primary outcomes first, then in reported order.
+    indices = sorted(indices, key=lambda i: data.measures[i].type != "PRIMARY")
+    return indices[:MAX_MEASURES_PER_TRIAL]
+
+
+def render_outcome_tables(
+    data: OutcomeData, stats: OutcomeStats, nct_id: str | None = None
+) -> str:
+    """Render the ranked groups of each measure, optionally of a single trial."""
+    lines = []
+    for i in _table_measures(data, stats, nct_id):
+        lines.append(f"- {_measure_heading(data.measures[i])}")
+        start = stats.start[i]
+        for row in stats.order[start : start + stats.group_count[i]]:
+            participants = data.participants[row]
+            count = "" if np.isnan(participants) else f" (n={participants:.0f})"
+            lines.append(
+                f"  {stats.rank[row]}. {data.group[row]}: "
+                f"{_format_number(data.value[row])}{count}"
+            )
+        if stats.group_count[i] > 1:
+            lines.append(f"  {_format_difference(stats, i)}")
+    return "\n".join(lines)
+
+
+def render_ranked_differences(data: OutcomeData, stats: OutcomeStats) -> str:
+    """Rank measures of all trials by their relative between-group difference."""
+    candidates = np.flatnonzero(
+        (stats.group_count > 1) & ~np.isnan(stats.relative_difference)
+    )
+    ranked = candidates[
+        np.argsort(-stats.relative_difference[candidates], kind="stable")
+    ]
+
+    lines = []
+    for i in ranked[:MAX_RANKED_DIFFERENCES]:
+        measure = data.measures[i]
+        highest, lowest = stats.highest[i], stats.lowest[i]
+        lines.append(
+            f"- {measure.nct_id} | {_measure_heading(measure)}: "
+            f"{data.group[highest]} {_format_number(data.value[highest])} vs "
+            f"{data.group[lowest]} {_format_number(data.value[lowest])}, "
+            f"{_format_difference(stats, i)}"
+        )
+    return "\n".join(lines)
+
+
+def _results_without_tables(
+    trial: ClinicalTrial, data: OutcomeData, stats: OutcomeStats
+) -> dict[str, Any]:
+    """The trial's results section without the outcomes fully shown as tables."""
+    in_tables = set(_table_measures(data, stats, trial.nct_id))
+    shown: set[int] = set()
+    partly_shown: set[int] = set()
+    for i, measure in enumerate(data.measures):
+        if measure.nct_id == trial.nct_id:
+            (shown if i in in_tables else partly_shown).add(measure.outcome)
+
+    results = dict(trial.results_section)
+    module = results.pop("outcomeMeasuresModule", None) or {}
+    if other_outcomes := [
+        outcome
+        for index, outcome in enumerate(module.get("outcomeMeasures", []))
+        if index not in shown or index in partly_shown
+    ]:
+        results["outcomeMeasuresModule"] = {
+            **module,
+            "outcomeMeasures": other_outcomes,
+        }
+    return results
+
+
+def format_trials_with_outcome_tables(
+    trials: list[ClinicalTrial], with_other_results: bool = True
+) -> str:
+    """Render trials as `answer` context, with computed outcome tables.
+
+    Outcome measures are replaced by tables ranking the groups of each measure,
+    followed by the largest between-group differences across all trials. The rest
+    of each results section (e.g. adverse events) is included as is, with the
+    outcomes not fully shown as tables: those without numeric values, or beyond
+    `MAX_MEASURES_PER_TRIAL`.
+
+    Args:
+        trials (list[ClinicalTrial]): Trials to render.
+        with_other_results (bool): Whether to include the rest of the results
+            sections, which can be much larger than the tables.
+
+    Returns:
+        str: The rendered trials.
+    """
+    data = extract_outcomes(trials)
+    stats = compute_outcome_stats(data)
+
+    entries = []
+    for trial in trials:
+        entry = f"{trial.nct_id}: {trial.official_title} - {trial.brief_summary}"
+        if tables := render_outcome_tables(data, stats, trial.nct_id):
+            entry += f"\nOutcome measures (groups ranked by value):\n{tables}"
+        if with_other_results:
+            entry += f"\n{_results_without_tables(trial, data, stats)}"
+        entries.append(entry)
+
+    if ranked := render_ranked_differences(data, stats):
+        entries.append(
+            "Largest between-group differences across trials (precomputed; whether "
+            f"higher is better depends on the measure):\n{ranked}"
+        )
+    return "\n".join(entries)
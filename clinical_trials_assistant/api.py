@@ -0,0 +1,171 @@
+"""Programmatic access to the assistant, without the Chainlit session layer.
+
+`POST /api/ask` runs the same graph as the UI and streams Server-Sent Events:
+
+- `node`: a graph node finished, `{"node": "rerank"}`;
+- `token`: a chunk of the answer, `{"content": "..."}`;
+- `trials`: the trials the answer is based on, sent as soon as they are selected
+  when the graph runs in fused mode (`FUSED_RERANK_ANSWER`),
+  `{"top_reranked_results_ids": [...]}`;
+- `final`: the resulting conversation, `{"messages": [...], "retrieved_trials": [...],
+  "top_reranked_results_ids": [...]}`;
+- `error`: the request failed, `{"detail": "..."}`.
+
+The client keeps the conversation: to ask a follow-up question it sends back the
+messages and trial IDs of the `final` event. All the retrieved trials are sent
+back, including those added by follow-ups, and restored by ID.
+"""
+
+import asyncio
+import json
+import threading
+from logging import getLogger
+from typing import TYPE_CHECKING, Any, AsyncIterator, Literal
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from clinical_trials_assistant.deadline import RequestBudget, new_deadline
+from clinical_trials_assistant.graph import graph
+from clinical_trials_assistant.streaming import RelevantTrialsHeader
+
+if TYPE_CHECKING:
+    from clinical_trials_assistant.providers import ClinicalTrial
+
+logger = getLogger(__name__)
+
+router = APIRouter(prefix="/api")
+
+
+class ApiMessage(BaseModel):
+    role: Literal["user", "assistant"]
+    content: str
+
+
+class AskRequest(BaseModel):
+    messages: list[ApiMessage] = Field(min_length=1)
+    # Trials retrieved earlier in the conversation; their bodies are restored from
+    # the trial store or re-fetched.
+    retrieved_trials: list[str] | None = None
+    top_reranked_results_ids: list[str] | None = None
+
+
+def format_event(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def load_trials(nct_ids: list[str], budget: RequestBudget) -> list["ClinicalTrial"]:
+    """Restore trials by NCT ID, keeping the given order."""
+    from clinical_trials_assistant.providers import fetch_trials_by_id
+
+    trials = fetch_trials_by_id(nct_ids, budget)
+    if missing := set(nct_ids) - {trial.nct_id for trial in trials}:
+        logger.warning(f"Trials not found: {sorted(missing)}")
+    return trials
+
+
+async def stream_answer(request: AskRequest) -> AsyncIterator[str]:
+    from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+    from clinical_trials_assistant.nodes import State, _rerank_candidates
+
+    cancel_event = threading.Event()
+    deadline = new_deadline()
+    try:
+        retrieved_trials = (
+            await asyncio.to_thread(
+                load_trials,
+                request.retrieved_trials,
+                RequestBudget(deadline, cancel_event),
+            )
+            if request.retrieved_trials
+            else None
+        )
+        state = State(
+            messages=[
+                HumanMessage(m.content) if m.role == "user" else AIMessage(m.content)
+                for m in request.messages
+            ],
+            is_valid_request=None,
+            retrieved_trials=retrieved_trials,
+            top_reranked_results_ids=request.top_reranked_results_ids,
+            needs_additional_trials=None,
+            new_trial_ids=None,
+            deadline=deadline,
+        )
+
+        final_state: dict[str, Any] = state
+        header = RelevantTrialsHeader()
+        config = {"configurable": {"cancel_event": cancel_event}}
+        async for mode, data in graph.astream(
+            state, config, stream_mode=["updates", "messages"]
+        ):
+            if mode == "updates":
+                node = next(iter(data))
+                final_state = data[node] or final_state
+                yield format_event("node", {"node": node})
+            else:
+                token, metadata = data
+                # Complete messages are repeated once streamed; only chunks are new.
+                if not isinstance(token, AIMessageChunk):
+                    continue
+                if metadata["langgraph_node"] == "answer":
+                    yield format_event("token", {"content": token.content})
+                elif metadata["langgraph_node"] == "rerank_answer":
+                    was_complete = header.complete
+                    content = header.feed(token.content)
+                    if header.complete and not was_complete:
+                        # Same filter as `rerank_answer`: only IDs of the trials
+                        # the model was given, in the order it listed them.
+                        candidate_ids = {
+                            trial.nct_id for trial in _rerank_candidates(final_state)
+                        }
+                        yield format_event(
+                            "trials",
+                            {
+                                "top_reranked_results_ids": [
+                                    nct_id
+                                    for nct_id in header.relevant_ids
+                                    if nct_id in candidate_ids
+                                ]
+                            },
+                        )
+                    if content:
+                        yield format_event("token", {"content": content})
+    except Exception as exc:
+        logger.exception("Failed to answer API request.")
+        yield format_event("error", {"detail": repr(exc)})
+        return
+    finally:
+        # Also reached when the client disconnects and the stream is closed:
+        # stops nodes still running in worker threads.
+        cancel_event.set()
+
+    yield format_event(
+        "final",
+        {
+            "messages": [
+                {
+                    "role": "user" if isinstance(m, HumanMessage) else "assistant",
+                    "content": m.content,
+                }
+                for m in final_state["messages"]
+            ],
+            "retrieved_trials": [
+                t.nct_id for t in final_state.get("retrieved_trials") or []
+            ],
+            "top_reranked_results_ids": final_state.get("top_reranked_results_ids")
+            or [],
+        },
+    )
+
+
+@router.post("/ask")
+async def ask(request: AskRequest) -> StreamingResponse:
+    return StreamingResponse(
+        stream_answer(request),
+        media_type="text/event-stream",
+        # Keep reverse proxies from buffering the stream.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,146 @@
+"""Answer many questions from a JSONL file without the Chainlit UI.
+
+Each input line is a JSON object with a `question` and an optional `id` (the line
+number is used otherwise). Results are appended to the output JSONL file as soon
+as each question finishes, so an interrupted run can be resumed by re-running the
+same command: questions already answered successfully are skipped.
+
+Usage:
+    poetry run python -m clinical_trials_assistant.batch questions.jsonl results.jsonl --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from logging import getLogger
+from pathlib import Path
+from typing import Any
+
+from langchain_core.messages import HumanMessage
+
+from clinical_trials_assistant.deadline import new_deadline
+from clinical_trials_assistant.graph import get_graph
+
+logger = getLogger(__name__)
+
+
+def read_questions(path: Path) -> list[dict[str, Any]]:
+    questions = []
+    with path.open() as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            questions.append(
+                {
+                    "id": str(record.get("id", line_number)),
+                    "question": record["question"],
+                }
+            )
+    return questions
+
+
+def read_completed_ids(path: Path) -> set[str]:
+    """IDs of questions already answered successfully in a previous run."""
+    if not path.exists():
+        return set()
+    completed = set()
+    with path.open() as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run interrupted mid-write may leave a truncated last line.
+                continue
+            if record.get("error") is None:
+                completed.add(record["id"])
+    return completed
+
+
+async def answer_question(question: str) -> dict[str, Any]:
+    """Run one question through the graph, timing each node."""
+    from clinical_trials_assistant.nodes import State
+
+    state = State(
+        messages=[HumanMessage(question)],
+        is_valid_request=None,
+        retrieved_trials=None,
+        top_reranked_results_ids=None,
+        needs_additional_trials=None,
+        new_trial_ids=None,
+        deadline=new_deadline(),
+    )
+    timings: dict[str, float] = {}
+    final_state: dict[str, Any] = {}
+    started_at = time.perf_counter()
+    async for update in get_graph().astream(state, stream_mode="updates"):
+        node = next(iter(update))
+        now = time.perf_counter()
+        timings[node] = round(now - started_at, 3)
+        started_at = now
+        final_state = update[node] or final_state
+
+    return {
+        "answer": final_state["messages"][-1].content,
+        "top_reranked_results_ids": final_state.get("top_reranked_results_ids") or [],
+        "timings": timings,
+    }
+
+
+async def run_batch(input_path: Path, output_path: Path, concurrency: int) -> int:
+    """Answer all pending questions with at most `concurrency` running at once.
+
+    Returns:
+        int: The number of questions that failed.
+    """
+    completed = read_completed_ids(output_path)
+    pending = [q for q in read_questions(input_path) if q["id"] not in completed]
+    logger.info(f"{len(completed)} questions already answered, {len(pending)} to go.")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    with output_path.open("a+b") as output:
+        # Terminate a line truncated by an interrupted run so new results start
+        # on their own line.
+        if output.tell() > 0:
+            output.seek(-1, os.SEEK_END)
+            if output.read(1) != b"\n":
+                output.write(b"\n")
+
+        async def process(item: dict[str, Any]) -> None:
+            nonlocal failures
+            async with semaphore:
+                try:
+                    result = {**item, **await answer_question(item["question"])}
+                    result["error"] = None
+                except Exception as exc:
+                    logger.exception(f"Question {item['id']} failed.")
+                    failures += 1
+                    result = {**item, "error": repr(exc)}
+            # Single-threaded event loop: each line is written and flushed whole.
+            output.write(json.dumps(result).encode() + b"\n")
+            output.flush()
+
+        await asyncio.gather(*(process(item) for item in pending))
+
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", type=Path, help="JSONL file with questions")
+    parser.add_argument("output", type=Path, help="JSONL file to append results to")
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="questions answered at once"
+    )
+    args = parser.parse_args()
+
+    failures = asyncio.run(run_batch(args.input, args.output, args.concurrency))
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
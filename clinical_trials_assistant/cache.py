@@ -0,0 +1,53 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Thread-safe, size-bounded LRU cache with an optional time-to-live.
+
+    Args:
+        maxsize (int): Maximum number of entries kept; least recently used
+            entries are evicted first.
+        ttl (float | None): Seconds after which an entry is considered stale.
+            Stale entries are still returned by `get(..., allow_stale=True)`.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K, allow_stale: bool = False) -> V | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if (
+                not allow_stale
+                and self.ttl is not None
+                and time.monotonic() - stored_at > self.ttl
+            ):
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
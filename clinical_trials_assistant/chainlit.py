@@ -1,15 +1,25 @@
+import asyncio
 import os
 import re
+import sys
+import threading
+from typing import TYPE_CHECKING
 
 import chainlit as cl
-from chainlit.data.sql_alchemy import SQLAlchemyDataLayer
 from chainlit.types import ThreadDict
-from langchain_core.messages import AIMessage, HumanMessage
 
-from clinical_trials_assistant.nodes import State, graph
-from clinical_trials_assistant.providers import ClinicalTrial
-import sqlalchemy
-from sqlalchemy import text
+from clinical_trials_assistant.deadline import (
+    DeadlineExceededError,
+    RequestCancelledError,
+    new_deadline,
+)
+from clinical_trials_assistant.graph import get_checkpointed_graph, graph
+from clinical_trials_assistant.starters import STARTERS
+from clinical_trials_assistant.streaming import RelevantTrialsHeader
+from clinical_trials_assistant.warmup import starter_answers
+
+if TYPE_CHECKING:
+    from clinical_trials_assistant.providers import ClinicalTrial
 
 
 @cl.password_auth_callback
@@ -26,6 +36,10 @@ def auth_callback(username: str, password: str):
 
 @cl.data_layer
 def get_data_layer():
+    # Deferred until Chainlit first needs the data layer to keep startup fast.
+    import sqlalchemy
+    from sqlalchemy import text
+
     conninfo = os.getenv("DATABASE_URL")
     conninfo_async = conninfo.replace("postgresql://", "postgresql+asyncpg://").replace(
         "sqlite:///", "sqlite+aiosqlite:///"
@@ -55,7 +69,15 @@ def get_data_layer():
                         conn.execute(text(statement))
                         conn.commit()
 
-    return SQLAlchemyDataLayer(conninfo=conninfo_async)
+    from clinical_trials_assistant.persistence import (
+        PERSISTENCE_WRITE_BEHIND,
+        BufferedDataLayer,
+        PaginatedDataLayer,
+    )
+
+    if PERSISTENCE_WRITE_BEHIND:
+        return BufferedDataLayer(conninfo=conninfo_async)
+    return PaginatedDataLayer(conninfo=conninfo_async)
 
 
 @cl.on_chat_start
@@ -63,69 +85,223 @@ async def on_chat_start():
     pass
 
 
+@cl.on_stop
+async def on_stop():
+    # Chainlit cancels the message task; this stops work already handed to threads.
+    if cancel_event := cl.user_session.get("cancel_event"):
+        cancel_event.set()
+
+
+@cl.on_chat_end
+async def on_chat_end():
+    # The user left: nobody is waiting for the answer being prepared.
+    if cancel_event := cl.user_session.get("cancel_event"):
+        cancel_event.set()
+    if task := cl.context.session.current_task:
+        task.cancel()
+    if "clinical_trials_assistant.persistence" in sys.modules:
+        from clinical_trials_assistant.persistence import flush_data_layers
+
+        await flush_data_layers()
+
+
+async def stream_graph(
+    state: dict,
+    msg: cl.Message,
+    cancel_event: threading.Event,
+    thread_graph=None,
+    thread_id: str | None = None,
+) -> dict:
+    """Run the graph, streaming answer tokens into `msg` and steps into the UI.
+
+    Args:
+        thread_graph: The checkpointed graph to run instead of `graph`, which saves
+            the resulting state under `thread_id`.
+        thread_id (str | None): Chainlit thread the state belongs to.
+
+    Returns:
+        dict: The state update of the last node that ran.
+    """
+    from langchain_core.messages import AIMessageChunk
+
+    retrieved_state = {}
+    # Fused mode: the trials selected by `rerank_answer` lead its streamed reply.
+    header = RelevantTrialsHeader()
+    config = {"configurable": {"cancel_event": cancel_event}}
+    if thread_id is not None:
+        config["configurable"]["thread_id"] = thread_id
+    async for mode, data in (thread_graph or graph).astream(
+        state, config, stream_mode=["updates", "messages"]
+    ):
+        if mode == "updates":
+            name_key = next(iter(data))
+            name_formatted = {
+                "validate": "validate_request",
+                "plan_followup": "plan_followup",
+                "retrieve": "query_clinical_trials_gov",
+                "retrieve_more": "query_clinical_trials_gov",
+                "rerank": "rerank_results",
+                "answer": "prepare_answer",
+                "rerank_answer": "prepare_answer",
+            }.get(name_key)
+            retrieved_state = data.get(name_key, {})
+
+            if name_key == "rerank" or (
+                name_key == "rerank_answer" and not header.complete
+            ):
+                await show_trials_sidebar(retrieved_state)
+
+            with cl.Step(name=name_formatted):
+                pass
+        else:
+            token, metadata = data
+
+            # Workaround to skip the last token which is a repetition of entire message
+            if len(token.content) > 100:
+                continue
+
+            if metadata["langgraph_node"] == "answer":
+                await msg.stream_token(token.content)
+            elif metadata["langgraph_node"] == "rerank_answer" and isinstance(
+                token, AIMessageChunk
+            ):
+                was_complete = header.complete
+                content = header.feed(token.content)
+                if header.complete and not was_complete:
+                    # Trials of the preceding retrieval, filtered by the header.
+                    await show_trials_sidebar(
+                        {
+                            "retrieved_trials": retrieved_state.get("retrieved_trials")
+                            or [],
+                            "top_reranked_results_ids": header.relevant_ids,
+                        }
+                    )
+                if content:
+                    await msg.stream_token(content)
+
+    return retrieved_state
+
+
+async def show_trials_sidebar(retrieved_state: dict) -> None:
+    """Show the top reranked trials in the sidebar."""
+    top_trials_ids: list[str] = retrieved_state.get("top_reranked_results_ids", [])
+    top_trials: list["ClinicalTrial"] = [
+        trial
+        for trial in retrieved_state.get("retrieved_trials", [])
+        if trial.nct_id in top_trials_ids
+    ]
+
+    await cl.ElementSidebar.set_elements(
+        [
+            cl.Text(content=f"{t.nct_id}: {t.official_title}", name=t.nct_id)
+            for t in top_trials
+        ]
+    )
+    await cl.ElementSidebar.set_title("Retrieved Trials")
+
+
 @cl.on_message
 async def on_message(message: cl.Message):
-    messages = cl.user_session.get("messages") or []
-    retrieved_trials = cl.user_session.get("retrieved_trials") or None
-    top_reranked_results_ids = cl.user_session.get("top_reranked_results_ids") or None
-    messages.append(HumanMessage(message.content))
+    # Deferred with the graph: LangChain is only needed once a message arrives.
+    from langchain_core.messages import HumanMessage
+
+    # With a checkpointer the conversation is saved per thread in the database, so
+    # whichever worker receives the message can answer it.
+    thread_graph = get_checkpointed_graph()
+    thread_id = None
+    saved = {}
+    if thread_graph is not None:
+        thread_id = cl.context.session.thread_id
+        saved = (
+            await thread_graph.aget_state({"configurable": {"thread_id": thread_id}})
+        ).values
+
+    # Without a checkpointer, or for threads started before their state was
+    # saved, the conversation continues from the session (see `on_chat_resume`).
+    conversation = saved or {
+        key: cl.user_session.get(key)
+        for key in ("messages", "retrieved_trials", "top_reranked_results_ids")
+    }
+    # A copy: the session keeps the conversation as it was until this turn is saved.
+    messages = [*(conversation.get("messages") or []), HumanMessage(message.content)]
+    retrieved_trials = conversation.get("retrieved_trials") or None
+    top_reranked_results_ids = conversation.get("top_reranked_results_ids") or None
+    if thread_id is not None:
+        # Saving the message again (see below) then replaces it instead of adding
+        # a copy.
+        messages[-1].id = message.id
+
+    from clinical_trials_assistant.nodes import State
 
     state = State(
         messages=messages,
         is_valid_request=None,
         retrieved_trials=retrieved_trials,
         top_reranked_results_ids=top_reranked_results_ids,
+        needs_additional_trials=None,
+        new_trial_ids=None,
+        deadline=new_deadline(),
     )
+    cancel_event = threading.Event()
+    cl.user_session.set("cancel_event", cancel_event)
 
     msg = cl.Message(content="", author="ai")
-    retrieved_state = {}
+    # Answers to starter prompts may have been precomputed by the warm-up.
+    cached_state = starter_answers.get(message.content) if len(messages) == 1 else None
 
-    with cl.Step(name="Clinical Trial Assistant"):
-        async for mode, data in graph.astream(
-            state, stream_mode=["updates", "messages"]
-        ):
-            if mode == "updates":
-                name_key = next(iter(data))
-                name_formatted = {
-                    "validate": "validate_request",
-                    "retrieve": "query_clinical_trials_gov",
-                    "rerank": "rerank_results",
-                    "answer": "prepare_answer",
-                }.get(name_key)
-                retrieved_state = data.get(name_key, {})
-
-                if name_key == "rerank":
-                    # Create sidebar with top retrieved trials
-                    top_trials_ids: list[str] = retrieved_state.get(
-                        "top_reranked_results_ids", []
+    answered = False
+    try:
+        with cl.Step(name="Clinical Trial Assistant"):
+            if cached_state is not None:
+                retrieved_state = cached_state
+                await show_trials_sidebar(retrieved_state)
+                await msg.stream_token(cached_state["messages"][-1].content)
+            else:
+                try:
+                    retrieved_state = await stream_graph(
+                        state, msg, cancel_event, thread_graph, thread_id
                     )
-                    top_trials: list[ClinicalTrial] = [
-                        trial
-                        for trial in retrieved_state.get("retrieved_trials", [])
-                        if trial.nct_id in top_trials_ids
-                    ]
-
-                    await cl.ElementSidebar.set_elements(
-                        [
-                            cl.Text(
-                                content=f"{t.nct_id}: {t.official_title}", name=t.nct_id
-                            )
-                            for t in top_trials
-                        ]
+                    answered = True
+                except DeadlineExceededError:
+                    # Keep the trials of earlier turns for the next question.
+                    retrieved_state = state
+                    await msg.stream_token(
+                        "\n\nSorry, answering took too long. Please try again."
                     )
-                    await cl.ElementSidebar.set_title("Retrieved Trials")
+                except RequestCancelledError:
+                    # Cancelled while the task kept running (e.g. the chat ended).
+                    retrieved_state = state
+                finally:
+                    # Nodes run in worker threads that outlive a cancelled task;
+                    # the event stops them at their next provider or model call.
+                    cancel_event.set()
+    except asyncio.CancelledError:
+        # Stopped by the user: Chainlit cancels this task before calling `on_stop`.
+        # The partial answer is kept, with the trials of earlier turns.
+        await save_answer(msg, messages, state, thread_graph, thread_id)
+        raise
+
+    await save_answer(
+        msg, messages, retrieved_state, thread_graph, thread_id, answered=answered
+    )
 
-                with cl.Step(name=name_formatted):
-                    pass
-            else:
-                token, metadata = data
 
-                # Workaround to skip the last token which is a repetition of entire message
-                if len(token.content) > 100:
-                    continue
+async def save_answer(
+    msg: cl.Message,
+    messages: list,
+    retrieved_state: dict,
+    thread_graph=None,
+    thread_id: str | None = None,
+    answered: bool = False,
+) -> None:
+    """Send the (possibly partial) answer and save the conversation for the next turn.
 
-                if metadata["langgraph_node"] == "answer":
-                    await msg.stream_token(token.content)
+    Args:
+        messages (list): The conversation, ending with the user message answered.
+        retrieved_state (dict): State holding the trials the answer is based on.
+        answered (bool): Whether the graph ran to the end and saved the turn itself.
+    """
+    from langchain_core.messages import AIMessage
 
     messages.append(AIMessage(msg.content))
 
@@ -148,6 +324,24 @@ async def on_message(message: cl.Message):
         # In unit tests we stub .send(); in production this should succeed.
         pass
 
+    if thread_graph is not None:
+        if not answered:
+            # The graph did not save this turn's answer: it was precomputed, or
+            # the graph was stopped or ran out of time.
+            messages[-1].id = msg.id
+            await thread_graph.aupdate_state(
+                {"configurable": {"thread_id": thread_id}},
+                {
+                    "messages": messages,
+                    "retrieved_trials": retrieved_state.get("retrieved_trials"),
+                    "top_reranked_results_ids": retrieved_state.get(
+                        "top_reranked_results_ids"
+                    ),
+                },
+                as_node="answer",
+            )
+        return
+
     # Update session (runtime continuity)
     cl.user_session.set("messages", messages)
     cl.user_session.set("retrieved_trials", retrieved_state.get("retrieved_trials"))
@@ -159,16 +353,13 @@ async def on_message(message: cl.Message):
 
 @cl.set_starters
 async def set_starters():
-    return [
-        cl.Starter(
-            label="ibuprofen ± caffeine for back pain treatment",
-            message="What is the effect of ibuprofen ± caffeine for back pain treatment?",
-        ),
-    ]
+    return [cl.Starter(label=label, message=message) for label, message in STARTERS]
 
 
 @cl.on_chat_resume
 async def on_chat_resume(thread: ThreadDict):
+    from langchain_core.messages import AIMessage, HumanMessage
+
     cl.user_session.set("messages", [])
     messages: list[AIMessage | HumanMessage] = []
     persisted_messages = [m for m in thread["steps"]]
@@ -188,6 +379,8 @@ async def on_chat_resume(thread: ThreadDict):
                 )
                 top_ids = meta.get("top_reranked_results_ids") or top_ids
 
+    # Used by threads saved before the graph checkpointer was enabled; the others
+    # continue from their saved state.
     cl.user_session.set("messages", messages)
     # Rebuild sidebar if we have metadata
     if retrieved_trials_data and top_ids:
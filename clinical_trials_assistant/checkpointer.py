@@ -0,0 +1,320 @@
+import asyncio
+import json
+import threading
+from collections.abc import AsyncIterator, Iterator, Sequence
+from datetime import datetime, timezone
+from logging import getLogger
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from sqlalchemy import create_engine, text
+
+from clinical_trials_assistant.providers import ClinicalTrial
+from clinical_trials_assistant.trial_store import TrialStore
+
+logger = getLogger(__name__)
+
+# Type tag of trials saved as NCT IDs, restored from the trial store.
+TRIAL_IDS_TYPE = "trial_ids"
+
+_SELECT_CHECKPOINT = """
+SELECT "checkpointId", "parentCheckpointId", "type", "checkpoint"
+FROM checkpoints WHERE "threadId" = :thread_id AND "checkpointNs" = :checkpoint_ns
+"""
+_SELECT_WRITES = """
+SELECT "taskId", "channel", "type", "value" FROM checkpoint_writes
+WHERE "threadId" = :thread_id AND "checkpointNs" = :checkpoint_ns
+    AND "checkpointId" = :checkpoint_id
+ORDER BY "taskId", "idx"
+"""
+_UPSERT_CHECKPOINT = """
+INSERT INTO checkpoints ("threadId", "checkpointNs", "checkpointId",
+    "parentCheckpointId", "type", "checkpoint", "updatedAt")
+VALUES (:thread_id, :checkpoint_ns, :checkpoint_id, :parent_checkpoint_id, :type,
+    :checkpoint, :updated_at)
+ON CONFLICT ("threadId", "checkpointNs") DO UPDATE SET
+    "checkpointId" = excluded."checkpointId",
+    "parentCheckpointId" = excluded."parentCheckpointId",
+    "type" = excluded."type",
+    "checkpoint" = excluded."checkpoint",
+    "updatedAt" = excluded."updatedAt"
+"""
+# Writes of earlier checkpoints are already part of the latest one.
+_DELETE_OLD_WRITES = """
+DELETE FROM checkpoint_writes
+WHERE "threadId" = :thread_id AND "checkpointNs" = :checkpoint_ns
+    AND "checkpointId" <> :checkpoint_id
+"""
+_INSERT_WRITE = """
+INSERT INTO checkpoint_writes ("threadId", "checkpointNs", "checkpointId", "taskId",
+    "idx", "channel", "type", "value", "taskPath")
+VALUES (:thread_id, :checkpoint_ns, :checkpoint_id, :task_id, :idx, :channel, :type,
+    :value, :task_path)
+ON CONFLICT ("threadId", "checkpointNs", "checkpointId", "taskId", "idx") DO {action}
+"""
+_UPDATE_WRITE = """UPDATE SET
+    "channel" = excluded."channel", "type" = excluded."type",
+    "value" = excluded."value", "taskPath" = excluded."taskPath"
+"""
+
+
+class SQLAlchemyCheckpointSaver(BaseCheckpointSaver):
+    """LangGraph checkpointer keeping the conversation state of each thread in SQL.
+
+    With the state in `DATABASE_URL` instead of the Chainlit session, any worker
+    can answer any turn of a conversation. Only the latest checkpoint of a thread
+    and the pending writes of its tasks are kept: the app never goes back to
+    earlier ones, and a thread costs one row however long the conversation gets.
+
+    Retrieved trials, the bulk of the state, are saved as their NCT IDs when the
+    trial store is shared by all workers, and restored from it.
+
+    Args:
+        conninfo (str): SQLAlchemy URL of the database with the tables of
+            `scripts/ddl.sql`; async drivers are swapped for sync ones.
+        trial_store (TrialStore | None): Store to save trials by reference in, or
+            None to save them in full.
+    """
+
+    def __init__(self, conninfo: str, trial_store: TrialStore | None = None) -> None:
+        super().__init__()
+        self._conninfo = conninfo.replace(
+            "postgresql+asyncpg://", "postgresql://"
+        ).replace("sqlite+aiosqlite:///", "sqlite:///")
+        self._trial_store = trial_store if trial_store and trial_store.shared else None
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def _get_engine(self) -> Any:
+        with self._lock:
+            if self._engine is None:
+                self._engine = create_engine(self._conninfo)
+            return self._engine
+
+    def _dumps(self, value: Any) -> tuple[str, bytes]:
+        if (
+            self._trial_store is not None
+            and isinstance(value, list)
+            and value
+            and all(isinstance(item, ClinicalTrial) for item in value)
+        ):
+            self._trial_store.put_missing(value)
+            return TRIAL_IDS_TYPE, json.dumps([t.nct_id for t in value]).encode()
+        return self.serde.dumps_typed(value)
+
+    def _loads(self, type_: str, data: bytes) -> Any:
+        if type_ == TRIAL_IDS_TYPE:
+            if self._trial_store is None:
+                raise ValueError("Trials saved by reference need a shared trial store.")
+            nct_ids = json.loads(data)
+            trials = self._trial_store.get_many(nct_ids)
+            if missing := [nct_id for nct_id in nct_ids if nct_id not in trials]:
+                logger.warning(f"Trials of a saved conversation not found: {missing}")
+            return [trials[nct_id] for nct_id in nct_ids if nct_id in trials]
+        return self.serde.loads_typed((type_, bytes(data)))
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        keys = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        with self._get_engine().connect() as conn:
+            row = conn.execute(text(_SELECT_CHECKPOINT), keys).first()
+            if row is None or (
+                (checkpoint_id := get_checkpoint_id(config))
+                and checkpoint_id != row.checkpointId
+            ):
+                return None
+            writes = conn.execute(
+                text(_SELECT_WRITES), {**keys, "checkpoint_id": row.checkpointId}
+            ).all()
+
+        checkpoint, values, metadata = self.serde.loads_typed(
+            (row.type, bytes(row.checkpoint))
+        )
+        checkpoint["channel_values"] = {
+            channel: self._loads(*value) for channel, value in values.items()
+        }
+        return CheckpointTuple(
+            config={"configurable": {**keys, "checkpoint_id": row.checkpointId}},
+            checkpoint=checkpoint,
+            metadata=metadata,
+            parent_config=(
+                {
+                    "configurable": {
+                        **keys,
+                        "checkpoint_id": row.parentCheckpointId,
+                    }
+                }
+                if row.parentCheckpointId
+                else None
+            ),
+            pending_writes=[
+                (write.taskId, write.channel, self._loads(write.type, write.value))
+                for write in writes
+            ],
+        )
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List the latest checkpoint of the thread, the only one that is kept."""
+        if config is None:
+            raise ValueError("Checkpoints can only be listed per thread.")
+        saved = self.get_tuple(
+            {"configurable": {**config["configurable"], "checkpoint_id": None}}
+        )
+        if (
+            saved is None
+            or (limit is not None and limit <= 0)
+            or (
+                (checkpoint_id := get_checkpoint_id(config))
+                and checkpoint_id != saved.checkpoint["id"]
+            )
+            or (
+                before is not None
+                and (before_id := get_checkpoint_id(before))
+                and saved.checkpoint["id"] >= before_id
+            )
+            or (filter and any(saved.metadata.get(k) != v for k, v in filter.items()))
+        ):
+            return
+        yield saved
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        keys = {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+        }
+        values = {
+            channel: self._dumps(value)
+            for channel, value in checkpoint["channel_values"].items()
+        }
+        type_, data = self.serde.dumps_typed(
+            (
+                {**checkpoint, "channel_values": {}},
+                values,
+                get_checkpoint_metadata(config, metadata),
+            )
+        )
+        with self._get_engine().begin() as conn:
+            conn.execute(
+                text(_UPSERT_CHECKPOINT),
+                {
+                    **keys,
+                    "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+                    "type": type_,
+                    "checkpoint": data,
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
+                },
+            )
+            conn.execute(text(_DELETE_OLD_WRITES), keys)
+        return {"configurable": keys}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        keys = {
+            "thread_id": config["configurable"]["thread_id"],
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+            "checkpoint_id": config["configurable"]["checkpoint_id"],
+            "task_id": task_id,
+            "task_path": task_path,
+        }
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self._dumps(value)
+            rows.append(
+                {
+                    **keys,
+                    "idx": WRITES_IDX_MAP.get(channel, idx),
+                    "channel": channel,
+                    "type": type_,
+                    "value": data,
+                }
+            )
+        # Like other checkpointers, special writes (errors, interrupts) replace
+        # earlier ones while regular writes of a task are saved once.
+        with self._get_engine().begin() as conn:
+            for action, batch in (
+                ("NOTHING", [row for row in rows if row["idx"] >= 0]),
+                (_UPDATE_WRITE, [row for row in rows if row["idx"] < 0]),
+            ):
+                if batch:
+                    conn.execute(text(_INSERT_WRITE.format(action=action)), batch)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._get_engine().begin() as conn:
+            for table in ("checkpoints", "checkpoint_writes"):
+                conn.execute(
+                    text(f'DELETE FROM {table} WHERE "threadId" = :thread_id'),
+                    {"thread_id": thread_id},
+                )
+
+    # The sync methods run in threads, like the trial store they load trials from.
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        saved = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in saved:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
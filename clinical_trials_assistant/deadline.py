@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+# Time budget in seconds for answering one message, covering every provider and
+# model call made for it.
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "120"))
+
+
+class RequestCancelledError(RuntimeError):
+    """Raised in work still running for a request that was stopped or abandoned."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a request runs out of its time budget."""
+
+
+def new_deadline(seconds: float = REQUEST_DEADLINE) -> float:
+    """Deadline for a request starting now, as a wall-clock timestamp.
+
+    Wall-clock time (rather than monotonic) keeps the deadline meaningful in
+    graph state that is persisted or handed to other processes.
+    """
+    return time.time() + seconds
+
+
+@dataclass(frozen=True)
+class RequestBudget:
+    """Remaining time and cancellation signal of the request being processed.
+
+    Built by each node from the `deadline` in graph state and the `cancel_event`
+    in the run's `configurable` config, and passed down to provider and model
+    calls so they never wait longer than the request has left.
+    """
+
+    deadline: float | None = None
+    cancel_event: threading.Event | None = None
+
+    @classmethod
+    def from_run(
+        cls, state: dict[str, Any], config: dict[str, Any] | None
+    ) -> "RequestBudget":
+        configurable = (config or {}).get("configurable", {})
+        return cls(state.get("deadline"), configurable.get("cancel_event"))
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def remaining(self) -> float | None:
+        return None if self.deadline is None else self.deadline - time.time()
+
+    def check(self) -> None:
+        """Raise if the request was cancelled or has run out of time.
+
+        Raises:
+            RequestCancelledError: If the request was cancelled.
+            DeadlineExceededError: If the deadline has passed.
+        """
+        if self.cancelled:
+            raise RequestCancelledError("The request was cancelled.")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError("The request ran out of time.")
+
+    def within(self, seconds: float) -> "RequestBudget":
+        """Budget of a step that must end within `seconds`, and by the deadline."""
+        deadline = time.time() + seconds
+        if self.deadline is not None:
+            deadline = min(deadline, self.deadline)
+        return RequestBudget(deadline, self.cancel_event)
+
+    def timeout(self, limit: float | None = None) -> float | None:
+        """Time a call may take: the smaller of `limit` and the remaining budget.
+
+        Raises:
+            RequestCancelledError: If the request was cancelled.
+            DeadlineExceededError: If the deadline has passed.
+        """
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return limit
+        return remaining if limit is None else min(limit, remaining)
@@ -0,0 +1,82 @@
+import os
+import threading
+from logging import getLogger
+from typing import Any
+
+logger = getLogger(__name__)
+
+# `database` keeps the conversation state of Chainlit threads in `DATABASE_URL`, so
+# any worker can answer any turn; `off` keeps it in the session of one worker.
+GRAPH_CHECKPOINTER = os.getenv("GRAPH_CHECKPOINTER", "database").lower()
+
+_graph = None
+_checkpointed_graph = None
+_lock = threading.Lock()
+
+
+def get_graph() -> Any:
+    """Return the compiled conversation graph, importing and compiling it once."""
+    global _graph
+    if _graph is None:
+        with _lock:
+            if _graph is None:
+                # Deferred: pulls in LangChain and LangGraph.
+                from clinical_trials_assistant.nodes import build_graph
+
+                _graph = build_graph()
+    return _graph
+
+
+def get_checkpointed_graph() -> Any | None:
+    """Return the graph saving its state per `thread_id` in the database.
+
+    Returns:
+        The compiled graph with a checkpointer, or None if `GRAPH_CHECKPOINTER` is
+        `off` or `DATABASE_URL` is not set.
+    """
+    global _checkpointed_graph
+    conninfo = os.getenv("DATABASE_URL")
+    if GRAPH_CHECKPOINTER == "off" or not conninfo:
+        return None
+    if _checkpointed_graph is None:
+        compiled = get_graph()
+        with _lock:
+            if _checkpointed_graph is None:
+                from clinical_trials_assistant import providers
+                from clinical_trials_assistant.checkpointer import (
+                    SQLAlchemyCheckpointSaver,
+                )
+
+                _checkpointed_graph = compiled.copy(
+                    {
+                        "checkpointer": SQLAlchemyCheckpointSaver(
+                            conninfo, providers.trial_store
+                        )
+                    }
+                )
+    return _checkpointed_graph
+
+
+def warm_up_in_background() -> threading.Thread:
+    """Compile the graph on a daemon thread so the first request does not wait for it."""
+
+    def warm_up() -> None:
+        try:
+            get_graph()
+            logger.info("Conversation graph compiled.")
+        except Exception:
+            logger.exception("Background graph compilation failed.")
+
+    thread = threading.Thread(target=warm_up, name="graph-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+class LazyGraph:
+    """Stand-in for the compiled graph that compiles it on first attribute access."""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_graph(), name)
+
+
+graph = LazyGraph()
@@ -1,13 +1,40 @@
 import os
+import sys
+from contextlib import asynccontextmanager
 
 from chainlit.utils import mount_chainlit
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
+
+from clinical_trials_assistant.api import router as api_router
+from clinical_trials_assistant.graph import warm_up_in_background
+from clinical_trials_assistant.warmup import WARMUP_ENABLED, warmup
 
 server_url = os.environ.get("CONNECT_SERVER")
 guid = os.environ.get("CONNECT_CONTENT_GUID")
 root_path = f"/content/{guid}" if guid else ""
 
-app = FastAPI(root_path=root_path)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up off the startup path: the server accepts requests right away and
+    # reports readiness on /health once connections and caches are warm.
+    if WARMUP_ENABLED:
+        warmup.start()
+    elif os.environ.get("GRAPH_WARMUP", "true").lower() == "true":
+        warm_up_in_background()
+    yield
+    if warmup.task is not None:
+        # Stop retrying failed warm-up steps.
+        warmup.task.cancel()
+    # Persist writes still buffered by the data layer before the worker exits.
+    if "clinical_trials_assistant.persistence" in sys.modules:
+        from clinical_trials_assistant.persistence import flush_data_layers
+
+        await flush_data_layers(close=True)
+
+
+app = FastAPI(root_path=root_path, lifespan=lifespan)
+app.include_router(api_router)
 
 
 @app.get("/debug-headers")
@@ -15,6 +42,40 @@ async def debug_headers(request: Request):
     return dict(request.headers)
 
 
+@app.get("/health")
+def read_health(response: Response):
+    if not WARMUP_ENABLED:
+        return {"ready": True}
+    status = warmup.status()
+    if not status["ready"]:
+        # Load balancers only route traffic to warm workers.
+        response.status_code = 503
+    return status
+
+
+@app.get("/metrics")
+def read_metrics():
+    from clinical_trials_assistant.nodes import llm_flights, model_router
+    from clinical_trials_assistant.providers import (
+        api_guard,
+        provider_flights,
+        trial_store,
+    )
+
+    persistence = sys.modules.get("clinical_trials_assistant.persistence")
+
+    return {
+        "clinical_trials_api": api_guard.metrics(),
+        "models": model_router.metrics(),
+        "single_flight": {
+            "clinical_trials_api": provider_flights.metrics(),
+            "llm": llm_flights.metrics(),
+        },
+        "trial_store": trial_store.metrics() if trial_store is not None else None,
+        "persistence": persistence.data_layer_metrics() if persistence else [],
+    }
+
+
 @app.get("/app")
 def read_main():
     return {"message": "Hello World from main app"}
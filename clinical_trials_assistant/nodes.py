@@ -1,18 +1,63 @@
+import os
+from functools import cache
 from logging import getLogger
+from typing import Any, Callable
 
 from langchain.chat_models import init_chat_model
 from langchain.output_parsers.boolean import BooleanOutputParser
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AIMessage
 from langchain_core.output_parsers.json import JsonOutputParser
 from langchain_core.output_parsers.list import CommaSeparatedListOutputParser
 from langchain_core.output_parsers.string import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import merge_configs
 from langgraph.graph import END, START, MessagesState, StateGraph
+from langgraph.graph.state import CompiledStateGraph
 
-from clinical_trials_assistant.providers import ClinicalTrial, fetch_clinical_trials
+from clinical_trials_assistant.analytics import (
+    OUTCOME_TABLES,
+    format_trials_with_outcome_tables,
+)
+from clinical_trials_assistant.deadline import RequestBudget
+from clinical_trials_assistant.prompts import (
+    ANSWER_PROMPT,
+    PLAN_FOLLOWUP_PROMPT,
+    RERANK_ANSWER_PROMPT,
+    RERANK_PROMPT,
+    VALIDATE_PROMPT,
+    retrieve_prompt,
+)
+from clinical_trials_assistant.providers import (
+    ClinicalTrial,
+    fetch_clinical_trials,
+    format_trials,
+)
+from clinical_trials_assistant.retrieval import (
+    RETRIEVAL_QUERY_COUNT,
+    fetch_clinical_trials_multi,
+)
+from clinical_trials_assistant.routing import CancelOnTokenHandler, ModelRouter, Route
+from clinical_trials_assistant.singleflight import SingleFlight
+from clinical_trials_assistant.streaming import split_relevant_trials
 
 logger = getLogger(__name__)
 
+DEFAULT_MODEL = "openai:gpt-4.1-mini"
+# Query generation relies on the long Essie guide and benefits from a larger model.
+RETRIEVE_MODEL = "openai:gpt-4.1"
+# Smaller model answering when the default one is slow or failing.
+FALLBACK_MODEL = "openai:gpt-4.1-nano"
+
+# Select the relevant trials and answer in a single streamed call (`rerank_answer`)
+# instead of the `rerank` and `answer` calls.
+FUSED_RERANK_ANSWER = os.getenv("FUSED_RERANK_ANSWER", "false").lower() == "true"
+
+# Identical deterministic LLM calls issued concurrently by different sessions
+# share one completion.
+llm_flights = SingleFlight()
+
 
 class State(MessagesState):
     """State for the clinical trials assistant."""
@@ -20,6 +65,10 @@ class State(MessagesState):
     retrieved_trials: list[ClinicalTrial] | None
     top_reranked_results_ids: list[str] | None
     is_valid_request: bool | None
+    needs_additional_trials: bool | None
+    new_trial_ids: list[str] | None
+    # Wall-clock timestamp by which the answer must be ready (see `new_deadline`).
+    deadline: float | None
 
 
 def determine_if_followup_question(state: State) -> bool:
@@ -30,6 +79,10 @@ def determine_if_valid_request(state: State) -> bool:
     return state["is_valid_request"] or False
 
 
+def determine_if_additional_trials_needed(state: State) -> bool:
+    return state.get("needs_additional_trials") or False
+
+
 def determine_if_retrieved_trials_available(state: State) -> bool:
     return state["retrieved_trials"] is not None and len(state["retrieved_trials"]) > 0
 
@@ -41,126 +94,242 @@ def determine_if_reranked_trials_relevant(state: State) -> bool:
     )
 
 
-def validate(state: State) -> State:
-    prompt = PromptTemplate(
-        template=(
-            "Is the following user message a question that can be at least partially answered by analyzing clinical trials' descriptions and results? Answer with YES or NO only in uppercase, no extra text.\n"
-            "User message: {message}"
+@cache
+def get_chat_model(model: str) -> BaseChatModel:
+    """Return a shared chat model client, so HTTP connections are reused across calls."""
+    return init_chat_model(model)
+
+
+model_router = ModelRouter(
+    {
+        "validate": Route.from_env(
+            "validate", [DEFAULT_MODEL, FALLBACK_MODEL], budget=10
+        ),
+        "retrieve": Route.from_env(
+            "retrieve", [RETRIEVE_MODEL, DEFAULT_MODEL], budget=30
+        ),
+        "plan_followup": Route.from_env(
+            "plan_followup", [DEFAULT_MODEL, FALLBACK_MODEL], budget=10
+        ),
+        "rerank": Route.from_env("rerank", [DEFAULT_MODEL, FALLBACK_MODEL], budget=30),
+        # The answer is streamed to the user: a hedged call would mix its tokens
+        # into the answer, so only errors or a slow first token fall back.
+        "answer": Route.from_env(
+            "answer",
+            [DEFAULT_MODEL, FALLBACK_MODEL],
+            hedge=False,
+            first_token_budget=15,
+        ),
+        "rerank_answer": Route.from_env(
+            "rerank_answer",
+            [DEFAULT_MODEL, FALLBACK_MODEL],
+            hedge=False,
+            first_token_budget=15,
+        ),
+    },
+    # Resolved on each call so tests can swap the model clients.
+    get_model=lambda model: get_chat_model(model),
+)
+
+
+def invoke_coalesced(
+    node: str,
+    prompt: BasePromptTemplate,
+    build_chain: Callable[[BaseChatModel], Runnable],
+    inputs: dict[str, str],
+    budget: RequestBudget,
+) -> Any:
+    """Invoke the node's chain via the router, sharing the result with concurrent
+    identical invocations.
+
+    Only meant for non-streamed calls whose output does not depend on the caller,
+    keyed on the prompt template, the node's route and the input values. Templates
+    are module-level singletons, so their identity is a stable key. The models are
+    called with a temperature of 0, so the shared output is the one each caller
+    would most likely have got on its own.
+
+    The shared call is bounded by the deadline of the first caller, but not
+    cancelled with it, as other callers may still be waiting for the result.
+    """
+    budget.check()
+    key = (id(prompt), node, tuple(sorted(inputs.items())))
+    shared_budget = RequestBudget(budget.deadline)
+    return llm_flights.do(
+        key,
+        lambda: model_router.invoke(
+            node,
+            lambda llm: build_chain(llm.bind(temperature=0)),
+            inputs,
+            shared_budget,
         ),
-        input_variables=["message"],
     )
-    llm = init_chat_model("openai:gpt-4.1-mini")
+
+
+def validate(state: State, config: RunnableConfig | None = None) -> State:
+    budget = RequestBudget.from_run(state, config)
+    prompt = VALIDATE_PROMPT
     parser = BooleanOutputParser()
 
-    chain = prompt | llm | parser
+    state["is_valid_request"] = invoke_coalesced(
+        "validate",
+        prompt,
+        lambda llm: prompt | llm | parser,
+        {"message": state["messages"][-1].content},
+        budget,
+    )
+    return state
+
+
+def search_trials(
+    message: str,
+    exclude_nct_ids: list[str] | None = None,
+    budget: RequestBudget | None = None,
+) -> list[ClinicalTrial]:
+    """Turn a user message into ClinicalTrials.gov queries and fetch the results.
+
+    Args:
+        message (str): The request to build the search queries from.
+        exclude_nct_ids (list[str] | None): NCT IDs of trials to leave out.
+        budget (RequestBudget | None): Remaining time of the request.
+
+    Returns:
+        list[ClinicalTrial]: Matching trials.
+    """
+    prompt = retrieve_prompt(RETRIEVAL_QUERY_COUNT)
+    parser = JsonOutputParser()
+    budget = budget or RequestBudget()
+
+    query_dict = invoke_coalesced(
+        "retrieve",
+        prompt,
+        lambda llm: prompt | llm | parser,
+        {"message": message},
+        budget,
+    )
+    if RETRIEVAL_QUERY_COUNT == 1:
+        logger.info(
+            f"Fetching clinical trials with query dict: {query_dict}, type: {type(query_dict)}"
+        )
+        return fetch_clinical_trials(query_dict, exclude_nct_ids, budget=budget)
+
+    # Tolerate a model that returns a single object instead of an array.
+    queries = [query_dict] if isinstance(query_dict, dict) else query_dict
+    queries = [q for q in queries if isinstance(q, dict)]
+    logger.info(f"Fetching clinical trials with {len(queries)} alternative queries")
+    return fetch_clinical_trials_multi(
+        queries, exclude_nct_ids=exclude_nct_ids, budget=budget
+    )
+
 
-    state["is_valid_request"] = chain.invoke({"message": state["messages"][-1].content})
+def retrieve(state: State, config: RunnableConfig | None = None) -> State:
+    state["retrieved_trials"] = search_trials(
+        state["messages"][-1].content, budget=RequestBudget.from_run(state, config)
+    )
     return state
 
 
-def retrieve(state: State) -> State:
-    prompt = PromptTemplate(
-        template=(
-            "You are building ClinicalTrials.gov API search requests.\n"
-            "You must output a single valid JSON object with zero or more of the following keys "
-            "(only those relevant to the user request):\n"
-            "  - query.cond   → Conditions or disease (ConditionSearch area)\n"
-            "  - query.term   → Other terms (BasicSearch area)\n"
-            "  - query.locn   → Location terms (LocationSearch area)\n"
-            "  - query.titles → Title / acronym (TitleSearch area)\n"
-            "  - query.intr   → Intervention / treatment (InterventionSearch area)\n"
-            "  - query.outc   → Outcome measure (OutcomeSearch area)\n"
-            "  - query.spons  → Sponsor / collaborator (SponsorSearch area)\n"
-            "  - query.lead   → Lead sponsor name (LeadSponsorName field)\n"
-            "  - query.id     → Study IDs (IdSearch area)\n"
-            "  - query.patient→ PatientSearch area (broad multi-field relevance)\n\n"
-            "Each value must be an Essie search expression targeting that area.\n"
-            "Do NOT include unrelated keys. Keep values concise but specific.\n\n"
-            "============================\n"
-            "📘 Essie Syntax Crash Course\n"
-            "============================\n"
-            "- Boolean: OR, AND, NOT\n"
-            '- Grouping: "quoted phrase" or ( ... )\n'
-            "- Context operators:\n"
-            "    AREA[<SearchArea>]term → search in specific field/area\n"
-            "    EXPANSION[Concept|Term|None|Relaxation|Lossy]term → synonym/stemming control\n"
-            "    COVERAGE[FullMatch|StartsWith|EndsWith|Contains]term → match control\n"
-            "    SEARCH[Location]( ... ) → match multiple fields in same section\n"
-            "- Source operators:\n"
-            "    RANGE[min,max] → date/number range (e.g., AREA[LastUpdatePostDate]RANGE[2023-01-15,MAX])\n"
-            "      Important - only use RANGE with individual fields, eg. AREA[LastUpdatePostDate]RANGE[2023-01-15,MAX] and not AREA[BasicSearch]RANGE[2023-01-15,MAX]\n"
-            "    MISSING → find where field has no value\n"
-            "- Scoring: TILT[FieldName]term → bias ranking by date/size\n\n"
-            "============================\n"
-            "🎯 Key Search Areas (for AREA[])\n"
-            "============================\n"
-            "ConditionSearch (query.cond): Condition, BriefTitle, OfficialTitle, ConditionMeshTerm, ConditionAncestorTerm, Keyword, NCTId.\n\n"
-            "BasicSearch (query.term): NCTId, Acronym, BriefTitle, OfficialTitle, Condition, InterventionName, InterventionOtherName, Phase, StdAge, PrimaryOutcomeMeasureKeyword, BriefSummary, ArmGroupLabel, SecondaryOutcomeMeasure, InterventionDescription, ArmGroupDescription, PrimaryOutcomeDescription, LeadSponsorName, OrgStudyId, SecondaryId, NCTIdAlias, InterventionType, ArmGroupType, SecondaryOutcomeDescription, LocationFacility, LocationState, LocationCountry, LocationCity, LocationStatus, BioSpecDescription, ResponsiblePartyInvestigatorFullName, ResponsiblePartyInvestigatorTitle, ResponsiblePartyInvestigatorAffiliation, ResponsiblePartyOldNameTitle, ResponsiblePartyOldOrganization, OverallOfficialAffiliation, OverallOfficialRole, OverallOfficialName, CentralContactName, ConditionMeshTerm, InterventionMeshTerm, DesignAllocation, DesignInterventionModel, DesignMasking, DesignWhoMasked, DesignObservationalModel, DesignPrimaryPurpose, DesignTimePerspective, StudyType, ConditionAncestorTerm, InterventionAncestorTerm, CollaboratorName, OtherOutcomeMeasure, OutcomeMeasureTitle, OtherOutcomeDescription, OutcomeMeasureDescription, LocationContactName.\n\n"
-            "LocationSearch (query.locn): LocationCity, LocationState, LocationCountry, LocationFacility, LocationZip.\n\n"
-            "TitleSearch (query.titles): Acronym, BriefTitle, OfficialTitle.\n\n"
-            "InterventionSearch (query.intr): InterventionName, InterventionType, ArmGroupType, InterventionOtherName, BriefTitle, OfficialTitle, ArmGroupLabel, InterventionMeshTerm, Keyword, InterventionAncestorTerm, InterventionDescription, ArmGroupDescription.\n\n"
-            "OutcomeSearch (query.outc): PrimaryOutcomeMeasure, SecondaryOutcomeMeasure, PrimaryOutcomeDescription, SecondaryOutcomeDescription, OtherOutcomeMeasure, OutcomeMeasureTitle, OtherOutcomeDescription, OutcomeMeasureDescription, OutcomeMeasurePopulationDescription.\n\n"
-            "SponsorSearch (query.spons): LeadSponsorName, CollaboratorName, OrgFullName.\n\n"
-            "LeadSponsorName (query.lead): LeadSponsorName.\n\n"
-            "IdSearch (query.id): NCTId, NCTIdAlias, Acronym, OrgStudyId, SecondaryId.\n\n"
-            "PatientSearch (query.patient): Acronym, Condition, BriefTitle, OfficialTitle, ConditionMeshTerm, ConditionAncestorTerm, BriefSummary, Keyword, InterventionName, InterventionOtherName, PrimaryOutcomeMeasure, StdAge, ArmGroupLabel, SecondaryOutcomeMeasure, InterventionDescription, ArmGroupDescription, PrimaryOutcomeDescription, LeadSponsorName, OrgStudyId, SecondaryId, NCTIdAlias, SecondaryOutcomeDescription, LocationFacility, LocationState, LocationCountry, LocationCity, BioSpecDescription, ResponsiblePartyInvestigatorFullName, ResponsiblePartyInvestigatorTitle, ResponsiblePartyInvestigatorAffiliation, ResponsiblePartyOldNameTitle, ResponsiblePartyOldOrganization, OverallOfficialAffiliation, OverallOfficialName, CentralContactName, DesignInterventionModel, DesignMasking, DesignWhoMasked, DesignObservationalModel, DesignPrimaryPurpose, DesignTimePerspective, InterventionMeshTerm, InterventionAncestorTerm, CollaboratorName, OtherOutcomeMeasure, OtherOutcomeDescription, LocationContactName.\n\n"
-            "============================\n"
-            "User message: {message}\n"
-            "Return ONLY a JSON object with the relevant query.* keys and Essie expressions.\n"
-            "Keep the query very simple by only including most important keywords and filters explicitly asked by the user. \n"
-        ),
-        input_variables=["message"],
+def plan_followup(state: State, config: RunnableConfig | None = None) -> State:
+    """Decide whether a follow-up question needs trials beyond those already held."""
+    budget = RequestBudget.from_run(state, config)
+    prompt = PLAN_FOLLOWUP_PROMPT
+    parser = BooleanOutputParser()
+
+    trials = "\n".join(
+        f"{trial.nct_id}: {trial.official_title}"
+        for trial in state["retrieved_trials"] or []
+    )
+    state["needs_additional_trials"] = model_router.invoke(
+        "plan_followup",
+        lambda llm: prompt | llm | parser,
+        {
+            "trials": trials,
+            "history": _previous_user_messages(state),
+            "message": state["messages"][-1].content,
+        },
+        budget,
     )
+    return state
 
-    llm = init_chat_model("openai:gpt-4.1")
-    parser = JsonOutputParser()
-    chain = prompt | llm | parser
 
-    query_dict = chain.invoke({"message": state["messages"][-1].content})
-    logger.info(
-        f"Fetching clinical trials with query dict: {query_dict}, type: {type(query_dict)}"
+def retrieve_more(state: State, config: RunnableConfig | None = None) -> State:
+    """Fetch only trials not held yet and merge them into the session's trial set."""
+    held_trials = state["retrieved_trials"] or []
+    # Follow-ups are often elliptical ("what about children?"), so earlier user
+    # messages are included to give the query generator the full context.
+    message = (
+        f"Previous user messages:\n{_previous_user_messages(state)}\n"
+        f"Follow-up: {state['messages'][-1].content}"
+    )
+    new_trials = search_trials(
+        message,
+        [trial.nct_id for trial in held_trials],
+        RequestBudget.from_run(state, config),
     )
-    studies = fetch_clinical_trials(query_dict)
+    logger.info(f"Follow-up retrieval found {len(new_trials)} new trials")
 
-    state["retrieved_trials"] = studies
+    state["retrieved_trials"] = held_trials + new_trials
+    state["new_trial_ids"] = [trial.nct_id for trial in new_trials]
+    state["needs_additional_trials"] = False
     return state
 
 
-def rerank(state: State) -> State:
+def _previous_user_messages(state: State) -> str:
+    return "\n".join(
+        f"- {message.content}"
+        for message in state["messages"][:-1]
+        if message.type == "human"
+    )
+
+
+def _rerank_candidates(state: State) -> list[ClinicalTrial]:
     if not state["retrieved_trials"]:
         raise ValueError("No trials retrieved to rerank.")
 
-    prompt = PromptTemplate(
-        template=(
-            "Given user message and a list of description and NCT IDs of clinical trials, return a comma-separated list of NCT IDs of up to three most relevant trials.\n"
-            "If no trials seem to address the user question, return an empty list.\n"
-            "User message: {message}\n"
-            "Clinical trials:\n"
-            "{trials}"
-        ),
-        input_variables=["message", "trials"],
-    )
-    llm = init_chat_model("openai:gpt-4.1-mini")
-    parser = CommaSeparatedListOutputParser()
+    candidates = state["retrieved_trials"]
+    if new_trial_ids := state.get("new_trial_ids"):
+        # Incremental rerank after a follow-up retrieval: only the newly fetched
+        # trials compete with the current top results.
+        keep_ids = set(new_trial_ids) | set(state["top_reranked_results_ids"] or [])
+        candidates = [trial for trial in candidates if trial.nct_id in keep_ids]
+    return candidates
 
-    chain = prompt | llm | parser
 
-    trials = "\n".join(
-        f"{trial.nct_id}: {trial.official_title} - {trial.brief_summary}"
-        for trial in state["retrieved_trials"]
-    )
+def _format_trials_for_answer(trials: list[ClinicalTrial]) -> str:
+    if OUTCOME_TABLES:
+        # Outcome numbers are compared locally instead of by the model.
+        return format_trials_with_outcome_tables(trials)
+    return format_trials(trials, True)
 
-    state["top_reranked_results_ids"] = chain.invoke(
+
+def _format_candidates_for_rerank_answer(trials: list[ClinicalTrial]) -> str:
+    # The fused call gets every candidate (up to a full search) instead of the top
+    # three, so raw results sections are left out: only outcome tables, if enabled.
+    if OUTCOME_TABLES:
+        return format_trials_with_outcome_tables(trials, with_other_results=False)
+    return format_trials(trials)
+
+
+def rerank(state: State, config: RunnableConfig | None = None) -> State:
+    prompt = RERANK_PROMPT
+    parser = CommaSeparatedListOutputParser()
+
+    trials = format_trials(_rerank_candidates(state))
+
+    state["top_reranked_results_ids"] = model_router.invoke(
+        "rerank",
+        lambda llm: prompt | llm | parser,
         {
             "message": state["messages"][-1].content,
             "trials": trials,
-        }
+        },
+        RequestBudget.from_run(state, config),
     )
+    state["new_trial_ids"] = None
 
     return state
 
 
-def answer(state: State) -> State:
+def answer(state: State, config: RunnableConfig | None = None) -> State:
     if not determine_if_valid_request(state):
         state["messages"].append(
             AIMessage(
@@ -178,28 +347,27 @@ def answer(state: State) -> State:
         )
         return state
 
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                "You are a helpful assistant, providing information about clinical trials. Your answers should be based only on following studies:\n{trials}",
-            ),
-            *state["messages"],
-        ]
-    )
-    llm = init_chat_model("openai:gpt-4.1-mini")
+    prompt = ANSWER_PROMPT
     parser = StrOutputParser()
 
-    chain = prompt | llm | parser
-
-    trials = "\n".join(
-        f"{trial.nct_id}: {trial.official_title} - {trial.brief_summary}\n{trial.results_section}"
+    top_trials = [
+        trial
         for trial in state["retrieved_trials"] or []
         if trial.nct_id in (state["top_reranked_results_ids"] or [])
-    )
+    ]
+    trials = _format_trials_for_answer(top_trials)
 
+    budget = RequestBudget.from_run(state, config)
     response = AIMessage(
-        chain.invoke({"trials": trials}),
+        model_router.invoke(
+            "answer",
+            lambda llm: prompt | llm | parser,
+            {"trials": trials, "messages": state["messages"]},
+            budget,
+            # Checked on every streamed token, so a stopped request stops
+            # generating right away.
+            merge_configs(config, {"callbacks": [CancelOnTokenHandler(budget)]}),
+        ),
     )
 
     state["messages"].append(response)
@@ -207,38 +375,111 @@ def answer(state: State) -> State:
     return state
 
 
-builder = StateGraph(State)
+def rerank_answer(state: State, config: RunnableConfig | None = None) -> State:
+    """Select the most relevant trials and answer with them in one streamed call.
 
-builder.add_node("validate", validate)
-builder.add_node("retrieve", retrieve)
-builder.add_node("rerank", rerank)
-builder.add_node("answer", answer)
+    The reply starts with a `RELEVANT:` header line listing the selected trials,
+    which is stripped from the answer and only trusted for candidate trials. Each
+    candidate is given in compact form: title, summary and outcome tables.
+    """
+    prompt = RERANK_ANSWER_PROMPT
+    parser = StrOutputParser()
 
-builder.add_edge(START, "validate")
+    candidates = _rerank_candidates(state)
+    trials = _format_candidates_for_rerank_answer(candidates)
 
-# Only proceed to the full retrieval logic if it's the first valid question.
-# Otherwise, assume that the answer can be provided directly (either a decline message or a followup answer.)
-builder.add_conditional_edges(
-    "validate",
-    lambda state: {
-        (True, True): "answer",
-        (True, False): "retrieve",
-        (False, True): "answer",
-        (False, False): "answer",
-    }.get((determine_if_valid_request(state), determine_if_followup_question(state))),
-)
+    budget = RequestBudget.from_run(state, config)
+    reply = model_router.invoke(
+        "rerank_answer",
+        lambda llm: prompt | llm | parser,
+        {"trials": trials, "messages": state["messages"]},
+        budget,
+        merge_configs(config, {"callbacks": [CancelOnTokenHandler(budget)]}),
+    )
+    relevant_ids, text = split_relevant_trials(reply)
+    candidate_ids = {trial.nct_id for trial in candidates}
 
-builder.add_conditional_edges(
-    "retrieve",
-    determine_if_retrieved_trials_available,
-    {
-        True: "rerank",
-        False: "answer",
-    },
-)
+    state["top_reranked_results_ids"] = [
+        nct_id for nct_id in relevant_ids or [] if nct_id in candidate_ids
+    ]
+    state["messages"].append(AIMessage(text))
+    state["new_trial_ids"] = None
+
+    return state
+
+
+def build_graph(fused: bool = FUSED_RERANK_ANSWER) -> CompiledStateGraph:
+    """Build and compile the conversation graph.
+
+    Called lazily through `clinical_trials_assistant.graph` so that importing the
+    app does not pay for LangChain, LangGraph and the compilation itself.
+
+    Args:
+        fused (bool): Whether retrieved trials go to the single `rerank_answer`
+            call instead of `rerank` followed by `answer`.
+    """
+    builder = StateGraph(State)
+    rerank_node = "rerank_answer" if fused else "rerank"
+
+    builder.add_node("validate", validate)
+    builder.add_node("retrieve", retrieve)
+    builder.add_node("plan_followup", plan_followup)
+    builder.add_node("retrieve_more", retrieve_more)
+    if fused:
+        builder.add_node("rerank_answer", rerank_answer)
+    else:
+        builder.add_node("rerank", rerank)
+    builder.add_node("answer", answer)
+
+    builder.add_edge(START, "validate")
+
+    # Only proceed to the full retrieval logic if it's the first valid question.
+    # Valid follow-ups are planned first, invalid requests go straight to the decline message.
+    builder.add_conditional_edges(
+        "validate",
+        lambda state: {
+            (True, True): "plan_followup",
+            (True, False): "retrieve",
+            (False, True): "answer",
+            (False, False): "answer",
+        }.get(
+            (determine_if_valid_request(state), determine_if_followup_question(state))
+        ),
+    )
+
+    builder.add_conditional_edges(
+        "retrieve",
+        determine_if_retrieved_trials_available,
+        {
+            True: rerank_node,
+            False: "answer",
+        },
+    )
+
+    # Follow-ups fetch only the missing trials when the held ones are not enough.
+    builder.add_conditional_edges(
+        "plan_followup",
+        determine_if_additional_trials_needed,
+        {
+            True: "retrieve_more",
+            False: "answer",
+        },
+    )
+
+    builder.add_conditional_edges(
+        "retrieve_more",
+        lambda state: bool(state.get("new_trial_ids")),
+        {
+            True: rerank_node,
+            False: "answer",
+        },
+    )
 
-builder.add_edge("rerank", "answer")
+    if fused:
+        builder.add_edge("rerank_answer", END)
+    else:
+        builder.add_edge("rerank", "answer")
 
-builder.add_edge("answer", END)
+    builder.add_edge("answer", END)
 
-graph = builder.compile()
+    return builder.compile()
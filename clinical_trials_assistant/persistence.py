@@ -0,0 +1,414 @@
+import asyncio
+import os
+import time
+import uuid
+import weakref
+from collections import deque
+from itertools import groupby
+from logging import getLogger
+from typing import Any, Dict, List, Optional, Union
+
+from chainlit.data.sql_alchemy import SQLAlchemyDataLayer
+from chainlit.element import ElementDict
+from chainlit.step import StepDict
+from chainlit.types import (
+    FeedbackDict,
+    PageInfo,
+    PaginatedResponse,
+    Pagination,
+    ThreadDict,
+    ThreadFilter,
+)
+from sqlalchemy import text
+
+from clinical_trials_assistant.resilience import LatencyTracker
+
+logger = getLogger(__name__)
+
+# Buffer step, element and thread writes and persist them in batches off the
+# request path, instead of one transaction per write.
+PERSISTENCE_WRITE_BEHIND = (
+    os.getenv("PERSISTENCE_WRITE_BEHIND", "true").lower() == "true"
+)
+# Seconds writes are collected for before a batch is flushed.
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "0.2"))
+PERSISTENCE_BATCH_SIZE = int(os.getenv("PERSISTENCE_BATCH_SIZE", "200"))
+# Writes buffered before writers wait for a flush.
+PERSISTENCE_MAX_QUEUE = int(os.getenv("PERSISTENCE_MAX_QUEUE", "5000"))
+
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+_THREAD_COLUMNS = """
+    t."id", t."createdAt", t."name", t."userId", t."userIdentifier", t."tags",
+    t."metadata"
+"""
+# Pages follow the (`"userId"`, `"createdAt"`, `"id"`) index: the next page
+# starts right after the cursor thread instead of skipping over earlier rows.
+_LIST_THREADS = """
+SELECT {columns}
+FROM threads t
+WHERE t."userId" = :user_id {conditions}
+ORDER BY t."createdAt" DESC, t."id" DESC
+LIMIT :limit
+"""
+_AFTER_THREAD = """
+AND (t."createdAt", t."id") < (
+    SELECT c."createdAt", c."id" FROM threads c WHERE c."id" = :cursor
+)
+"""
+_SEARCH_STEPS = """
+AND EXISTS (
+    SELECT 1 FROM steps s
+    WHERE s."threadId" = t."id" AND LOWER(s."output") LIKE :search ESCAPE '\\'
+)
+"""
+_WITH_FEEDBACK = """
+AND EXISTS (
+    SELECT 1 FROM feedbacks f WHERE f."threadId" = t."id" AND f."value" = :feedback
+)
+"""
+# Pages follow the (`"threadId"`, `"createdAt"`, `"id"`) index.
+_THREAD_STEPS = """
+SELECT s.*, f."id" AS "feedbackId", f."value" AS "feedbackValue",
+    f."comment" AS "feedbackComment"
+FROM steps s LEFT JOIN feedbacks f ON s."id" = f."forId"
+WHERE s."threadId" = :thread_id
+ORDER BY s."createdAt", s."id"
+"""
+
+_layers: "weakref.WeakSet[BufferedDataLayer]" = weakref.WeakSet()
+
+
+def _thread_dict(row: dict[str, Any]) -> ThreadDict:
+    return ThreadDict(
+        id=row["id"],
+        createdAt=row["createdAt"],
+        name=row["name"],
+        userId=row["userId"],
+        userIdentifier=row["userIdentifier"],
+        tags=row["tags"],
+        metadata=row["metadata"],
+        steps=[],
+        elements=[],
+    )
+
+
+def _step_dict(row: dict[str, Any]) -> StepDict:
+    """Build a step like `SQLAlchemyDataLayer.get_all_user_threads` does."""
+    feedback = None
+    if row["feedbackValue"] is not None:
+        feedback = FeedbackDict(
+            forId=row["id"],
+            id=row["feedbackId"],
+            value=row["feedbackValue"],
+            comment=row["feedbackComment"],
+        )
+    show_input = row["showInput"]
+    return StepDict(
+        id=row["id"],
+        name=row["name"],
+        type=row["type"],
+        threadId=row["threadId"],
+        parentId=row["parentId"],
+        streaming=row["streaming"] or False,
+        waitForAnswer=row["waitForAnswer"],
+        isError=row["isError"],
+        metadata=row["metadata"] if row["metadata"] is not None else {},
+        tags=row["tags"],
+        input=row["input"] if show_input not in [None, "false"] else "",
+        output=row["output"],
+        createdAt=row["createdAt"],
+        start=row["start"],
+        end=row["end"],
+        generation=row["generation"],
+        showInput=show_input,
+        language=row["language"],
+        feedback=feedback,
+    )
+
+
+def _element_dict(row: dict[str, Any]) -> ElementDict:
+    return ElementDict(
+        id=row["id"],
+        threadId=row["threadId"],
+        type=row["type"],
+        chainlitKey=row["chainlitKey"],
+        url=row["url"],
+        objectKey=row["objectKey"],
+        name=row["name"],
+        display=row["display"],
+        size=row["size"],
+        language=row["language"],
+        page=row["page"],
+        props=row["props"] or "{}",
+        forId=row["forId"],
+        mime=row["mime"],
+    )
+
+
+class PaginatedDataLayer(SQLAlchemyDataLayer):
+    """Chainlit SQLAlchemy data layer reading thread history page by page.
+
+    The base layer lists threads by loading up to `user_thread_limit` threads of
+    the user with all their steps and elements, then filtering and paginating in
+    Python. Here each page of the thread list is a single indexed query returning
+    only the threads of the page, with search and feedback filters pushed down to
+    the database. Resuming a thread reads its steps with one query served in
+    order by the `steps_thread_created_idx` index, and result rows are cleaned
+    without walking every value (see `clean_result`).
+
+    Timestamps stay ISO 8601 text as written by Chainlit, which sorts
+    chronologically.
+    """
+
+    def clean_result(self, obj: Any) -> Any:
+        """Convert UUID columns of result rows to strings.
+
+        The base layer walks every value of every row recursively, which costs
+        more than the query itself when resuming a long thread. Drivers return
+        UUIDs only as values of UUID columns, so the columns are told apart by
+        their first non-null value and only those are converted.
+        """
+        if not isinstance(obj, list) or not obj:
+            return super().clean_result(obj)
+        uuid_columns = [
+            key
+            for key in obj[0]
+            if isinstance(
+                next((row[key] for row in obj if row[key] is not None), None),
+                uuid.UUID,
+            )
+        ]
+        for row in obj:
+            for key in uuid_columns:
+                if row[key] is not None:
+                    row[key] = str(row[key])
+        return obj
+
+    async def list_threads(
+        self, pagination: Pagination, filters: ThreadFilter
+    ) -> PaginatedResponse:
+        if not filters.userId:
+            raise ValueError("userId is required")
+
+        conditions = []
+        parameters: dict[str, Any] = {
+            "user_id": filters.userId,
+            # One more than requested tells whether there is a next page.
+            "limit": pagination.first + 1,
+        }
+        if pagination.cursor:
+            conditions.append(_AFTER_THREAD)
+            parameters["cursor"] = pagination.cursor
+        if filters.search:
+            conditions.append(_SEARCH_STEPS)
+            escaped = (
+                filters.search.lower()
+                .replace("\\", "\\\\")
+                .replace("%", "\\%")
+                .replace("_", "\\_")
+            )
+            parameters["search"] = f"%{escaped}%"
+        if filters.feedback is not None:
+            conditions.append(_WITH_FEEDBACK)
+            parameters["feedback"] = int(filters.feedback)
+
+        rows = await self.execute_sql(
+            _LIST_THREADS.format(
+                columns=_THREAD_COLUMNS, conditions="".join(conditions)
+            ),
+            parameters,
+        )
+        rows = rows if isinstance(rows, list) else []
+        threads = [_thread_dict(row) for row in rows[: pagination.first]]
+
+        return PaginatedResponse(
+            pageInfo=PageInfo(
+                hasNextPage=len(rows) > pagination.first,
+                startCursor=threads[0]["id"] if threads else None,
+                endCursor=threads[-1]["id"] if threads else None,
+            ),
+            data=threads,
+        )
+
+    async def get_thread(self, thread_id: str) -> Optional[ThreadDict]:
+        rows = await self.execute_sql(
+            f'SELECT {_THREAD_COLUMNS} FROM threads t WHERE t."id" = :id',
+            {"id": thread_id},
+        )
+        if not rows or not isinstance(rows, list):
+            return None
+        thread = _thread_dict(rows[0])
+
+        # The whole history is shown on resume, so all steps are read at once.
+        steps = await self.execute_sql(_THREAD_STEPS, {"thread_id": thread_id})
+        if not isinstance(steps, list):
+            return None
+        thread["steps"] = [_step_dict(row) for row in steps]
+
+        elements = await self.execute_sql(
+            'SELECT * FROM elements WHERE "threadId" = :thread_id',
+            {"thread_id": thread_id},
+        )
+        if isinstance(elements, list):
+            thread["elements"] = [_element_dict(row) for row in elements]
+        return thread
+
+    async def delete_thread(self, thread_id: str) -> None:
+        # The conversation state saved by the graph checkpointer goes with it.
+        for table in ("checkpoint_writes", "checkpoints"):
+            await self.execute_sql(
+                f'DELETE FROM {table} WHERE "threadId" = :id', {"id": thread_id}
+            )
+        await super().delete_thread(thread_id)
+
+
+class BufferedDataLayer(PaginatedDataLayer):
+    """Chainlit SQLAlchemy data layer with write-behind, batched persistence.
+
+    Writes are queued and return right away; a background task flushes them every
+    `flush_interval` seconds, `batch_size` statements per transaction, and runs of
+    the same statement (e.g. updates of a streamed step) as a single `executemany`.
+
+    Writes are applied in the order they were issued: there is a single queue, and
+    queuing a write never yields to the event loop, so Chainlit's concurrent
+    persistence tasks enqueue in the order they were created. Reads flush the queue
+    first, so they see every earlier write, and skip the flush lock when no write is
+    queued or being written. If a batch fails, its statements are
+    retried one by one, so a single bad write is dropped (and logged) as it would
+    be without buffering.
+
+    Args:
+        flush_interval (float): Seconds to collect writes for before flushing.
+        batch_size (int): Statements written per transaction.
+        max_queue (int): Queued writes above which writers wait for a flush.
+        **kwargs: Arguments of `SQLAlchemyDataLayer`.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        flush_interval: float = PERSISTENCE_FLUSH_INTERVAL,
+        batch_size: int = PERSISTENCE_BATCH_SIZE,
+        max_queue: int = PERSISTENCE_MAX_QUEUE,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self._queue: deque[tuple[str, dict]] = deque()
+        # Writes taken off the queue whose batch is not committed yet.
+        self._writing = 0
+        self._flush_lock = asyncio.Lock()
+        self._pending = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self.flush_latency = LatencyTracker()
+        self._counters = {
+            "max_queue_depth": 0,
+            "flushes": 0,
+            "statements": 0,
+            "batch_failures": 0,
+        }
+        _layers.add(self)
+
+    async def execute_sql(
+        self, query: str, parameters: dict
+    ) -> Union[List[Dict[str, Any]], int, None]:
+        """Queue writes, and run reads once all queued writes are persisted.
+
+        Returns:
+            list[dict[str, Any]] | int | None: Rows of a read, its row count, or None
+                for a queued write or a failed read.
+        """
+        if not query.lstrip().upper().startswith(_WRITE_STATEMENTS):
+            # Without queued or unfinished writes, the read has nothing to wait
+            # for, so it does not queue up behind flushes of other sessions.
+            if self._queue or self._writing:
+                await self.flush()
+            return await super().execute_sql(query, parameters)
+
+        self._queue.append((query, parameters))
+        depth = len(self._queue)
+        self._counters["max_queue_depth"] = max(
+            self._counters["max_queue_depth"], depth
+        )
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._run())
+        self._pending.set()
+        if depth >= self.max_queue:
+            # Back pressure: the write is queued first to keep the order.
+            await self.flush()
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            await self._pending.wait()
+            await asyncio.sleep(self.flush_interval)
+            self._pending.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush buffered writes.")
+
+    async def flush(self) -> None:
+        """Persist every queued write."""
+        async with self._flush_lock:
+            while self._queue:
+                count = min(self.batch_size, len(self._queue))
+                self._writing = count
+                try:
+                    await self._write([self._queue.popleft() for _ in range(count)])
+                finally:
+                    self._writing = 0
+
+    async def _write(self, batch: list[tuple[str, dict]]) -> None:
+        started_at = time.perf_counter()
+        try:
+            async with self.async_session() as session, session.begin():
+                for query, statements in groupby(batch, key=lambda s: s[0]):
+                    rows = [parameters for _, parameters in statements]
+                    await session.execute(text(query), rows)
+        except Exception as exc:
+            self._counters["batch_failures"] += 1
+            logger.warning(
+                f"Batch of {len(batch)} writes failed, retrying one by one: {exc!r}"
+            )
+            for query, parameters in batch:
+                await super().execute_sql(query, parameters)
+        self.flush_latency.record(time.perf_counter() - started_at)
+        self._counters["flushes"] += 1
+        self._counters["statements"] += len(batch)
+
+    async def close(self) -> None:
+        """Flush queued writes and stop the background flusher."""
+        await self.flush()
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+
+    def metrics(self) -> dict[str, Any]:
+        latency = {}
+        for p in (50, 95, 99):
+            value = self.flush_latency.percentile(p)
+            # Milliseconds: flushes usually take well under a second.
+            latency[f"p{p}"] = None if value is None else round(value * 1000, 1)
+        return {
+            "queue_depth": len(self._queue),
+            **self._counters,
+            "flush_latency_ms": latency,
+        }
+
+
+async def flush_data_layers(close: bool = False) -> None:
+    """Flush the queued writes of every buffered data layer, e.g. on session end.
+
+    Args:
+        close (bool): Whether to also stop the background flushers, on shutdown.
+    """
+    for layer in list(_layers):
+        await (layer.close() if close else layer.flush())
+
+
+def data_layer_metrics() -> list[dict[str, Any]]:
+    return [layer.metrics() for layer in _layers]
@@ -0,0 +1,151 @@
+from functools import cache
+
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    MessagesPlaceholder,
+    PromptTemplate,
+)
+
+# All templates are built once at import. Each one starts with its static part and
+# ends with the per-request values, so that the static part forms a stable prefix
+# that provider-side prompt caching can reuse across requests.
+
+VALIDATE_PROMPT = PromptTemplate(
+    template=(
+        "Is the following user message a question that can be at least partially answered by analyzing clinical trials' descriptions and results? Answer with YES or NO only in uppercase, no extra text.\n"
+        "User message: {message}"
+    ),
+    input_variables=["message"],
+)
+
+ESSIE_GUIDE = (
+    "You are building ClinicalTrials.gov API search requests.\n"
+    "Each search request is a JSON object with zero or more of the following keys "
+    "(only those relevant to the user request):\n"
+    "  - query.cond   → Conditions or disease (ConditionSearch area)\n"
+    "  - query.term   → Other terms (BasicSearch area)\n"
+    "  - query.locn   → Location terms (LocationSearch area)\n"
+    "  - query.titles → Title / acronym (TitleSearch area)\n"
+    "  - query.intr   → Intervention / treatment (InterventionSearch area)\n"
+    "  - query.outc   → Outcome measure (OutcomeSearch area)\n"
+    "  - query.spons  → Sponsor / collaborator (SponsorSearch area)\n"
+    "  - query.lead   → Lead sponsor name (LeadSponsorName field)\n"
+    "  - query.id     → Study IDs (IdSearch area)\n"
+    "  - query.patient→ PatientSearch area (broad multi-field relevance)\n\n"
+    "Each value must be an Essie search expression targeting that area.\n"
+    "Do NOT include unrelated keys. Keep values concise but specific.\n\n"
+    "============================\n"
+    "📘 Essie Syntax Crash Course\n"
+    "============================\n"
+    "- Boolean: OR, AND, NOT\n"
+    '- Grouping: "quoted phrase" or ( ... )\n'
+    "- Context operators:\n"
+    "    AREA[<SearchArea>]term → search in specific field/area\n"
+    "    EXPANSION[Concept|Term|None|Relaxation|Lossy]term → synonym/stemming control\n"
+    "    COVERAGE[FullMatch|StartsWith|EndsWith|Contains]term → match control\n"
+    "    SEARCH[Location]( ... ) → match multiple fields in same section\n"
+    "- Source operators:\n"
+    "    RANGE[min,max] → date/number range (e.g., AREA[LastUpdatePostDate]RANGE[2023-01-15,MAX])\n"
+    "      Important - only use RANGE with individual fields, eg. AREA[LastUpdatePostDate]RANGE[2023-01-15,MAX] and not AREA[BasicSearch]RANGE[2023-01-15,MAX]\n"
+    "    MISSING → find where field has no value\n"
+    "- Scoring: TILT[FieldName]term → bias ranking by date/size\n\n"
+    "============================\n"
+    "🎯 Key Search Areas (for AREA[])\n"
+    "============================\n"
+    "ConditionSearch (query.cond): Condition, BriefTitle, OfficialTitle, ConditionMeshTerm, ConditionAncestorTerm, Keyword, NCTId.\n\n"
+    "BasicSearch (query.term): NCTId, Acronym, BriefTitle, OfficialTitle, Condition, InterventionName, InterventionOtherName, Phase, StdAge, PrimaryOutcomeMeasureKeyword, BriefSummary, ArmGroupLabel, SecondaryOutcomeMeasure, InterventionDescription, ArmGroupDescription, PrimaryOutcomeDescription, LeadSponsorName, OrgStudyId, SecondaryId, NCTIdAlias, InterventionType, ArmGroupType, SecondaryOutcomeDescription, LocationFacility, LocationState, LocationCountry, LocationCity, LocationStatus, BioSpecDescription, ResponsiblePartyInvestigatorFullName, ResponsiblePartyInvestigatorTitle, ResponsiblePartyInvestigatorAffiliation, ResponsiblePartyOldNameTitle, ResponsiblePartyOldOrganization, OverallOfficialAffiliation, OverallOfficialRole, OverallOfficialName, CentralContactName, ConditionMeshTerm, InterventionMeshTerm, DesignAllocation, DesignInterventionModel, DesignMasking, DesignWhoMasked, DesignObservationalModel, DesignPrimaryPurpose, DesignTimePerspective, StudyType, ConditionAncestorTerm, InterventionAncestorTerm, CollaboratorName, OtherOutcomeMeasure, OutcomeMeasureTitle, OtherOutcomeDescription, OutcomeMeasureDescription, LocationContactName.\n\n"
+    "LocationSearch (query.locn): LocationCity, LocationState, LocationCountry, LocationFacility, LocationZip.\n\n"
+    "TitleSearch (query.titles): Acronym, BriefTitle, OfficialTitle.\n\n"
+    "InterventionSearch (query.intr): InterventionName, InterventionType, ArmGroupType, InterventionOtherName, BriefTitle, OfficialTitle, ArmGroupLabel, InterventionMeshTerm, Keyword, InterventionAncestorTerm, InterventionDescription, ArmGroupDescription.\n\n"
+    "OutcomeSearch (query.outc): PrimaryOutcomeMeasure, SecondaryOutcomeMeasure, PrimaryOutcomeDescription, SecondaryOutcomeDescription, OtherOutcomeMeasure, OutcomeMeasureTitle, OtherOutcomeDescription, OutcomeMeasureDescription, OutcomeMeasurePopulationDescription.\n\n"
+    "SponsorSearch (query.spons): LeadSponsorName, CollaboratorName, OrgFullName.\n\n"
+    "LeadSponsorName (query.lead): LeadSponsorName.\n\n"
+    "IdSearch (query.id): NCTId, NCTIdAlias, Acronym, OrgStudyId, SecondaryId.\n\n"
+    "PatientSearch (query.patient): Acronym, Condition, BriefTitle, OfficialTitle, ConditionMeshTerm, ConditionAncestorTerm, BriefSummary, Keyword, InterventionName, InterventionOtherName, PrimaryOutcomeMeasure, StdAge, ArmGroupLabel, SecondaryOutcomeMeasure, InterventionDescription, ArmGroupDescription, PrimaryOutcomeDescription, LeadSponsorName, OrgStudyId, SecondaryId, NCTIdAlias, SecondaryOutcomeDescription, LocationFacility, LocationState, LocationCountry, LocationCity, BioSpecDescription, ResponsiblePartyInvestigatorFullName, ResponsiblePartyInvestigatorTitle, ResponsiblePartyInvestigatorAffiliation, ResponsiblePartyOldNameTitle, ResponsiblePartyOldOrganization, OverallOfficialAffiliation, OverallOfficialName, CentralContactName, DesignInterventionModel, DesignMasking, DesignWhoMasked, DesignObservationalModel, DesignPrimaryPurpose, DesignTimePerspective, InterventionMeshTerm, InterventionAncestorTerm, CollaboratorName, OtherOutcomeMeasure, OtherOutcomeDescription, LocationContactName.\n\n"
+    "============================\n"
+)
+
+SINGLE_QUERY_INSTRUCTIONS = (
+    "Return ONLY a JSON object with the relevant query.* keys and Essie expressions.\n"
+    "Keep the query very simple by only including most important keywords and filters explicitly asked by the user. \n"
+)
+MULTI_QUERY_INSTRUCTIONS = (
+    "Return ONLY a JSON array of {count} alternative JSON objects, each with the relevant query.* keys and Essie expressions.\n"
+    "Order them from the most specific to the broadest. Vary search areas, synonyms and filters so that together they retrieve as many relevant trials as possible.\n"
+    "Keep each query simple by only including most important keywords and filters explicitly asked by the user.\n"
+)
+
+
+@cache
+def retrieve_prompt(query_count: int) -> ChatPromptTemplate:
+    """Prompt turning a user message into `query_count` ClinicalTrials.gov queries.
+
+    The Essie guide and output instructions form a static system message; only the
+    trailing user message varies between requests.
+    """
+    output_instructions = (
+        SINGLE_QUERY_INSTRUCTIONS
+        if query_count == 1
+        else MULTI_QUERY_INSTRUCTIONS.format(count=query_count)
+    )
+    return ChatPromptTemplate.from_messages(
+        [
+            SystemMessage(ESSIE_GUIDE + output_instructions),
+            ("human", "User message: {message}"),
+        ]
+    )
+
+
+PLAN_FOLLOWUP_PROMPT = PromptTemplate(
+    template=(
+        "A user is asking follow-up questions about clinical trials. The conversation so far was answered using the clinical trials listed below.\n"
+        "Decide whether answering the latest user message requires searching for additional clinical trials, e.g. because it asks about a different intervention, condition, population, outcome or location than the listed trials cover. "
+        "Answer with YES or NO only in uppercase, no extra text.\n"
+        "Clinical trials:\n"
+        "{trials}\n"
+        "Previous user messages:\n"
+        "{history}\n"
+        "Latest user message: {message}"
+    ),
+    input_variables=["trials", "history", "message"],
+)
+
+RERANK_PROMPT = PromptTemplate(
+    template=(
+        "Given user message and a list of description and NCT IDs of clinical trials, return a comma-separated list of NCT IDs of up to three most relevant trials.\n"
+        "If no trials seem to address the user question, return an empty list.\n"
+        "Clinical trials:\n"
+        "{trials}\n"
+        "User message: {message}"
+    ),
+    input_variables=["message", "trials"],
+)
+
+# The trials block stays ahead of the history: it is fixed for the whole thread, so
+# every turn reuses the cached prefix of the previous one.
+ANSWER_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "You are a helpful assistant, providing information about clinical trials. Your answers should be based only on following studies:\n{trials}",
+        ),
+        MessagesPlaceholder("messages"),
+    ]
+)
+
+# Fused alternative to RERANK_PROMPT followed by ANSWER_PROMPT: the reply starts with
+# a header line listing the selected trials (parsed by `streaming.RelevantTrialsHeader`)
+# and continues with the answer, all in one streamed completion.
+RERANK_ANSWER_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "You are a helpful assistant, providing information about clinical trials.\n"
+            "Start your reply with a single line `RELEVANT: ` followed by a comma-separated list of NCT IDs of up to three of the following studies that are most relevant to the latest user message, or `RELEVANT: NONE` if no study addresses it. "
+            "Then leave an empty line and answer the user based only on the studies you listed. If you listed none, say that you could not find any clinical trials related to the question.\n"
+            "Studies:\n{trials}",
+        ),
+        MessagesPlaceholder("messages"),
+    ]
+)
@@ -1,14 +1,30 @@
-from dataclasses import dataclass
+import json
+import time
+from dataclasses import dataclass, field
 from logging import getLogger
-from typing import Any, Union
+from typing import Any, Callable, Union
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from clinical_trials_assistant.cache import LRUCache
+from clinical_trials_assistant.deadline import RequestBudget, RequestCancelledError
+from clinical_trials_assistant.resilience import ResilienceConfig, ResilientCaller
+from clinical_trials_assistant.singleflight import SingleFlight
+from clinical_trials_assistant.trial_store import create_trial_store
+from clinical_trials_assistant.workers import run_cpu_bound
 
 logger = getLogger(__name__)
 
 
 CLINICAL_TRIALS_API_URL = "https://clinicaltrials.gov/api/v2"
 MAX_TRIALS_PER_QUERY = 30
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Lower bound for the HTTP timeout of a retry started close to the deadline.
+MIN_REQUEST_TIMEOUT = 0.1
+TRIAL_FIELDS = "NCTId,OfficialTitle,BriefSummary,ResultsSection,LastUpdatePostDate"
+# Fields listed by searches when full trials are looked up in the trial store.
+VERSION_FIELDS = "NCTId,LastUpdatePostDate"
 
 
 @dataclass
@@ -17,9 +33,84 @@ class ClinicalTrial:
     official_title: str
     brief_summary: str
     results_section: dict[str, Any]
+    # `LastUpdatePostDate` on ClinicalTrials.gov, which tells whether a stored copy
+    # of the trial is still current.
+    last_update: str = field(default="", compare=False, repr=False)
+
+
+def _is_retryable_error(exc: Exception) -> bool:
+    if isinstance(exc, (requests.Timeout, requests.ConnectionError)):
+        return True
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def _retry_after(exc: Exception) -> float | None:
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+# Shared by every session in the process so limits apply worker-wide.
+api_guard = ResilientCaller(
+    ResilienceConfig.from_env("CLINICAL_TRIALS_API"),
+    is_retryable=_is_retryable_error,
+    retry_after=_retry_after,
+)
+
+# Shared connection pool, so connections (and TLS sessions) to the API are reused
+# across calls and can be opened ahead of time by the warm-up.
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_maxsize=api_guard.config.max_concurrency))
+
+# Last known good results per query, served while the circuit breaker is open.
+fallback_cache: LRUCache[tuple, list[ClinicalTrial]] = LRUCache(maxsize=512)
+
+# Concurrent identical searches (e.g. the same popular question asked by several
+# sessions at once) share a single upstream request.
+provider_flights = SingleFlight()
+
+# Popular trials come back for many different queries; they are downloaded again
+# only when updated upstream.
+trial_store = create_trial_store()
+
+
+def _normalized_key(query_params: dict[str, Any]) -> tuple:
+    """Hashable key for query params, insensitive to key order and extra whitespace."""
+    return tuple(
+        sorted(
+            (k, " ".join(v.split()) if isinstance(v, str) else v)
+            for k, v in query_params.items()
+        )
+    )
+
+
+def _get_studies(
+    query_params: dict[str, Any],
+    timeout: float,
+    parse: Callable[[bytes], Any] | None = None,
+) -> Any:
+    response = session.get(
+        url=f"{CLINICAL_TRIALS_API_URL}/studies",
+        params=query_params,
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    # Raw bytes go to the parser undecoded; large pages are parsed off-thread.
+    raw = response.content
+    return run_cpu_bound(parse or parse_studies_payload, raw, size=len(raw))
 
 
-def fetch_clinical_trials(query: Union[dict, str]) -> list[ClinicalTrial]:
+def fetch_clinical_trials(
+    query: Union[dict, str],
+    exclude_nct_ids: list[str] | None = None,
+    budget: RequestBudget | None = None,
+) -> list[ClinicalTrial]:
     """Fetch clinical trials that are both completed and have results.
 
     Args:
@@ -28,9 +119,19 @@ def fetch_clinical_trials(query: Union[dict, str]) -> list[ClinicalTrial]:
               (e.g., 'query.term', 'query.cond', 'query.locn', etc.) and values are
               Essie expressions for that search area, OR
             - a plain string which will be treated as the value for 'query.term'.
+        exclude_nct_ids (list[str] | None): NCT IDs of trials already held by the
+            caller; they are filtered out server-side so only new trials are fetched.
+        budget (RequestBudget | None): Remaining time of the request, which bounds
+            the HTTP timeouts and retries.
 
     Returns:
         list[ClinicalTrial]: A list of clinical trial descriptions that match the query.
+
+    Raises:
+        CircuitOpenError: If the API keeps failing and no cached results exist for
+            the query.
+        RequestCancelledError: If the request was cancelled.
+        DeadlineExceededError: If the request ran out of time.
     """
     if isinstance(query, str):
         # Backwards compatibility: accept raw string as a basic term query.
@@ -64,18 +165,188 @@ def fetch_clinical_trials(query: Union[dict, str]) -> list[ClinicalTrial]:
     query_params.update(
         {
             "aggFilters": "results:with,status:com",  # Only completed with results
-            "fields": "NCTId,OfficialTitle,BriefSummary,ResultsSection",
+            "fields": TRIAL_FIELDS,
             "pageSize": MAX_TRIALS_PER_QUERY,
         }
     )
+    if exclude_nct_ids:
+        query_params["filter.advanced"] = (
+            f"NOT AREA[NCTId]({' OR '.join(sorted(exclude_nct_ids))})"
+        )
 
-    response = requests.get(
-        url=f"{CLINICAL_TRIALS_API_URL}/studies",
-        params=query_params,
+    cache_key = _normalized_key(query_params)
+    budget = budget or RequestBudget()
+    # Concurrent identical searches share the time budget of the first caller.
+    timeout = budget.timeout(api_guard.config.deadline)
+
+    def fetch() -> list[ClinicalTrial]:
+        deadline = time.monotonic() + timeout
+
+        def get(
+            params: dict[str, Any],
+            parse: Callable[[bytes], Any],
+            fallback: Callable[[], Any],
+        ) -> Any:
+            # Each request gets the time left of the search, however many it makes.
+            return api_guard.call(
+                lambda: _get_studies(
+                    params,
+                    timeout=max(deadline - time.monotonic(), MIN_REQUEST_TIMEOUT),
+                    parse=parse,
+                ),
+                fallback=fallback,
+                timeout=max(deadline - time.monotonic(), 0),
+                # Stop retrying once the request is cancelled.
+                check=budget.check,
+            )
+
+        if trial_store is None:
+            trials = get(
+                query_params,
+                parse_studies_payload,
+                lambda: fallback_cache.get(cache_key),
+            )
+        else:
+            trials = _fetch_via_store(
+                query_params, get, lambda: fallback_cache.get(cache_key)
+            )
+        fallback_cache.set(cache_key, trials)
+        return trials
+
+    while True:
+        try:
+            trials = provider_flights.do(cache_key, fetch)
+            break
+        except RequestCancelledError:
+            if budget.cancelled:
+                raise
+            # The search was shared with a request that was cancelled meanwhile.
+            logger.info("Shared search was cancelled, searching again.")
+    if exclude_nct_ids:
+        excluded = set(exclude_nct_ids)
+        trials = [trial for trial in trials if trial.nct_id not in excluded]
+    return trials
+
+
+def fetch_trials_by_id(
+    nct_ids: list[str], budget: RequestBudget | None = None
+) -> list[ClinicalTrial]:
+    """Fetch trials by NCT ID, whatever their status, keeping the given order.
+
+    Trials held by the trial store are used as stored; the others are downloaded
+    with `filter.ids`, at most `MAX_TRIALS_PER_QUERY` per request.
+
+    Args:
+        nct_ids (list[str]): NCT IDs of the trials, e.g. of a saved conversation.
+        budget (RequestBudget | None): Remaining time of the request, which bounds
+            all the requests made.
+
+    Returns:
+        list[ClinicalTrial]: The trials found; unknown NCT IDs are left out.
+
+    Raises:
+        CircuitOpenError: If the API keeps failing.
+        RequestCancelledError: If the request was cancelled.
+        DeadlineExceededError: If the request ran out of time.
+    """
+    budget = budget or RequestBudget()
+    trials = trial_store.get_many(nct_ids) if trial_store is not None else {}
+    missing = [nct_id for nct_id in dict.fromkeys(nct_ids) if nct_id not in trials]
+    deadline = time.monotonic() + budget.timeout(api_guard.config.deadline)
+
+    def get(page: list[str]) -> list[ClinicalTrial]:
+        params = {
+            "filter.ids": ",".join(page),
+            "fields": TRIAL_FIELDS,
+            "pageSize": len(page),
+        }
+        return api_guard.call(
+            lambda: _get_studies(
+                params,
+                timeout=max(deadline - time.monotonic(), MIN_REQUEST_TIMEOUT),
+            ),
+            timeout=max(deadline - time.monotonic(), 0),
+            check=budget.check,
+        )
+
+    for start in range(0, len(missing), MAX_TRIALS_PER_QUERY):
+        fetched = get(missing[start : start + MAX_TRIALS_PER_QUERY])
+        if trial_store is not None:
+            trial_store.put_many(fetched)
+        trials.update((trial.nct_id, trial) for trial in fetched)
+
+    return [trials[nct_id] for nct_id in nct_ids if nct_id in trials]
+
+
+def _fetch_via_store(
+    query_params: dict[str, Any],
+    get: Callable[..., Any],
+    cached: Callable[[], list[ClinicalTrial] | None],
+) -> list[ClinicalTrial]:
+    """List the IDs and update dates of matching trials, then download only the
+    trials that are not in the trial store or were updated since they were stored.
+
+    While the circuit breaker is open, both requests are answered from the last
+    known results of the query.
+    """
+    assert trial_store is not None
+
+    def cached_versions() -> dict[str, str] | None:
+        trials = cached()
+        return None if trials is None else {t.nct_id: t.last_update for t in trials}
+
+    versions: dict[str, str] = get(
+        {**query_params, "fields": VERSION_FIELDS},
+        parse_study_versions,
+        cached_versions,
     )
-    response.raise_for_status()
-    data = response.json()
+    trials = trial_store.get_fresh(versions)
+
+    if missing := [nct_id for nct_id in versions if nct_id not in trials]:
+        fetched = get(
+            {
+                "filter.ids": ",".join(missing),
+                "fields": TRIAL_FIELDS,
+                "pageSize": len(missing),
+            },
+            parse_studies_payload,
+            lambda: [t for t in cached() or [] if t.nct_id in missing] or None,
+        )
+        trial_store.put_many(fetched)
+        trials.update((trial.nct_id, trial) for trial in fetched)
+
+    # In the order of the search results.
+    return [trials[nct_id] for nct_id in versions if nct_id in trials]
+
 
+def parse_study_versions(raw: bytes) -> dict[str, str]:
+    """Decode a `/studies` response listing NCT IDs and `LastUpdatePostDate` only.
+
+    Returns:
+        dict[str, str]: Last update date of each trial, in the order listed.
+    """
+    data = json.loads(raw)
+    if "studies" not in data:
+        raise ValueError("Field `studies` is missing from the API response.")
+    versions = {}
+    for trial in data["studies"]:
+        protocol = trial.get("protocolSection", {})
+        if nct_id := protocol.get("identificationModule", {}).get("nctId"):
+            versions[nct_id] = _last_update(protocol)
+    return versions
+
+
+def _last_update(protocol_section: dict[str, Any]) -> str:
+    return (
+        protocol_section.get("statusModule", {})
+        .get("lastUpdatePostDateStruct", {})
+        .get("date", "")
+    )
+
+
+def parse_studies_payload(raw: bytes) -> list[ClinicalTrial]:
+    """Decode a `/studies` response body and extract the clinical trials."""
+    data = json.loads(raw)
     if "studies" not in data:
         raise ValueError("Field `studies` is missing from the API response.")
 
@@ -107,7 +378,34 @@ def fetch_clinical_trials(query: Union[dict, str]) -> list[ClinicalTrial]:
             continue
 
         trials.append(
-            ClinicalTrial(nct_id, official_title, brief_summary, results_section)
+            ClinicalTrial(
+                nct_id,
+                official_title,
+                brief_summary,
+                results_section,
+                _last_update(trial.get("protocolSection", {})),
+            )
         )
 
     return trials
+
+
+def format_trials(trials: list[ClinicalTrial], with_results: bool = False) -> str:
+    """Render trials as prompt context, one trial per entry.
+
+    Args:
+        trials (list[ClinicalTrial]): Trials to render.
+        with_results (bool): Whether to include the (possibly large) results section.
+
+    Returns:
+        str: The rendered trials.
+    """
+    if not with_results:
+        return "\n".join(
+            f"{trial.nct_id}: {trial.official_title} - {trial.brief_summary}"
+            for trial in trials
+        )
+    return "\n".join(
+        f"{trial.nct_id}: {trial.official_title} - {trial.brief_summary}\n{trial.results_section}"
+        for trial in trials
+    )
@@ -0,0 +1,420 @@
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, fields
+from logging import getLogger
+from typing import Any, Callable, TypeVar
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because the circuit breaker is open."""
+
+
+@dataclass
+class ResilienceConfig:
+    """Limits shared by every call guarded by a single `ResilientCaller`.
+
+    Every field can be overridden with an environment variable named
+    `<PREFIX>_<FIELD_NAME>` (e.g. `CLINICAL_TRIALS_API_RATE_PER_SECOND`).
+    """
+
+    rate_per_second: float = 5.0
+    burst: int = 10
+    initial_concurrency: int = 4
+    min_concurrency: int = 1
+    max_concurrency: int = 16
+    latency_target: float = 5.0
+    max_attempts: int = 3
+    base_backoff: float = 0.5
+    max_backoff: float = 8.0
+    deadline: float = 30.0
+    failure_threshold: int = 5
+    recovery_timeout: float = 30.0
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "ResilienceConfig":
+        overrides: dict[str, Any] = {}
+        for f in fields(cls):
+            value = os.getenv(f"{prefix}_{f.name.upper()}")
+            if value is not None:
+                overrides[f.name] = type(f.default)(value)
+        return cls(**overrides)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate` tokens/second."""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def acquire(self, deadline: float | None = None) -> None:
+        """Take one token, waiting for a refill if needed.
+
+        Raises:
+            TimeoutError: If no token becomes available before `deadline`
+                (a `time.monotonic()` timestamp).
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                raise TimeoutError("Rate limiter could not grant a token in time.")
+            time.sleep(wait)
+
+
+class AdaptiveConcurrencyLimiter:
+    """Concurrency limit adjusted with AIMD (additive increase, multiplicative decrease).
+
+    Each successful, fast call grows the limit by `1 / limit` (about one slot per
+    full window of calls). Each call that failed with a congestion signal or took
+    longer than the latency target halves the limit.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        decrease_factor: float = 0.5,
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, deadline: float | None = None) -> None:
+        """Wait for a free slot.
+
+        Raises:
+            TimeoutError: If no slot frees up before `deadline`.
+        """
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    raise TimeoutError("Concurrency limiter could not grant a slot.")
+                self._condition.wait(timeout)
+            self._in_flight += 1
+
+    def release(self, congested: bool) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if congested:
+                self._limit = max(self.minimum, self._limit * self.decrease_factor)
+            else:
+                self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """Classic closed → open → half-open circuit breaker."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == self.OPEN and now - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """Return whether a call may proceed. Half-open lets a single probe through."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """End a call that says nothing about upstream health, leaving the state as is.
+
+        A half-open breaker then lets the next call through as its probe.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if (
+                self._state == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                if self._state != self.OPEN:
+                    logger.warning("Circuit breaker opened after repeated failures.")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+@dataclass
+class ResilienceMetrics:
+    calls: int = 0
+    attempts: int = 0
+    successes: int = 0
+    retries: int = 0
+    failures: int = 0
+    rejected: int = 0
+    fallbacks: int = 0
+
+
+class LatencyTracker:
+    """Thread-safe sliding window of recent call latencies and outcome counters."""
+
+    def __init__(self, window: int = 200) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.errors = 0
+        self.timeouts = 0
+        self.hedges = 0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> float | None:
+        """Nearest-rank percentile of the window, or None if it is empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[max(math.ceil(p / 100 * len(samples)) - 1, 0)]
+
+    def metrics(self) -> dict[str, Any]:
+        percentiles = {
+            f"p{p}": None if (value := self.percentile(p)) is None else round(value, 3)
+            for p in (50, 95, 99)
+        }
+        return {
+            "samples": len(self),
+            **percentiles,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+        }
+
+
+class ResilientCaller:
+    """Runs calls through a rate limiter, adaptive concurrency, retries and a breaker.
+
+    One instance should be shared process-wide per upstream service so that all
+    sessions in a worker draw from the same budget.
+
+    Args:
+        config (ResilienceConfig): Limits and timings to apply.
+        is_retryable (Callable[[Exception], bool]): Whether an exception is a
+            transient upstream failure (throttling, 5xx, network) worth retrying.
+            Other exceptions are raised immediately and do not affect the breaker.
+        retry_after (Callable[[Exception], float | None]): Optional server-provided
+            delay (e.g. a `Retry-After` header) that overrides the jittered backoff.
+        sleep (Callable[[float], None]): Sleep function, replaceable in tests.
+    """
+
+    def __init__(
+        self,
+        config: ResilienceConfig,
+        is_retryable: Callable[[Exception], bool],
+        retry_after: Callable[[Exception], float | None] = lambda _: None,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.config = config
+        self._is_retryable = is_retryable
+        self._retry_after = retry_after
+        self._sleep = sleep
+        self._metrics_lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Restore limiter, breaker and metrics to their initial state."""
+        self.bucket = TokenBucket(self.config.rate_per_second, self.config.burst)
+        self.limiter = AdaptiveConcurrencyLimiter(
+            self.config.initial_concurrency,
+            self.config.min_concurrency,
+            self.config.max_concurrency,
+        )
+        self.breaker = CircuitBreaker(
+            self.config.failure_threshold, self.config.recovery_timeout
+        )
+        self._metrics = ResilienceMetrics()
+
+    def _count(self, name: str) -> None:
+        with self._metrics_lock:
+            setattr(self._metrics, name, getattr(self._metrics, name) + 1)
+
+    def metrics(self) -> dict[str, Any]:
+        with self._metrics_lock:
+            counters = dict(vars(self._metrics))
+        return {
+            **counters,
+            "concurrency_limit": self.limiter.limit,
+            "in_flight": self.limiter.in_flight,
+            "available_tokens": round(self.bucket.tokens, 2),
+            "circuit_state": self.breaker.state,
+        }
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        server_delay = self._retry_after(exc)
+        if server_delay is not None:
+            return server_delay
+        # Full jitter: spreads retries of concurrent callers over the whole window.
+        cap = min(self.config.max_backoff, self.config.base_backoff * 2**attempt)
+        return random.uniform(0, cap)
+
+    def call(
+        self,
+        fn: Callable[[], T],
+        fallback: Callable[[], T | None] | None = None,
+        timeout: float | None = None,
+        check: Callable[[], None] | None = None,
+    ) -> T:
+        """Call `fn` under the configured limits.
+
+        Args:
+            fn (Callable[[], T]): The upstream call.
+            fallback (Callable[[], T | None] | None): Used when the breaker is open;
+                should return a cached result or None if none is available.
+            timeout (float | None): Time budget in seconds of the caller, which
+                shortens the configured deadline if smaller.
+            check (Callable[[], None] | None): Called before each attempt and each
+                backoff; raises to give up on the call, e.g. `RequestBudget.check`
+                once the request was cancelled.
+
+        Returns:
+            T: The result of `fn` or, while the breaker is open, of `fallback`.
+
+        Raises:
+            CircuitOpenError: If the breaker is open and no fallback result exists.
+            TimeoutError: If the limiters cannot admit the call before the deadline.
+            Exception: The last error raised by `fn` once retries are exhausted, or
+                the error raised by `check`.
+        """
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("rejected")
+            cached = fallback() if fallback is not None else None
+            if cached is not None:
+                self._count("fallbacks")
+                return cached
+            raise CircuitOpenError("Upstream service is unavailable (circuit open).")
+
+        deadline = time.monotonic() + (
+            self.config.deadline
+            if timeout is None
+            else min(timeout, self.config.deadline)
+        )
+        attempt = 0
+        while True:
+            try:
+                if check is not None:
+                    check()
+                self.bucket.acquire(deadline)
+                self.limiter.acquire(deadline)
+            except Exception:
+                self.breaker.release_probe()
+                raise
+            self._count("attempts")
+            started_at = time.monotonic()
+            try:
+                result = fn()
+            except Exception as exc:
+                retryable = self._is_retryable(exc)
+                self.limiter.release(congested=retryable)
+                if not retryable:
+                    # Not an upstream failure, but not a sign of health either.
+                    self.breaker.release_probe()
+                    raise
+                attempt += 1
+                delay = self._backoff(attempt, exc)
+                if (
+                    attempt >= self.config.max_attempts
+                    or time.monotonic() + delay > deadline
+                ):
+                    self._count("failures")
+                    self.breaker.record_failure()
+                    raise
+                if check is not None:
+                    try:
+                        check()
+                    except Exception:
+                        self.breaker.release_probe()
+                        raise
+                logger.info(f"Retrying upstream call in {delay:.2f}s after: {exc!r}")
+                self._count("retries")
+                self._sleep(delay)
+                continue
+
+            latency = time.monotonic() - started_at
+            self.limiter.release(congested=latency > self.config.latency_target)
+            self.breaker.record_success()
+            self._count("successes")
+            return result
@@ -0,0 +1,111 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from logging import getLogger
+
+from clinical_trials_assistant.deadline import RequestBudget
+from clinical_trials_assistant.providers import (
+    MAX_TRIALS_PER_QUERY,
+    ClinicalTrial,
+    fetch_clinical_trials,
+)
+
+logger = getLogger(__name__)
+
+# Number of alternative queries generated by `retrieve`; 1 keeps single-query mode.
+RETRIEVAL_QUERY_COUNT = int(os.getenv("RETRIEVAL_QUERY_COUNT", "1"))
+# Shared time budget (seconds) for all alternative queries of one retrieval.
+RETRIEVAL_DEADLINE = float(os.getenv("RETRIEVAL_DEADLINE", "20"))
+# Standard damping constant from the original reciprocal rank fusion paper.
+RRF_K = 60
+
+_query_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RETRIEVAL_MAX_WORKERS", "8")),
+    thread_name_prefix="retrieval",
+)
+
+
+def reciprocal_rank_fusion(
+    result_lists: list[list[ClinicalTrial]],
+    k: int = RRF_K,
+    limit: int | None = MAX_TRIALS_PER_QUERY,
+) -> list[ClinicalTrial]:
+    """Merge ranked result lists, de-duplicating trials by NCT ID.
+
+    Each trial scores `sum(1 / (k + rank))` over the lists it appears in, so trials
+    ranked highly by several queries come first.
+
+    Args:
+        result_lists (list[list[ClinicalTrial]]): Ranked results of each query.
+        k (int): Damping constant; larger values flatten the rank contribution.
+        limit (int | None): Maximum number of fused results to return.
+
+    Returns:
+        list[ClinicalTrial]: Unique trials ordered by fused score.
+    """
+    scores: dict[str, float] = {}
+    trials: dict[str, ClinicalTrial] = {}
+    for results in result_lists:
+        for rank, trial in enumerate(results, start=1):
+            scores[trial.nct_id] = scores.get(trial.nct_id, 0.0) + 1 / (k + rank)
+            trials.setdefault(trial.nct_id, trial)
+
+    # `sorted` is stable, so ties keep first-seen order.
+    ranked = sorted(trials, key=lambda nct_id: scores[nct_id], reverse=True)
+    return [trials[nct_id] for nct_id in ranked[:limit]]
+
+
+def fetch_clinical_trials_multi(
+    queries: list[dict],
+    deadline: float = RETRIEVAL_DEADLINE,
+    exclude_nct_ids: list[str] | None = None,
+    budget: RequestBudget | None = None,
+) -> list[ClinicalTrial]:
+    """Run alternative queries concurrently and fuse their results.
+
+    Queries that fail or do not finish within `deadline` seconds are dropped, so
+    the wall time stays close to that of the slowest useful query. Each query is
+    given the same deadline, so late ones also give up their worker and their
+    API slot instead of running on in the background.
+
+    Args:
+        queries (list[dict]): Query dicts as accepted by `fetch_clinical_trials`.
+        deadline (float): Shared time budget in seconds for all queries.
+        exclude_nct_ids (list[str] | None): NCT IDs to leave out of the results.
+        budget (RequestBudget | None): Remaining time of the request, which caps
+            `deadline`.
+
+    Returns:
+        list[ClinicalTrial]: Fused, de-duplicated trials.
+
+    Raises:
+        Exception: The first error raised if no query succeeded.
+    """
+    query_budget = (budget or RequestBudget()).within(deadline)
+    futures = [
+        _query_pool.submit(
+            fetch_clinical_trials, query, exclude_nct_ids, budget=query_budget
+        )
+        for query in queries
+    ]
+    done, not_done = wait(futures, timeout=query_budget.timeout())
+    for future in not_done:
+        future.cancel()
+    if not_done:
+        logger.warning(
+            f"{len(not_done)} of {len(queries)} queries missed the deadline."
+        )
+
+    result_lists: list[list[ClinicalTrial]] = []
+    errors: list[BaseException] = []
+    for query, future in zip(queries, futures):
+        if future not in done:
+            continue
+        if (error := future.exception()) is not None:
+            logger.warning(f"Dropping query {query} after error: {error!r}")
+            errors.append(error)
+            continue
+        result_lists.append(future.result())
+
+    if not result_lists and errors:
+        raise errors[0]
+    return reciprocal_rank_fusion(result_lists)
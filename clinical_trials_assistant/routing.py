@@ -0,0 +1,392 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any, Callable
+
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_openai.chat_models.base import BaseChatOpenAI
+
+from clinical_trials_assistant.deadline import (
+    DeadlineExceededError,
+    RequestBudget,
+    RequestCancelledError,
+)
+from clinical_trials_assistant.resilience import LatencyTracker
+
+logger = getLogger(__name__)
+
+# Hedge a call once it has been running longer than this percentile of the
+# recent latencies of the model for the same node.
+MODEL_HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "95"))
+# Latency samples needed before the percentile is trusted enough to hedge on.
+MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", "20"))
+MODEL_LATENCY_WINDOW = int(os.getenv("MODEL_LATENCY_WINDOW", "200"))
+# Seconds between checks for cancellation while waiting for a model.
+CANCEL_POLL_INTERVAL = 0.25
+
+
+@dataclass
+class Route:
+    """Models to try for a node, in order, and the time budget of each model.
+
+    Streamed routes (without a budget nor hedging) can instead give each model a
+    `first_token_budget`: the time its first token may take.
+
+    The models and budgets can be overridden with `MODEL_ROUTE_<NODE>_MODELS`
+    (comma-separated), `MODEL_ROUTE_<NODE>_BUDGET` and
+    `MODEL_ROUTE_<NODE>_FIRST_TOKEN_BUDGET` (seconds, `0` for none).
+    """
+
+    models: list[str]
+    budget: float | None = None
+    hedge: bool = True
+    first_token_budget: float | None = None
+
+    @classmethod
+    def from_env(
+        cls,
+        node: str,
+        models: list[str],
+        budget: float | None = None,
+        hedge: bool = True,
+        first_token_budget: float | None = None,
+    ) -> "Route":
+        prefix = f"MODEL_ROUTE_{node.upper()}"
+        if value := os.getenv(f"{prefix}_MODELS"):
+            models = [model.strip() for model in value.split(",") if model.strip()]
+        if value := os.getenv(f"{prefix}_BUDGET"):
+            budget = float(value) or None
+        if value := os.getenv(f"{prefix}_FIRST_TOKEN_BUDGET"):
+            first_token_budget = float(value) or None
+        return cls(
+            models=models,
+            budget=budget,
+            hedge=hedge,
+            first_token_budget=first_token_budget,
+        )
+
+
+class CancelOnTokenHandler(BaseCallbackHandler):
+    """Stops a streamed completion as soon as its request is cancelled or expires."""
+
+    # Errors raised by handlers are only propagated to the model call if set.
+    raise_error = True
+
+    def __init__(self, budget: RequestBudget) -> None:
+        self.budget = budget
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.budget.check()
+
+
+class TokenSeenHandler(BaseCallbackHandler):
+    """Records whether a streamed completion has emitted any token yet.
+
+    A completion abandoned before its first token is stopped at its next token,
+    which must then not reach the other handlers: the handler goes first (see
+    `_with_first_callback`).
+    """
+
+    # Errors raised by handlers are only propagated to the model call if set.
+    raise_error = True
+
+    def __init__(self) -> None:
+        self.seen = False
+        self.abandoned = False
+        self.first_token = threading.Event()
+        self._lock = threading.Lock()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        with self._lock:
+            if self.abandoned:
+                raise TimeoutError("Completion abandoned before its first token.")
+            # Chunks without content (e.g. announcing the role) show nothing yet.
+            if token:
+                self.seen = True
+                self.first_token.set()
+
+    def abandon(self) -> bool:
+        """Stop the completion unless it has emitted a token; return whether it was."""
+        with self._lock:
+            self.abandoned = not self.seen
+            return self.abandoned
+
+
+class ModelRouter:
+    """Runs LLM calls within a per-node latency budget, hedging and falling back.
+
+    For each model of the node's route, in order:
+
+    1. the call is started;
+    2. if it is still running after the model's `MODEL_HEDGE_PERCENTILE` latency,
+       a duplicate is sent and whichever finishes first wins;
+    3. if neither succeeds within the budget, or both fail, the next model is tried.
+
+    Latencies are tracked per node and model, as calls of different nodes to the
+    same model differ widely in length. Routes without a budget nor hedging are
+    streamed and only fall back on errors raised before the first token, or when
+    no token arrives within the route's `first_token_budget`, so a partly
+    streamed answer is never followed by another one.
+
+    Calls that run past their budget cannot be interrupted; they finish in the
+    background and their results are discarded. Hedging doubles the cost of slow
+    calls, so it should only be enabled for idempotent, non-streamed calls.
+
+    Args:
+        routes (dict[str, Route]): Route of each node.
+        get_model (Callable[[str], BaseChatModel]): Returns the client of a model.
+        max_workers (int): Threads available for concurrent model calls.
+    """
+
+    def __init__(
+        self,
+        routes: dict[str, Route],
+        get_model: Callable[[str], BaseChatModel],
+        max_workers: int = 32,
+    ) -> None:
+        self.routes = routes
+        self._get_model = get_model
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="model-call"
+        )
+        self._latency: dict[tuple[str, str], LatencyTracker] = {}
+        self._lock = threading.Lock()
+
+    def latency(self, node: str, model: str) -> LatencyTracker:
+        with self._lock:
+            return self._latency.setdefault(
+                (node, model), LatencyTracker(MODEL_LATENCY_WINDOW)
+            )
+
+    def reset(self) -> None:
+        with self._lock:
+            self._latency.clear()
+
+    def metrics(self) -> dict[str, dict[str, Any]]:
+        """Latency metrics of each model, grouped by node."""
+        with self._lock:
+            trackers = dict(self._latency)
+        metrics: dict[str, dict[str, Any]] = {}
+        for (node, model), tracker in trackers.items():
+            metrics.setdefault(node, {})[model] = tracker.metrics()
+        return metrics
+
+    def hedge_delay(self, node: str, model: str) -> float | None:
+        tracker = self.latency(node, model)
+        if len(tracker) < MODEL_HEDGE_MIN_SAMPLES:
+            return None
+        return tracker.percentile(MODEL_HEDGE_PERCENTILE)
+
+    def invoke(
+        self,
+        node: str,
+        build_chain: Callable[[BaseChatModel], Runnable],
+        inputs: dict[str, Any],
+        budget: RequestBudget | None = None,
+        config: RunnableConfig | None = None,
+    ) -> Any:
+        """Invoke the chain built around the node's models, following its route.
+
+        Args:
+            node (str): Name of the route to follow.
+            build_chain (Callable[[BaseChatModel], Runnable]): Builds the chain
+                (e.g. `prompt | llm | parser`) for a given model client.
+            inputs (dict[str, Any]): Inputs of the chain.
+            budget (RequestBudget | None): Remaining time of the request, which caps
+                the route's budget, and its cancellation signal.
+            config (RunnableConfig | None): Config to invoke the chain with.
+
+        Returns:
+            Any: Output of the first successful call.
+
+        Raises:
+            RequestCancelledError: If the request was cancelled.
+            DeadlineExceededError: If the request ran out of time.
+            Exception: The error of the last model tried if all of them failed, or
+                `TimeoutError` if the last one ran out of budget. On streamed
+                routes, the error of a model that already emitted tokens.
+        """
+        route = self.routes[node]
+        budget = budget or RequestBudget()
+        error: Exception | None = None
+        for index, model in enumerate(route.models):
+            token_seen: TokenSeenHandler | None = None
+            if index > 0:
+                logger.warning(f"Falling back to {model} for {node}: {error!r}")
+            timeout = budget.timeout(route.budget)
+            chain = build_chain(_with_timeout(self._get_model(model), timeout))
+            try:
+                if route.budget is None and not route.hedge:
+                    token_seen = TokenSeenHandler()
+                    return self._stream(
+                        node,
+                        model,
+                        chain,
+                        inputs,
+                        config,
+                        budget,
+                        route.first_token_budget,
+                        token_seen,
+                    )
+                return self._call_within_budget(
+                    node, model, chain, inputs, config, budget, timeout, route.hedge
+                )
+            except (RequestCancelledError, DeadlineExceededError):
+                raise
+            except Exception as exc:
+                if token_seen is not None and token_seen.seen:
+                    # The user has already seen part of this answer.
+                    raise
+                error = exc
+        assert error is not None, f"Route {node!r} has no models."
+        raise error
+
+    def _call(
+        self,
+        node: str,
+        model: str,
+        chain: Runnable,
+        inputs: dict[str, Any],
+        config: RunnableConfig | None,
+    ) -> Any:
+        tracker = self.latency(node, model)
+        started_at = time.perf_counter()
+        try:
+            result = chain.invoke(inputs, config)
+        except Exception:
+            tracker.count("errors")
+            raise
+        tracker.record(time.perf_counter() - started_at)
+        return result
+
+    def _stream(
+        self,
+        node: str,
+        model: str,
+        chain: Runnable,
+        inputs: dict[str, Any],
+        config: RunnableConfig | None,
+        budget: RequestBudget,
+        first_token_budget: float | None,
+        token_seen: TokenSeenHandler,
+    ) -> Any:
+        config = _with_first_callback(config, token_seen)
+        if first_token_budget is None:
+            # Run on the caller's thread; the client timeout bounds the call (see
+            # `_with_timeout`).
+            return self._call(node, model, chain, inputs, config)
+
+        future = self._submit(node, model, chain, inputs, config)
+        # Also wake up when the call ends without any token.
+        future.add_done_callback(lambda _: token_seen.first_token.set())
+        first_token_at = time.monotonic() + first_token_budget
+        while not token_seen.first_token.wait(
+            min(CANCEL_POLL_INTERVAL, max(first_token_at - time.monotonic(), 0))
+        ):
+            try:
+                budget.check()
+            except (RequestCancelledError, DeadlineExceededError):
+                token_seen.abandon()
+                raise
+            if time.monotonic() >= first_token_at and token_seen.abandon():
+                self.latency(node, model).count("timeouts")
+                raise TimeoutError(
+                    f"{model} sent no token within {first_token_budget:.1f}s."
+                )
+        # Once streaming, the call is bounded by the client timeout and the
+        # per-token check of the request budget.
+        return future.result()
+
+    def _submit(
+        self,
+        node: str,
+        model: str,
+        chain: Runnable,
+        inputs: dict[str, Any],
+        config: RunnableConfig | None,
+    ) -> Future:
+        # Each call runs in a copy of the caller's context to keep tracing callbacks.
+        context = contextvars.copy_context()
+        return self._pool.submit(
+            context.run, self._call, node, model, chain, inputs, config
+        )
+
+    def _call_within_budget(
+        self,
+        node: str,
+        model: str,
+        chain: Runnable,
+        inputs: dict[str, Any],
+        config: RunnableConfig | None,
+        budget: RequestBudget,
+        timeout: float | None,
+        hedge: bool,
+    ) -> Any:
+        started_at = time.monotonic()
+        deadline = None if timeout is None else started_at + timeout
+        hedge_delay = self.hedge_delay(node, model) if hedge else None
+        hedge_at = None if hedge_delay is None else started_at + hedge_delay
+        pending = {self._submit(node, model, chain, inputs, config)}
+        error: Exception | None = None
+
+        while pending:
+            budget.check()
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            if hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                self.latency(node, model).count("hedges")
+                pending.add(self._submit(node, model, chain, inputs, config))
+
+            # Wake up periodically to notice cancellation of the request.
+            wake_at = min(
+                t
+                for t in (deadline, hedge_at, now + CANCEL_POLL_INTERVAL)
+                if t is not None
+            )
+            done, pending = wait(
+                pending, timeout=wake_at - now, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not pending:
+            raise error
+        self.latency(node, model).count("timeouts")
+        raise TimeoutError(f"{model} did not answer within {timeout:.1f}s.")
+
+
+def _with_first_callback(
+    config: RunnableConfig | None, handler: BaseCallbackHandler
+) -> RunnableConfig:
+    """Add `handler` ahead of the config's callbacks, unlike `merge_configs`."""
+    config = config or {}
+    callbacks = config.get("callbacks")
+    if isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        callbacks.handlers = [handler, *callbacks.handlers]
+        callbacks.inheritable_handlers = [handler, *callbacks.inheritable_handlers]
+    else:
+        callbacks = [handler, *(callbacks or [])]
+    return {**config, "callbacks": callbacks}
+
+
+def _with_timeout(llm: BaseChatModel, timeout: float | None) -> Runnable:
+    """Pass the timeout to the model's HTTP client, so abandoned calls stop too.
+
+    Only OpenAI clients take a per-call `timeout`; calls to other providers are
+    bounded by the router's wait for them, and streamed ones by the per-token
+    check of the request budget.
+    """
+    if timeout is None or not isinstance(llm, BaseChatOpenAI):
+        return llm
+    return llm.bind(timeout=timeout)
@@ -0,0 +1,59 @@
+import copy
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls sharing the same key into a single execution.
+
+    The first caller for a key (the leader) runs the function; callers arriving
+    while it is still running wait for and share its result or exception. Once
+    the call completes the key is forgotten, so this is not a cache.
+
+    Each caller gets its own shallow copy of the result, so one caller reordering
+    or filtering a returned list does not affect the others. Items of the result
+    are still shared and must be treated as read-only.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            self._calls += 1
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self._coalesced += 1
+
+        if not is_leader:
+            return copy.copy(future.result())
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return copy.copy(result)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._in_flight),
+            }
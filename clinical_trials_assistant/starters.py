@@ -0,0 +1,8 @@
+# (label, message) pairs offered as conversation starters in the UI. Their answers
+# are precomputed by the startup warm-up when it is enabled.
+STARTERS: list[tuple[str, str]] = [
+    (
+        "ibuprofen ± caffeine for back pain treatment",
+        "What is the effect of ibuprofen ± caffeine for back pain treatment?",
+    ),
+]
@@ -0,0 +1,63 @@
+import re
+
+# First line of a fused rerank-and-answer reply, listing the trials the answer uses.
+RELEVANT_TRIALS_PREFIX = "RELEVANT:"
+
+_NCT_ID = re.compile(r"NCT\d{8}")
+
+
+def parse_relevant_trials(header: str) -> list[str]:
+    """Return the NCT IDs listed in a `RELEVANT:` header line, in order."""
+    return list(dict.fromkeys(_NCT_ID.findall(header)))
+
+
+def split_relevant_trials(text: str) -> tuple[list[str] | None, str]:
+    """Split a complete fused reply into its relevant trial IDs and the answer.
+
+    Returns:
+        tuple[list[str] | None, str]: The IDs, or None if the reply has no header,
+            and the answer text.
+    """
+    stripped = text.lstrip()
+    if not stripped.startswith(RELEVANT_TRIALS_PREFIX):
+        return None, text
+    header, _, answer = stripped.partition("\n")
+    return parse_relevant_trials(header), answer.lstrip("\n")
+
+
+class RelevantTrialsHeader:
+    """Separates the `RELEVANT:` header from the tokens of a streamed fused reply.
+
+    Tokens are buffered until the header line is complete; the header is then
+    parsed into `relevant_ids` and only answer text is passed through. A reply
+    that does not start with the header is passed through whole, with
+    `relevant_ids` set to an empty list.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._answer_started = False
+        self.relevant_ids: list[str] | None = None
+
+    @property
+    def complete(self) -> bool:
+        return self.relevant_ids is not None
+
+    def feed(self, token: str) -> str:
+        """Consume a token and return the part of it that belongs to the answer."""
+        if not self.complete:
+            self._buffer += token
+            stripped = self._buffer.lstrip()
+            prefix = stripped[: len(RELEVANT_TRIALS_PREFIX)]
+            if not RELEVANT_TRIALS_PREFIX.startswith(prefix):
+                self.relevant_ids = []
+                self._answer_started = True
+                return self._buffer
+            if "\n" not in stripped:
+                return ""
+            self.relevant_ids, token = split_relevant_trials(stripped)
+        if not self._answer_started:
+            # Blank lines between the header and the answer may arrive separately.
+            token = token.lstrip("\n")
+            self._answer_started = bool(token)
+        return token
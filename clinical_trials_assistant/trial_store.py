@@ -0,0 +1,222 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from logging import getLogger
+from typing import TYPE_CHECKING, Any
+
+from clinical_trials_assistant.cache import LRUCache
+
+if TYPE_CHECKING:
+    from clinical_trials_assistant.providers import ClinicalTrial
+
+logger = getLogger(__name__)
+
+# `database` keeps trials in memory and in the `trials` table of `DATABASE_URL`
+# (memory only if it is not set), `memory` in memory only, `off` disables the store
+# so searches download every trial in full.
+TRIAL_STORE = os.getenv("TRIAL_STORE", "database").lower()
+TRIAL_STORE_MEMORY_SIZE = int(os.getenv("TRIAL_STORE_MEMORY_SIZE", "2048"))
+
+_SELECT = """
+SELECT "nctId", "officialTitle", "briefSummary", "resultsSection",
+    "lastUpdatePostDate"
+FROM trials WHERE "nctId" IN ({placeholders})
+"""
+_UPSERT = """
+INSERT INTO trials ("nctId", "officialTitle", "briefSummary", "resultsSection",
+    "lastUpdatePostDate", "updatedAt")
+VALUES (:nct_id, :official_title, :brief_summary, :results_section,
+    :last_update, :updated_at)
+ON CONFLICT ("nctId") DO UPDATE SET
+    "officialTitle" = excluded."officialTitle",
+    "briefSummary" = excluded."briefSummary",
+    "resultsSection" = excluded."resultsSection",
+    "lastUpdatePostDate" = excluded."lastUpdatePostDate",
+    "updatedAt" = excluded."updatedAt"
+"""
+
+
+class TrialStore:
+    """Trials by NCT ID, valid as long as ClinicalTrials.gov lists the same update.
+
+    Searches list only the NCT IDs and `LastUpdatePostDate` of matching trials;
+    the full trials are then looked up here and only missing or outdated ones are
+    downloaded. Entries are kept in a process-wide LRU and, with a database, in the
+    `trials` table shared by all workers. Database errors are logged and the store
+    carries on in memory.
+
+    Args:
+        conninfo (str | None): SQLAlchemy URL of the database, or None to keep
+            trials in memory only.
+        maxsize (int): Trials kept in memory.
+    """
+
+    def __init__(
+        self, conninfo: str | None = None, maxsize: int = TRIAL_STORE_MEMORY_SIZE
+    ) -> None:
+        self._memory: LRUCache[str, "ClinicalTrial"] = LRUCache(maxsize=maxsize)
+        # Chainlit's async drivers are swapped for their sync counterparts.
+        self._conninfo = (
+            conninfo.replace("postgresql+asyncpg://", "postgresql://").replace(
+                "sqlite+aiosqlite:///", "sqlite:///"
+            )
+            if conninfo
+            else None
+        )
+        self._engine = None
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "stale": 0, "misses": 0, "db_errors": 0}
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def _get_engine(self) -> Any:
+        with self._lock:
+            if self._engine is None:
+                # Deferred: SQLAlchemy is slow to import and only needed with a DB.
+                import sqlalchemy
+
+                self._engine = sqlalchemy.create_engine(self._conninfo)
+            return self._engine
+
+    def get_fresh(self, versions: dict[str, str]) -> dict[str, "ClinicalTrial"]:
+        """Return the stored trials whose last update matches the listed one.
+
+        Args:
+            versions (dict[str, str]): `LastUpdatePostDate` of each NCT ID, as
+                listed by a search.
+
+        Returns:
+            dict[str, ClinicalTrial]: Up-to-date trials by NCT ID; the others have to
+                be downloaded.
+        """
+        found: dict[str, ClinicalTrial] = {}
+        stale = 0
+        for nct_id, last_update in versions.items():
+            trial = self._memory.get(nct_id)
+            if trial is not None and trial.last_update == last_update:
+                found[nct_id] = trial
+            elif trial is not None:
+                stale += 1
+
+        if self._conninfo and (missing := [i for i in versions if i not in found]):
+            for trial in self._load(missing):
+                if trial.last_update == versions[trial.nct_id]:
+                    self._memory.set(trial.nct_id, trial)
+                    found[trial.nct_id] = trial
+                elif self._memory.get(trial.nct_id) is None:
+                    stale += 1
+
+        self._count("hits", len(found))
+        self._count("stale", stale)
+        self._count("misses", len(versions) - len(found) - stale)
+        return found
+
+    def get_many(self, nct_ids: list[str]) -> dict[str, "ClinicalTrial"]:
+        """Return the stored trials, whatever their last update.
+
+        Used to restore trials referenced by a saved conversation, for which the
+        stored copy is good enough without listing them again.
+
+        Returns:
+            dict[str, ClinicalTrial]: Stored trials by NCT ID; unknown ones are
+                left out.
+        """
+        found = {
+            nct_id: trial
+            for nct_id in nct_ids
+            if (trial := self._memory.get(nct_id)) is not None
+        }
+        if self._conninfo and (missing := [i for i in nct_ids if i not in found]):
+            for trial in self._load(missing):
+                self._memory.set(trial.nct_id, trial)
+                found[trial.nct_id] = trial
+        return found
+
+    def put_many(self, trials: list["ClinicalTrial"]) -> None:
+        for trial in trials:
+            self._memory.set(trial.nct_id, trial)
+        if self._conninfo and trials:
+            self._save(trials)
+
+    def put_missing(self, trials: list["ClinicalTrial"]) -> None:
+        """Store the trials that are not the very ones already kept in memory."""
+        self.put_many([t for t in trials if self._memory.get(t.nct_id) is not t])
+
+    @property
+    def shared(self) -> bool:
+        """Whether the trials are kept in a database visible to all workers."""
+        return self._conninfo is not None
+
+    def _load(self, nct_ids: list[str]) -> list["ClinicalTrial"]:
+        from sqlalchemy import text
+
+        from clinical_trials_assistant.providers import ClinicalTrial
+
+        params = {f"id{i}": nct_id for i, nct_id in enumerate(nct_ids)}
+        placeholders = ", ".join(f":{name}" for name in params)
+        try:
+            with self._get_engine().connect() as conn:
+                rows = conn.execute(
+                    text(_SELECT.format(placeholders=placeholders)), params
+                ).all()
+        except Exception:
+            self._count("db_errors")
+            logger.exception("Failed to load trials from the database.")
+            return []
+        return [
+            ClinicalTrial(
+                nct_id=row[0],
+                official_title=row[1],
+                brief_summary=row[2],
+                # JSONB comes back decoded from Postgres, as text from SQLite.
+                results_section=json.loads(row[3])
+                if isinstance(row[3], str)
+                else row[3],
+                last_update=row[4] or "",
+            )
+            for row in rows
+        ]
+
+    def _save(self, trials: list["ClinicalTrial"]) -> None:
+        from sqlalchemy import text
+
+        updated_at = datetime.now(timezone.utc).isoformat()
+        rows = [
+            {
+                "nct_id": trial.nct_id,
+                "official_title": trial.official_title,
+                "brief_summary": trial.brief_summary,
+                "results_section": json.dumps(trial.results_section),
+                "last_update": trial.last_update,
+                "updated_at": updated_at,
+            }
+            for trial in trials
+        ]
+        try:
+            with self._get_engine().begin() as conn:
+                conn.execute(text(_UPSERT), rows)
+        except Exception:
+            self._count("db_errors")
+            logger.exception("Failed to save trials to the database.")
+
+    def clear(self) -> None:
+        """Forget the trials kept in memory and reset the counters."""
+        self._memory.clear()
+        with self._lock:
+            self._counters = dict.fromkeys(self._counters, 0)
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        return {"size": len(self._memory), **counters}
+
+
+def create_trial_store() -> TrialStore | None:
+    """Build the store configured by `TRIAL_STORE`, or None if it is disabled."""
+    if TRIAL_STORE == "off":
+        return None
+    conninfo = os.getenv("DATABASE_URL") if TRIAL_STORE == "database" else None
+    return TrialStore(conninfo)
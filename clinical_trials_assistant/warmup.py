@@ -0,0 +1,198 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any, Awaitable, Callable
+
+from clinical_trials_assistant.cache import LRUCache
+from clinical_trials_assistant.starters import STARTERS
+
+logger = getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP", "false").lower() == "true"
+STARTER_CACHE_TTL = float(os.getenv("STARTER_CACHE_TTL", "3600"))
+# Failed critical steps are retried until they succeed, waiting twice as long after
+# each failure up to the maximum, so a brief outage at boot does not keep the
+# worker out of rotation until it is restarted.
+WARMUP_RETRY_DELAY = float(os.getenv("WARMUP_RETRY_DELAY", "1"))
+WARMUP_RETRY_MAX_DELAY = float(os.getenv("WARMUP_RETRY_MAX_DELAY", "60"))
+
+# Final graph states of the starter prompts, keyed by message, so a conversation
+# opened from a starter gets its first answer without running the pipeline.
+starter_answers: LRUCache[str, dict[str, Any]] = LRUCache(
+    maxsize=max(len(STARTERS), 1), ttl=STARTER_CACHE_TTL
+)
+
+
+@dataclass
+class WarmupStep:
+    """A unit of warm-up work.
+
+    Non-critical steps may fail without blocking readiness and are not retried.
+    Critical steps are retried with exponential backoff until they succeed.
+    """
+
+    name: str
+    run: Callable[[], Awaitable[None]]
+    critical: bool = True
+    status: str = "pending"
+    duration: float | None = None
+    error: str | None = None
+    attempts: int = 0
+
+    async def __call__(self) -> None:
+        delay = WARMUP_RETRY_DELAY
+        while not await self._attempt() and self.critical:
+            logger.info(f"Retrying warm-up step {self.name!r} in {delay:g}s.")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_RETRY_MAX_DELAY)
+
+    async def _attempt(self) -> bool:
+        self.status = "running"
+        self.attempts += 1
+        started_at = time.perf_counter()
+        try:
+            await self.run()
+            self.status = "done"
+            self.error = None
+        except Exception as exc:
+            logger.exception(f"Warm-up step {self.name!r} failed.")
+            self.status = "failed"
+            self.error = repr(exc)
+        finally:
+            self.duration = round(time.perf_counter() - started_at, 3)
+        return self.status == "done"
+
+
+class Warmup:
+    """Runs warm-up steps in phases; steps within a phase run concurrently."""
+
+    def __init__(self, phases: list[list[WarmupStep]]) -> None:
+        self.phases = phases
+        self.task: asyncio.Task | None = None
+
+    @property
+    def steps(self) -> list[WarmupStep]:
+        return [step for phase in self.phases for step in phase]
+
+    @property
+    def ready(self) -> bool:
+        return all(
+            step.status == "done" or (not step.critical and step.status == "failed")
+            for step in self.steps
+        )
+
+    async def run(self) -> None:
+        for phase in self.phases:
+            await asyncio.gather(*(step() for step in phase))
+        logger.info(f"Warm-up finished, ready={self.ready}.")
+
+    def start(self) -> asyncio.Task:
+        """Start warming up in the background of the running event loop."""
+        self.task = asyncio.create_task(self.run())
+        return self.task
+
+    def status(self) -> dict[str, Any]:
+        steps = self.steps
+        return {
+            "ready": self.ready,
+            "progress": f"{sum(s.status in ('done', 'failed') for s in steps)}/{len(steps)}",
+            "steps": {
+                step.name: {
+                    "status": step.status,
+                    "critical": step.critical,
+                    "duration": step.duration,
+                    "attempts": step.attempts,
+                    "error": step.error,
+                }
+                for step in steps
+            },
+        }
+
+
+async def compile_graph() -> None:
+    from clinical_trials_assistant.graph import get_graph
+
+    await asyncio.to_thread(get_graph)
+
+
+async def open_database_pool() -> None:
+    """Create the Chainlit data layer and fill its connection pool."""
+    from chainlit.data import get_data_layer
+    from sqlalchemy import text
+
+    data_layer = await asyncio.to_thread(get_data_layer)
+    engine = getattr(data_layer, "engine", None)
+    if engine is None:
+        return
+
+    async def connect() -> None:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            # Hold the connection until all are open so each one is a new connection.
+            await asyncio.sleep(0.1)
+
+    pool_size = getattr(engine.pool, "size", lambda: 1)()
+    await asyncio.gather(*(connect() for _ in range(pool_size)))
+
+
+async def build_model_clients() -> None:
+    """Create the shared chat model clients and open a connection for each."""
+    from clinical_trials_assistant.nodes import get_chat_model, model_router
+
+    def connect(model: str) -> None:
+        root_client = getattr(get_chat_model(model), "root_client", None)
+        if root_client is not None:
+            root_client.models.list()
+
+    await asyncio.gather(
+        *(
+            asyncio.to_thread(connect, model)
+            for model in {m for r in model_router.routes.values() for m in r.models}
+        )
+    )
+
+
+async def connect_clinical_trials_api() -> None:
+    from clinical_trials_assistant.providers import CLINICAL_TRIALS_API_URL, session
+
+    response = await asyncio.to_thread(
+        session.get, f"{CLINICAL_TRIALS_API_URL}/version", timeout=10
+    )
+    response.raise_for_status()
+
+
+async def precompute_starter_answers() -> None:
+    """Answer the starter prompts, which also fills the provider caches."""
+    from langchain_core.messages import HumanMessage
+
+    from clinical_trials_assistant.graph import get_graph
+    from clinical_trials_assistant.nodes import State
+
+    async def answer(message: str) -> None:
+        state = State(
+            messages=[HumanMessage(message)],
+            is_valid_request=None,
+            retrieved_trials=None,
+            top_reranked_results_ids=None,
+            needs_additional_trials=None,
+            new_trial_ids=None,
+            deadline=None,
+        )
+        starter_answers.set(message, await get_graph().ainvoke(state))
+
+    await asyncio.gather(*(answer(message) for _, message in STARTERS))
+
+
+warmup = Warmup(
+    [
+        [
+            WarmupStep("graph", compile_graph),
+            WarmupStep("database", open_database_pool),
+            WarmupStep("model_clients", build_model_clients),
+            WarmupStep("clinical_trials_api", connect_clinical_trials_api),
+        ],
+        [WarmupStep("starter_answers", precompute_starter_answers, critical=False)],
+    ]
+)
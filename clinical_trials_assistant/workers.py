@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import cache
+from logging import getLogger
+from typing import Any, Callable, TypeVar
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+# "auto" picks threads on free-threaded (no-GIL) builds and processes otherwise;
+# "process", "thread" and "inline" force a mode.
+WORKER_POOL = os.getenv("WORKER_POOL", "auto")
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+# Payloads smaller than this are processed inline. Parsing a page of 30 studies in
+# a process pool took 2-3x as long as inline (95 KB: 3.0 vs 0.9 ms, 1.1 MB: 65 vs
+# 24 ms, 4.3 MB: 260 vs 122 ms), and unpickling the result still held the GIL for
+# 55-65% of the inline time, so only pages beyond the usual sizes are offloaded.
+WORKER_OFFLOAD_THRESHOLD = int(
+    os.getenv("WORKER_OFFLOAD_THRESHOLD", str(8 * 1024 * 1024))
+)
+
+
+def is_free_threaded() -> bool:
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+@cache
+def get_executor() -> Executor | None:
+    """Return the shared pool for CPU-bound work, created on first use."""
+    kind = WORKER_POOL
+    if kind == "auto":
+        kind = "thread" if is_free_threaded() else "process"
+
+    if kind == "process":
+        # `spawn` avoids forking a process that already runs event loop and
+        # executor threads.
+        return ProcessPoolExecutor(
+            max_workers=WORKER_POOL_SIZE,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    if kind == "thread":
+        return ThreadPoolExecutor(
+            max_workers=WORKER_POOL_SIZE, thread_name_prefix="cpu-worker"
+        )
+    if kind != "inline":
+        logger.warning(f"Unknown WORKER_POOL={kind!r}, running CPU work inline.")
+    return None
+
+
+def run_cpu_bound(fn: Callable[..., T], *args: Any, size: int) -> T:
+    """Run `fn(*args)` on the worker pool if `size` exceeds the offload threshold.
+
+    `fn` and its arguments must be picklable when a process pool is used. Bytes
+    arguments are handed over as-is: without copying on a thread pool, and
+    pickled once without any decoding on a process pool. Arguments that are
+    expensive to pickle (e.g. parsed objects) cost the caller about as much as
+    running `fn` inline, so only raw payloads are worth offloading.
+
+    The calling thread releases the GIL while a process works on `fn`, but takes
+    it again to unpickle the result, which costs more than half as much as running
+    `fn` inline. Offloading therefore adds latency and only shortens the time the
+    GIL is held, which is why the threshold is high.
+
+    Args:
+        fn (Callable[..., T]): A module-level, CPU-bound function.
+        *args (Any): Arguments for `fn`.
+        size (int): Approximate input size in bytes, compared to the threshold.
+
+    Returns:
+        T: The result of `fn`.
+    """
+    executor = get_executor() if size >= WORKER_OFFLOAD_THRESHOLD else None
+    if executor is None:
+        return fn(*args)
+    return executor.submit(fn, *args).result()
@@ -66,4 +66,60 @@ CREATE TABLE IF NOT EXISTS feedbacks (
     "value" INT NOT NULL,
     "comment" TEXT,
     FOREIGN KEY ("threadId") REFERENCES threads("id") ON DELETE CASCADE
+);
+
+-- Thread history: listing a user's threads newest first, loading the steps and
+-- elements of a resumed thread, and feedback filters. Re-running this script on an
+-- existing database adds them.
+CREATE INDEX IF NOT EXISTS threads_user_created_idx
+    ON threads ("userId", "createdAt" DESC, "id" DESC);
+
+CREATE INDEX IF NOT EXISTS threads_user_identifier_idx ON threads ("userIdentifier");
+
+CREATE INDEX IF NOT EXISTS steps_thread_created_idx
+    ON steps ("threadId", "createdAt", "id");
+
+CREATE INDEX IF NOT EXISTS steps_parent_idx ON steps ("parentId");
+
+CREATE INDEX IF NOT EXISTS elements_thread_idx ON elements ("threadId");
+
+CREATE INDEX IF NOT EXISTS elements_for_idx ON elements ("forId");
+
+CREATE INDEX IF NOT EXISTS feedbacks_for_idx ON feedbacks ("forId");
+
+CREATE INDEX IF NOT EXISTS feedbacks_thread_value_idx ON feedbacks ("threadId", "value");
+
+CREATE TABLE IF NOT EXISTS trials (
+    "nctId" TEXT PRIMARY KEY,
+    "officialTitle" TEXT NOT NULL,
+    "briefSummary" TEXT NOT NULL,
+    "resultsSection" JSONB NOT NULL,
+    "lastUpdatePostDate" TEXT,
+    "updatedAt" TEXT
+);
+
+-- Conversation state of each Chainlit thread: the latest LangGraph checkpoint and
+-- the pending writes of its tasks (see checkpointer.py).
+CREATE TABLE IF NOT EXISTS checkpoints (
+    "threadId" TEXT NOT NULL,
+    "checkpointNs" TEXT NOT NULL DEFAULT '',
+    "checkpointId" TEXT NOT NULL,
+    "parentCheckpointId" TEXT,
+    "type" TEXT NOT NULL,
+    "checkpoint" BYTEA NOT NULL,
+    "updatedAt" TEXT,
+    PRIMARY KEY ("threadId", "checkpointNs")
+);
+
+CREATE TABLE IF NOT EXISTS checkpoint_writes (
+    "threadId" TEXT NOT NULL,
+    "checkpointNs" TEXT NOT NULL DEFAULT '',
+    "checkpointId" TEXT NOT NULL,
+    "taskId" TEXT NOT NULL,
+    "idx" INT NOT NULL,
+    "channel" TEXT NOT NULL,
+    "type" TEXT NOT NULL,
+    "value" BYTEA NOT NULL,
+    "taskPath" TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY ("threadId", "checkpointNs", "checkpointId", "taskId", "idx")
 );
\ No newline at end of file
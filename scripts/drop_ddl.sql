@@ -2,4 +2,7 @@ DROP TABLE IF EXISTS users CASCADE;
 DROP TABLE IF EXISTS threads CASCADE;
 DROP TABLE IF EXISTS steps CASCADE;
 DROP TABLE IF EXISTS elements CASCADE;
-DROP TABLE IF EXISTS feedbacks CASCADE;
\ No newline at end of file
+DROP TABLE IF EXISTS feedbacks CASCADE;
+DROP TABLE IF EXISTS trials CASCADE;
+DROP TABLE IF EXISTS checkpoints CASCADE;
+DROP TABLE IF EXISTS checkpoint_writes CASCADE;
\ No newline at end of file
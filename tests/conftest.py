@@ -0,0 +1,16 @@
+import pytest
+
+from clinical_trials_assistant import nodes, providers
+
+
+@pytest.fixture(autouse=True)
+def reset_shared_clients(monkeypatch):
+    """Isolate tests from process-wide clients, limiters and caches."""
+    providers.api_guard.reset()
+    providers.fallback_cache.clear()
+    if providers.trial_store is not None:
+        providers.trial_store.clear()
+    nodes.get_chat_model.cache_clear()
+    nodes.model_router.reset()
+    monkeypatch.setattr(providers.api_guard, "_sleep", lambda _: None)
+    yield
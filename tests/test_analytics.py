@@ -0,0 +1,146 @@
+import numpy as np
+
+from clinical_trials_assistant import analytics
+from clinical_trials_assistant.analytics import (
+    compute_outcome_stats,
+    extract_outcomes,
+    format_trials_with_outcome_tables,
+)
+from clinical_trials_assistant.providers import ClinicalTrial
+
+
+def make_outcome(title: str, values: dict[str, str], type: str = "PRIMARY") -> dict:
+    group_ids = [f"OG00{i}" for i in range(len(values))]
+    return {
+        "type": type,
+        "title": title,
+        "paramType": "MEAN",
+        "unitOfMeasure": "units on a scale",
+        "timeFrame": "6 hours",
+        "groups": [
+            {"id": group_id, "title": group}
+            for group_id, group in zip(group_ids, values)
+        ],
+        "denoms": [
+            {
+                "units": "Participants",
+                "counts": [
+                    {"groupId": group_id, "value": "50"} for group_id in group_ids
+                ],
+            }
+        ],
+        "classes": [
+            {
+                "categories": [
+                    {
+                        "measurements": [
+                            {"groupId": group_id, "value": value}
+                            for group_id, value in zip(group_ids, values.values())
+                        ]
+                    }
+                ]
+            }
+        ],
+    }
+
+
+def make_trial(nct_id: str, *outcomes: dict) -> ClinicalTrial:
+    return ClinicalTrial(
+        nct_id=nct_id,
+        official_title=f"Trial {nct_id}",
+        brief_summary="Summary.",
+        results_section={
+            "outcomeMeasuresModule": {"outcomeMeasures": list(outcomes)},
+            "adverseEventsModule": {"frequencyThreshold": "5"},
+        },
+    )
+
+
+TRIALS = [
+    make_trial(
+        "NCT1",
+        make_outcome(
+            "Pain relief", {"Ibuprofen": "8.0", "Ibuprofen + caffeine": "10.0"}
+        ),
+        make_outcome(
+            "Rescue medication", {"Ibuprofen": "NA", "Placebo": "3"}, "SECONDARY"
+        ),
+    ),
+    make_trial(
+        "NCT2",
+        make_outcome(
+            "Pain relief",
+            {"Placebo": "2.0", "Ibuprofen": "9.0", "Paracetamol": "6.0"},
+        ),
+    ),
+]
+
+
+class TestOutcomeAnalytics:
+    """Test suite for local outcome comparisons over results sections."""
+
+    def test_extracts_numeric_measurements_into_columns(self) -> None:
+        """Test that every numeric group value becomes a row and others are skipped."""
+        data = extract_outcomes(TRIALS)
+
+        assert [m.nct_id for m in data.measures] == ["NCT1", "NCT1", "NCT2"]
+        np.testing.assert_array_equal(data.measure, [0, 0, 1, 2, 2, 2])
+        np.testing.assert_array_equal(data.value, [8, 10, 3, 2, 9, 6])
+        assert data.group[1] == "Ibuprofen + caffeine"
+        assert data.participants[0] == 50
+
+    def test_ranks_groups_and_computes_differences(self) -> None:
+        """Test per-measure rankings and highest-lowest differences."""
+        data = extract_outcomes(TRIALS)
+
+        stats = compute_outcome_stats(data)
+
+        np.testing.assert_array_equal(stats.group_count, [2, 1, 3])
+        np.testing.assert_array_equal(stats.rank, [2, 1, 1, 3, 1, 2])
+        assert data.group[stats.highest[2]] == "Ibuprofen"
+        assert data.group[stats.lowest[2]] == "Placebo"
+        np.testing.assert_allclose(stats.difference, [2, 0, 7])
+        np.testing.assert_allclose(stats.relative_difference, [0.25, 0, 3.5])
+
+    def test_answer_context_replaces_outcomes_with_tables(self) -> None:
+        """Test that the prompt gets computed tables instead of raw outcome dicts."""
+        rendered = format_trials_with_outcome_tables(TRIALS)
+
+        assert "outcomeMeasuresModule" not in rendered
+        assert "adverseEventsModule" in rendered
+        assert (
+            "- Pain relief (PRIMARY, MEAN, units on a scale, 6 hours)\n"
+            "  1. Ibuprofen + caffeine: 10 (n=50)\n"
+            "  2. Ibuprofen: 8 (n=50)\n"
+            "  difference 2 (+25.0% of lowest)"
+        ) in rendered
+        ranking = rendered.split("Largest between-group differences")[1]
+        assert ranking.index("NCT2 | Pain relief") < ranking.index("NCT1 | Pain relief")
+
+    def test_outcomes_missing_from_tables_are_kept(self, monkeypatch) -> None:
+        """Test that capped and non-numeric outcomes stay in the context as raw data."""
+        monkeypatch.setattr(analytics, "MAX_MEASURES_PER_TRIAL", 2)
+        trial = make_trial(
+            "NCT1",
+            make_outcome("Sleep quality", {"A": "1", "B": "2"}, "SECONDARY"),
+            make_outcome("Pain relief", {"A": "8", "B": "10"}),
+            make_outcome("Nausea", {"A": "3", "B": "4"}, "SECONDARY"),
+            make_outcome("Global impression", {"A": "Good", "B": "Fair"}),
+        )
+
+        rendered = format_trials_with_outcome_tables([trial])
+
+        entry = rendered.split("Largest between-group differences")[0]
+        tables, raw = entry.split("outcomeMeasuresModule")
+        assert "- Pain relief" in tables and "- Sleep quality" in tables
+        assert "Nausea" not in tables and "Global impression" not in tables
+        assert "'title': 'Nausea'" in raw and "'title': 'Global impression'" in raw
+        assert "Sleep quality" not in raw and "Pain relief" not in raw
+
+    def test_trials_without_results_are_rendered(self) -> None:
+        """Test that trials without outcome measures do not break rendering."""
+        trial = ClinicalTrial("NCT3", "Title", "Summary.", {})
+
+        assert (
+            format_trials_with_outcome_tables([trial]) == "NCT3: Title - Summary.\n{}"
+        )
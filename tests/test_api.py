@@ -0,0 +1,208 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from clinical_trials_assistant import api as api_module
+from clinical_trials_assistant import providers
+from clinical_trials_assistant.providers import ClinicalTrial
+
+
+class FakeGraph:
+    """Streams a rerank update and a two-chunk answer."""
+
+    def __init__(self) -> None:
+        self.states: list[dict] = []
+
+    async def astream(self, state, config=None, stream_mode=None):
+        self.states.append(state)
+        yield "updates", {"rerank": {**state, "top_reranked_results_ids": ["NCT1"]}}
+        for chunk in ["Ibuprofen ", "helps."]:
+            yield "messages", (AIMessageChunk(chunk), {"langgraph_node": "answer"})
+        answer = AIMessage("Ibuprofen helps.")
+        yield "messages", (answer, {"langgraph_node": "answer"})
+        yield (
+            "updates",
+            {
+                "answer": {
+                    **state,
+                    "messages": [*state["messages"], answer],
+                    "top_reranked_results_ids": ["NCT1"],
+                }
+            },
+        )
+
+
+def make_trial(nct_id: str) -> ClinicalTrial:
+    return ClinicalTrial(
+        nct_id=nct_id, official_title="", brief_summary="", results_section={}
+    )
+
+
+def parse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append(
+            (event.removeprefix("event: "), json.loads(data[len("data: ") :]))
+        )
+    return events
+
+
+@pytest.fixture
+def client() -> TestClient:
+    app = FastAPI()
+    app.include_router(api_module.router)
+    return TestClient(app)
+
+
+class TestAskApi:
+    """Test suite for the streaming `/api/ask` endpoint."""
+
+    def test_streams_node_token_and_final_events(self, client, monkeypatch) -> None:
+        """Test that node updates, answer tokens and the final state are streamed."""
+        fake_graph = FakeGraph()
+        monkeypatch.setattr(api_module, "graph", fake_graph)
+
+        response = client.post(
+            "/api/ask",
+            json={"messages": [{"role": "user", "content": "Does ibuprofen help?"}]},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert parse_events(response.text) == [
+            ("node", {"node": "rerank"}),
+            ("token", {"content": "Ibuprofen "}),
+            ("token", {"content": "helps."}),
+            ("node", {"node": "answer"}),
+            (
+                "final",
+                {
+                    "messages": [
+                        {"role": "user", "content": "Does ibuprofen help?"},
+                        {"role": "assistant", "content": "Ibuprofen helps."},
+                    ],
+                    "retrieved_trials": [],
+                    "top_reranked_results_ids": ["NCT1"],
+                },
+            ),
+        ]
+        assert fake_graph.states[0]["retrieved_trials"] is None
+
+    def test_follow_up_reloads_retrieved_trials(self, client, monkeypatch) -> None:
+        """Test that trial IDs from a previous turn are fetched into the state."""
+        fake_graph = FakeGraph()
+        monkeypatch.setattr(api_module, "graph", fake_graph)
+        requested = []
+
+        def fake_fetch(nct_ids, budget):
+            requested.append(nct_ids)
+            return [make_trial(nct_id) for nct_id in ["NCT1", "NCT2"]]
+
+        monkeypatch.setattr(providers, "fetch_trials_by_id", fake_fetch)
+
+        response = client.post(
+            "/api/ask",
+            json={
+                "messages": [
+                    {"role": "user", "content": "Does ibuprofen help?"},
+                    {"role": "assistant", "content": "Yes."},
+                    {"role": "user", "content": "Any side effects?"},
+                ],
+                "retrieved_trials": ["NCT1", "NCT2", "NCT3"],
+                "top_reranked_results_ids": ["NCT1"],
+            },
+        )
+
+        assert requested == [["NCT1", "NCT2", "NCT3"]]
+        state = fake_graph.states[0]
+        assert [t.nct_id for t in state["retrieved_trials"]] == ["NCT1", "NCT2"]
+        assert state["top_reranked_results_ids"] == ["NCT1"]
+        assert parse_events(response.text)[-1][1]["retrieved_trials"] == [
+            "NCT1",
+            "NCT2",
+        ]
+
+    def test_follow_up_after_retrieve_more(self, client, monkeypatch) -> None:
+        """Test that a final event with more trials than one search is accepted back."""
+        nct_ids = [f"NCT{i:08d}" for i in range(providers.MAX_TRIALS_PER_QUERY + 10)]
+        searched, merged = nct_ids[: providers.MAX_TRIALS_PER_QUERY], nct_ids
+
+        class RetrieveMoreGraph(FakeGraph):
+            async def astream(self, state, config=None, stream_mode=None):
+                self.states.append(state)
+                answer = AIMessage("More trials.")
+                # As after `retrieve_more`: the new trials are merged into the set.
+                yield (
+                    "updates",
+                    {
+                        "answer": {
+                            **state,
+                            "messages": [*state["messages"], answer],
+                            "retrieved_trials": [make_trial(i) for i in merged],
+                        }
+                    },
+                )
+
+        fake_graph = RetrieveMoreGraph()
+        monkeypatch.setattr(api_module, "graph", fake_graph)
+        monkeypatch.setattr(providers, "trial_store", None)
+        studies = []
+
+        def fake_get(params, timeout, parse=None):
+            page = params["filter.ids"].split(",")
+            studies.append(page)
+            return [make_trial(nct_id) for nct_id in page]
+
+        monkeypatch.setattr(providers, "_get_studies", fake_get)
+
+        first = client.post(
+            "/api/ask",
+            json={
+                "messages": [
+                    {"role": "user", "content": "Does ibuprofen help?"},
+                    {"role": "assistant", "content": "Yes."},
+                    {"role": "user", "content": "What about children?"},
+                ],
+                "retrieved_trials": searched,
+            },
+        )
+        event, final = parse_events(first.text)[-1]
+        second = client.post("/api/ask", json=final)
+
+        assert event == "final"
+        assert final["retrieved_trials"] == merged
+        assert second.status_code == 200
+        assert parse_events(second.text)[-1][0] == "final"
+        assert [t.nct_id for t in fake_graph.states[1]["retrieved_trials"]] == merged
+        assert [len(page) for page in studies[1:]] == [
+            providers.MAX_TRIALS_PER_QUERY,
+            10,
+        ]
+
+    def test_errors_are_reported_as_events(self, client, monkeypatch) -> None:
+        """Test that a failure mid-stream ends the stream with an error event."""
+
+        class FailingGraph:
+            async def astream(self, state, config=None, stream_mode=None):
+                raise RuntimeError("model unavailable")
+                yield
+
+        monkeypatch.setattr(api_module, "graph", FailingGraph())
+
+        response = client.post(
+            "/api/ask", json={"messages": [{"role": "user", "content": "Hi"}]}
+        )
+
+        [(event, data)] = parse_events(response.text)
+        assert event == "error"
+        assert "model unavailable" in data["detail"]
+
+    def test_rejects_empty_conversation(self, client) -> None:
+        """Test that requests without messages are rejected before streaming."""
+        response = client.post("/api/ask", json={"messages": []})
+
+        assert response.status_code == 422
@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from clinical_trials_assistant import batch as batch_module
+from clinical_trials_assistant.batch import run_batch
+
+
+class FakeGraph:
+    """Answers by echoing the question, failing for questions containing `fail`."""
+
+    def __init__(self) -> None:
+        self.running = 0
+        self.max_running = 0
+        self.questions: list[str] = []
+
+    async def astream(self, state, config=None, stream_mode=None):
+        question = state["messages"][-1].content
+        self.questions.append(question)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.01)
+            yield {"validate": {**state, "is_valid_request": True}}
+            if "fail" in question:
+                raise RuntimeError("API unavailable")
+            await asyncio.sleep(0.01)
+            yield {
+                "answer": {
+                    **state,
+                    "messages": [*state["messages"], AIMessage(f"Re: {question}")],
+                    "top_reranked_results_ids": ["NCT00000001"],
+                }
+            }
+        finally:
+            self.running -= 1
+
+
+def write_questions(path, questions) -> None:
+    path.write_text("".join(json.dumps(q) + "\n" for q in questions))
+
+
+def read_results(path) -> dict[str, dict]:
+    return {r["id"]: r for r in map(json.loads, path.read_text().splitlines())}
+
+
+class TestBatch:
+    """Test suite for the batch question-answering CLI."""
+
+    @pytest.mark.asyncio
+    async def test_answers_questions_with_bounded_concurrency(
+        self, tmp_path, monkeypatch
+    ) -> None:
+        """Test that results are written per question and concurrency is capped."""
+        fake_graph = FakeGraph()
+        monkeypatch.setattr(batch_module, "get_graph", lambda: fake_graph)
+        input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+        write_questions(
+            input_path,
+            [{"id": f"q{i}", "question": f"Question {i}"} for i in range(6)]
+            + [{"question": "Please fail"}],
+        )
+
+        failures = await run_batch(input_path, output_path, concurrency=2)
+
+        assert failures == 1
+        assert fake_graph.max_running == 2
+        results = read_results(output_path)
+        assert len(results) == 7
+        assert results["q3"]["answer"] == "Re: Question 3"
+        assert results["q3"]["top_reranked_results_ids"] == ["NCT00000001"]
+        assert results["q3"]["error"] is None
+        assert set(results["q3"]["timings"]) == {"validate", "answer"}
+        # Questions without an ID are identified by their line number.
+        assert "API unavailable" in results["7"]["error"]
+
+    @pytest.mark.asyncio
+    async def test_resume_skips_answered_questions(self, tmp_path, monkeypatch) -> None:
+        """Test that a re-run only answers new and previously failed questions."""
+        fake_graph = FakeGraph()
+        monkeypatch.setattr(batch_module, "get_graph", lambda: fake_graph)
+        input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+        write_questions(
+            input_path,
+            [
+                {"id": "done", "question": "Answered"},
+                {"id": "failed", "question": "Failed before"},
+                {"id": "new", "question": "Not started"},
+            ],
+        )
+        output_path.write_text(
+            json.dumps({"id": "done", "answer": "Re: Answered", "error": None})
+            + "\n"
+            + json.dumps({"id": "failed", "error": "RuntimeError()"})
+            + "\n"
+            + '{"id": "new", "answ'
+        )
+
+        await run_batch(input_path, output_path, concurrency=4)
+
+        assert sorted(fake_graph.questions) == ["Failed before", "Not started"]
+        new_results = [
+            json.loads(line) for line in output_path.read_text().splitlines()[3:]
+        ]
+        assert {r["id"] for r in new_results} == {"failed", "new"}
@@ -0,0 +1,117 @@
+import re
+from pathlib import Path
+
+import pytest
+import sqlalchemy
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from clinical_trials_assistant.checkpointer import SQLAlchemyCheckpointSaver
+from clinical_trials_assistant.persistence import PaginatedDataLayer
+from clinical_trials_assistant.providers import ClinicalTrial
+from clinical_trials_assistant.trial_store import TrialStore
+
+DDL_PATH = Path(__file__).parent.parent / "scripts" / "ddl.sql"
+CONFIG = {"configurable": {"thread_id": "thread-1"}}
+
+
+class State(MessagesState):
+    retrieved_trials: list[ClinicalTrial] | None
+
+
+def retrieve(state: State) -> dict:
+    """Add one trial per turn and answer with the number of trials held."""
+    trials = state.get("retrieved_trials") or []
+    nct_id = f"NCT{len(trials):08d}"
+    trials = [*trials, ClinicalTrial(nct_id, "Title", "Summary", {"marker": nct_id})]
+    return {"retrieved_trials": trials, "messages": [AIMessage(f"{len(trials)}")]}
+
+
+def build_graph(saver: SQLAlchemyCheckpointSaver):
+    builder = StateGraph(State)
+    builder.add_node("retrieve", retrieve)
+    builder.add_edge(START, "retrieve")
+    builder.add_edge("retrieve", END)
+    return builder.compile(checkpointer=saver)
+
+
+@pytest.fixture
+def db_url(tmp_path) -> str:
+    url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    with sqlalchemy.create_engine(url).begin() as conn:
+        for statement in re.split(r";\s*$", DDL_PATH.read_text(), flags=re.M):
+            if statement.strip():
+                conn.execute(sqlalchemy.text(statement))
+    return url
+
+
+def saved_checkpoints(db_url: str) -> list[bytes]:
+    with sqlalchemy.create_engine(db_url).connect() as conn:
+        return (
+            conn.execute(
+                sqlalchemy.text(
+                    'SELECT checkpoint FROM checkpoints ORDER BY "threadId"'
+                )
+            )
+            .scalars()
+            .all()
+        )
+
+
+class TestSQLAlchemyCheckpointSaver:
+    """Test suite for conversation state saved in the database per thread."""
+
+    @pytest.mark.asyncio
+    async def test_conversation_continues_on_another_worker(self, db_url) -> None:
+        """Test that a turn answered by one worker is continued by another one."""
+        first_worker = build_graph(
+            SQLAlchemyCheckpointSaver(db_url, TrialStore(db_url))
+        )
+        await first_worker.ainvoke({"messages": [HumanMessage("Ibuprofen?")]}, CONFIG)
+
+        other_worker = build_graph(
+            SQLAlchemyCheckpointSaver(
+                db_url.replace("sqlite:///", "sqlite+aiosqlite:///"),
+                TrialStore(db_url),
+            )
+        )
+        state = await other_worker.ainvoke(
+            {"messages": [HumanMessage("And naproxen?")]}, CONFIG
+        )
+
+        assert [m.content for m in state["messages"]] == [
+            "Ibuprofen?",
+            "1",
+            "And naproxen?",
+            "2",
+        ]
+        assert state["retrieved_trials"][0].results_section == {"marker": "NCT00000000"}
+        # Only the latest checkpoint of the thread is kept.
+        assert len(saved_checkpoints(db_url)) == 1
+
+    def test_trials_are_saved_by_reference_with_a_shared_store(self, db_url) -> None:
+        """Test that trials are saved as NCT IDs only if all workers can load them."""
+        build_graph(SQLAlchemyCheckpointSaver(db_url, TrialStore(db_url))).invoke(
+            {"messages": [HumanMessage("Ibuprofen?")]}, CONFIG
+        )
+        build_graph(SQLAlchemyCheckpointSaver(db_url, TrialStore())).invoke(
+            {"messages": [HumanMessage("Ibuprofen?")]},
+            {"configurable": {"thread_id": "thread-2"}},
+        )
+
+        by_reference, in_full = saved_checkpoints(db_url)
+
+        assert b"marker" not in by_reference
+        assert b"marker" in in_full
+
+    @pytest.mark.asyncio
+    async def test_deleted_thread_loses_its_state(self, db_url) -> None:
+        """Test that deleting a Chainlit thread deletes its saved conversation."""
+        graph = build_graph(SQLAlchemyCheckpointSaver(db_url, TrialStore(db_url)))
+        await graph.ainvoke({"messages": [HumanMessage("Ibuprofen?")]}, CONFIG)
+
+        await PaginatedDataLayer(
+            conninfo=db_url.replace("sqlite:///", "sqlite+aiosqlite:///")
+        ).delete_thread("thread-1")
+
+        assert (await graph.aget_state(CONFIG)).values == {}
@@ -100,7 +100,9 @@ async def test_on_message_sends_assistant_message(monkeypatch):
             self.content = content
 
     # Stub async generator returned by graph.astream.
-    async def fake_astream(state, stream_mode=None):  # pragma: no cover - generator
+    async def fake_astream(
+        state, config=None, stream_mode=None
+    ):  # pragma: no cover - generator
         # Simulate a rerank update (so sidebar creation branch executes).
         yield (
             "updates",
@@ -211,7 +213,7 @@ async def test_on_message_sets_metadata_for_resume(monkeypatch):
         def __init__(self, content: str):
             self.content = content
 
-    async def fake_astream(state, stream_mode=None):
+    async def fake_astream(state, config=None, stream_mode=None):
         yield (
             "updates",
             {
@@ -240,3 +242,90 @@ async def test_on_message_sets_metadata_for_resume(monkeypatch):
     assert "retrieved_trials" in msg.metadata, (
         "Missing retrieved trials info in metadata."
     )
+
+
+@pytest.mark.asyncio
+async def test_stopped_answer_is_kept(monkeypatch):
+    """Stopping an answer keeps its streamed part in the thread and the session.
+
+    Chainlit stops an answer by cancelling the message task, which raises
+    `asyncio.CancelledError` inside the graph stream.
+    """
+    import asyncio
+
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    from clinical_trials_assistant import chainlit as app_module
+
+    earlier = [HumanMessage("Earlier question"), AIMessage("Earlier answer")]
+    session_store = {"messages": earlier}
+
+    class DummyUserSession:
+        def get(self, key):
+            return session_store.get(key)
+
+        def set(self, key, value):
+            session_store[key] = value
+
+    monkeypatch.setattr(app_module.cl, "user_session", DummyUserSession())
+
+    class DummyStep:
+        def __init__(self, *_, **__):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc, tb):
+            return False
+
+    monkeypatch.setattr(app_module.cl, "Step", DummyStep)
+
+    sent_messages = []
+    streaming = asyncio.Event()
+
+    class DummyMessage:
+        def __init__(self, content: str = "", author: str | None = None):
+            self.content = content
+            self.metadata = None
+
+        async def stream_token(self, token: str):
+            self.content += token
+            streaming.set()
+
+        async def send(self):
+            sent_messages.append(self)
+
+    monkeypatch.setattr(app_module.cl, "Message", DummyMessage)
+
+    class Token:
+        def __init__(self, content: str):
+            self.content = content
+
+    async def fake_astream(state, config=None, stream_mode=None):
+        yield ("messages", (Token("Partial"), {"langgraph_node": "answer"}))
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(app_module, "graph", SimpleNamespace(astream=fake_astream))
+
+    class InboundMessage:
+        def __init__(self, content: str):
+            self.content = content
+
+    task = asyncio.create_task(app_module.on_message(InboundMessage("Follow-up")))
+    await asyncio.wait_for(streaming.wait(), timeout=5)
+    assert len(earlier) == 2, "The session conversation was changed mid-turn."
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert [m.content for m in sent_messages] == ["Partial"]
+    assert sent_messages[0].metadata["retrieved_trials"] == []
+    assert [m.content for m in session_store["messages"]] == [
+        "Earlier question",
+        "Earlier answer",
+        "Follow-up",
+        "Partial",
+    ]
+    assert session_store["cancel_event"].is_set()
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+from langchain_openai import ChatOpenAI
+
+from clinical_trials_assistant.deadline import (
+    DeadlineExceededError,
+    RequestBudget,
+    RequestCancelledError,
+)
+from clinical_trials_assistant.routing import (
+    CancelOnTokenHandler,
+    ModelRouter,
+    Route,
+    _with_timeout,
+)
+
+
+class TestRequestBudget:
+    """Test suite for per-request deadlines and cancellation."""
+
+    def test_timeout_is_capped_by_remaining_time(self) -> None:
+        """Test that call timeouts shrink as the request runs out of time."""
+        assert RequestBudget().timeout(10) == 10
+        assert RequestBudget().timeout() is None
+        assert 4 < RequestBudget(time.time() + 5).timeout(10) <= 5
+        assert RequestBudget(time.time() + 60).timeout(10) == 10
+
+    def test_check_raises_when_expired_or_cancelled(self) -> None:
+        """Test that expired and cancelled requests are reported distinctly."""
+        with pytest.raises(DeadlineExceededError):
+            RequestBudget(time.time() - 1).check()
+
+        cancel_event = threading.Event()
+        budget = RequestBudget(time.time() + 60, cancel_event)
+        budget.check()
+        cancel_event.set()
+        with pytest.raises(RequestCancelledError):
+            budget.check()
+
+    def test_from_run_reads_state_and_config(self) -> None:
+        """Test that the deadline comes from state and the signal from config."""
+        cancel_event = threading.Event()
+
+        budget = RequestBudget.from_run(
+            {"deadline": 123.0}, {"configurable": {"cancel_event": cancel_event}}
+        )
+
+        assert budget == RequestBudget(123.0, cancel_event)
+        assert RequestBudget.from_run({}, None) == RequestBudget()
+
+    def test_streamed_completion_stops_when_cancelled(self) -> None:
+        """Test that token streaming is interrupted as soon as stop is pressed."""
+        cancel_event = threading.Event()
+        model = FakeListChatModel(responses=["a long answer about ibuprofen"])
+        handler = CancelOnTokenHandler(RequestBudget(cancel_event=cancel_event))
+
+        chunks = []
+        with pytest.raises(RequestCancelledError):
+            for chunk in model.stream("question", config={"callbacks": [handler]}):
+                chunks.append(chunk)
+                cancel_event.set()
+
+        assert len(chunks) == 1
+
+
+class TestRouterCancellation:
+    """Test suite for cancellation of routed model calls."""
+
+    def test_cancelled_request_does_not_fall_back(self) -> None:
+        """Test that a stopped request is not retried on the fallback models."""
+        cancel_event = threading.Event()
+        calls = []
+
+        def slow_model(inputs):
+            calls.append(inputs)
+            time.sleep(1)
+            return "late answer"
+
+        router = ModelRouter(
+            {"node": Route(["big", "small"], budget=5)},
+            get_model=lambda model: RunnableLambda(slow_model),
+        )
+        threading.Timer(0.1, cancel_event.set).start()
+
+        started_at = time.perf_counter()
+        with pytest.raises(RequestCancelledError):
+            router.invoke(
+                "node", lambda llm: llm, {}, RequestBudget(cancel_event=cancel_event)
+            )
+
+        assert time.perf_counter() - started_at < 0.6
+        assert len(calls) == 1
+
+    def test_route_budget_is_capped_by_request_deadline(self) -> None:
+        """Test that a model gets no more time than the request has left."""
+        router = ModelRouter(
+            {"node": Route(["big"], budget=30)},
+            get_model=lambda model: RunnableLambda(lambda _: time.sleep(1)),
+        )
+
+        started_at = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            router.invoke("node", lambda llm: llm, {}, RequestBudget(time.time() + 0.2))
+
+        assert time.perf_counter() - started_at < 0.6
+
+    def test_only_openai_clients_get_a_call_timeout(self) -> None:
+        """Test that the per-call timeout is not passed to other providers."""
+        openai = ChatOpenAI(model="gpt-4.1-mini", api_key="test")
+        other = FakeListChatModel(responses=["answer"])
+
+        assert _with_timeout(openai, 5).kwargs == {"timeout": 5}
+        assert _with_timeout(other, 5) is other
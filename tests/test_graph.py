@@ -0,0 +1,64 @@
+import subprocess
+import sys
+
+from clinical_trials_assistant import graph as graph_module
+
+
+class TestLazyGraph:
+    """Test suite for deferred graph compilation."""
+
+    def test_importing_the_chainlit_app_does_not_load_the_graph(self) -> None:
+        """Test that LangChain, LangGraph and the nodes are only imported on first
+        use."""
+        code = (
+            "import sys\n"
+            "import clinical_trials_assistant.chainlit\n"
+            "assert 'clinical_trials_assistant.nodes' not in sys.modules\n"
+            "assert 'clinical_trials_assistant.providers' not in sys.modules\n"
+            "assert 'langchain_core' not in sys.modules\n"
+            "assert 'langgraph' not in sys.modules\n"
+            "assert 'sqlalchemy' not in sys.modules\n"
+        )
+
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_importing_the_api_does_not_load_the_providers(self) -> None:
+        """Test that the API router imports neither LangChain nor `requests`.
+
+        Chainlit loads `requests` itself, so only the router is checked for it.
+        """
+        code = (
+            "import sys\n"
+            "import clinical_trials_assistant.api\n"
+            "assert 'clinical_trials_assistant.providers' not in sys.modules\n"
+            "assert 'langchain_core' not in sys.modules\n"
+            "assert 'requests' not in sys.modules\n"
+        )
+
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_importing_the_data_layer_does_not_load_langchain(self) -> None:
+        """Test that creating Chainlit's data layer does not import LangChain."""
+        code = (
+            "import sys\n"
+            "import clinical_trials_assistant.persistence\n"
+            "assert 'langchain_core' not in sys.modules\n"
+            "assert 'langchain_openai' not in sys.modules\n"
+        )
+
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_graph_is_compiled_once_on_first_access(self) -> None:
+        """Test that the proxy forwards to a single compiled graph."""
+        compiled = graph_module.get_graph()
+
+        assert graph_module.get_graph() is compiled
+        assert graph_module.graph.astream == compiled.astream
+
+    def test_background_warm_up_compiles_the_graph(self, monkeypatch) -> None:
+        """Test that warm-up compiles the graph on a separate thread."""
+        monkeypatch.setattr(graph_module, "_graph", None)
+
+        graph_module.warm_up_in_background().join(timeout=30)
+
+        assert graph_module._graph is not None
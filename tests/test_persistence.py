@@ -0,0 +1,256 @@
+import asyncio
+import re
+import uuid
+from pathlib import Path
+
+import pytest
+import sqlalchemy
+from chainlit.types import Pagination, ThreadFilter
+
+from clinical_trials_assistant.persistence import BufferedDataLayer, PaginatedDataLayer
+
+DDL_PATH = Path(__file__).parent.parent / "scripts" / "ddl.sql"
+THREAD_ID = "00000000-0000-0000-0000-000000000001"
+# Without the decorator, which needs a Chainlit session.
+create_step = BufferedDataLayer.create_step.__wrapped__
+
+
+@pytest.fixture
+def db_url(tmp_path) -> str:
+    url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    with sqlalchemy.create_engine(url).begin() as conn:
+        for statement in re.split(r";\s*$", DDL_PATH.read_text(), flags=re.M):
+            if statement.strip():
+                conn.execute(sqlalchemy.text(statement))
+    return url
+
+
+def step(step_id: str, output: str) -> dict:
+    return {
+        "id": step_id,
+        "name": "Clinical Trial Assistant",
+        "type": "run",
+        "threadId": THREAD_ID,
+        "streaming": False,
+        "output": output,
+        "createdAt": f"2025-01-01T00:00:0{step_id[-1]}Z",
+    }
+
+
+def count_steps(db_url: str) -> int:
+    with sqlalchemy.create_engine(db_url).connect() as conn:
+        return conn.execute(sqlalchemy.text("SELECT COUNT(*) FROM steps")).scalar()
+
+
+class TestBufferedDataLayer:
+    """Test suite for write-behind persistence of Chainlit steps."""
+
+    @pytest.mark.asyncio
+    async def test_writes_are_batched_in_order(self, db_url) -> None:
+        """Test that queued writes are persisted together, the last update winning."""
+        layer = BufferedDataLayer(
+            conninfo=db_url.replace("sqlite:///", "sqlite+aiosqlite:///"),
+            flush_interval=60,
+        )
+
+        await create_step(layer, step("s1", "Thinking"))
+        await create_step(layer, step("s1", "Ibuprofen helps."))
+        await create_step(layer, step("s2", ""))
+
+        assert count_steps(db_url) == 0
+        assert layer.metrics()["queue_depth"] == 6
+
+        thread = await layer.get_thread(THREAD_ID)
+
+        assert [(s["id"], s["output"]) for s in thread["steps"]] == [
+            ("s1", "Ibuprofen helps."),
+            ("s2", ""),
+        ]
+        metrics = layer.metrics()
+        assert metrics["queue_depth"] == 0
+        assert (metrics["flushes"], metrics["statements"]) == (1, 6)
+        await layer.close()
+
+    @pytest.mark.asyncio
+    async def test_writes_are_flushed_in_the_background(self, db_url) -> None:
+        """Test that the flusher persists writes without a read or session end."""
+        layer = BufferedDataLayer(
+            conninfo=db_url.replace("sqlite:///", "sqlite+aiosqlite:///"),
+            flush_interval=0.01,
+        )
+
+        await create_step(layer, step("s1", "Done"))
+        for _ in range(100):
+            if layer.metrics()["flushes"]:
+                break
+            await asyncio.sleep(0.01)
+
+        assert count_steps(db_url) == 1
+        assert layer.metrics()["flush_latency_ms"]["p50"] is not None
+        await layer.close()
+
+    @pytest.mark.asyncio
+    async def test_reads_do_not_wait_without_pending_writes(self, db_url) -> None:
+        """Test that reads skip the flush lock when no write is queued or running."""
+        layer = BufferedDataLayer(
+            conninfo=db_url.replace("sqlite:///", "sqlite+aiosqlite:///"),
+            flush_interval=60,
+        )
+        await create_step(layer, step("s1", "Done"))
+        await layer.flush()
+
+        async with layer._flush_lock:
+            thread = await asyncio.wait_for(layer.get_thread(THREAD_ID), timeout=1)
+
+        assert [s["id"] for s in thread["steps"]] == ["s1"]
+        await layer.close()
+
+    @pytest.mark.asyncio
+    async def test_reads_wait_for_writes_being_flushed(self, db_url, monkeypatch):
+        """Test that a read sees writes taken off the queue but not committed yet."""
+        layer = BufferedDataLayer(
+            conninfo=db_url.replace("sqlite:///", "sqlite+aiosqlite:///"),
+            flush_interval=60,
+        )
+        write = layer._write
+
+        async def slow_write(batch):
+            await asyncio.sleep(0.05)
+            await write(batch)
+
+        monkeypatch.setattr(layer, "_write", slow_write)
+        await create_step(layer, step("s1", "Done"))
+        flush = asyncio.create_task(layer.flush())
+        await asyncio.sleep(0)
+        assert layer.metrics()["queue_depth"] == 0
+
+        thread = await layer.get_thread(THREAD_ID)
+
+        assert [s["id"] for s in thread["steps"]] == ["s1"]
+        await flush
+        await layer.close()
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_is_retried_one_by_one(self, db_url) -> None:
+        """Test that one invalid write does not drop the rest of its batch."""
+        layer = BufferedDataLayer(
+            conninfo=db_url.replace("sqlite:///", "sqlite+aiosqlite:///"),
+            flush_interval=60,
+        )
+
+        await create_step(layer, step("s1", "Kept"))
+        await layer.execute_sql("INSERT INTO missing_table VALUES (:id)", {"id": 1})
+        await create_step(layer, step("s2", "Kept too"))
+        await layer.close()
+
+        assert count_steps(db_url) == 2
+        assert layer.metrics()["batch_failures"] == 1
+
+
+def seed_threads(db_url: str) -> None:
+    """Five threads of user `u1` (t0 oldest), one of `u2`, and 5 steps in t4."""
+    with sqlalchemy.create_engine(db_url).begin() as conn:
+        conn.execute(
+            sqlalchemy.text(
+                'INSERT INTO threads ("id", "createdAt", "name", "userId") '
+                "VALUES (:id, :created_at, :name, :user_id)"
+            ),
+            [
+                {
+                    "id": f"t{i}",
+                    "created_at": f"2025-01-0{i + 1}T00:00:00Z",
+                    "name": f"Thread {i}",
+                    "user_id": "u1",
+                }
+                for i in range(5)
+            ]
+            + [{"id": "x", "created_at": "2025-02-01", "name": "", "user_id": "u2"}],
+        )
+        conn.execute(
+            sqlalchemy.text(
+                'INSERT INTO steps ("id", "name", "type", "threadId", "streaming", '
+                '"output", "createdAt") VALUES (:id, :name, :type, :threadId, '
+                ":streaming, :output, :createdAt)"
+            ),
+            [{**step(f"s{i}", f"Answer {i}"), "threadId": "t4"} for i in range(5)]
+            + [{**step("s9", "50% of patients"), "threadId": "t1"}],
+        )
+        conn.execute(
+            sqlalchemy.text(
+                'INSERT INTO feedbacks ("id", "forId", "threadId", "value") '
+                "VALUES ('f1', 's2', 't4', 1)"
+            )
+        )
+
+
+class TestPaginatedDataLayer:
+    """Test suite for keyset-paginated thread history reads."""
+
+    def test_uuid_columns_are_returned_as_strings(self) -> None:
+        """Test that UUIDs returned by the driver are converted, nulls included."""
+        layer = PaginatedDataLayer(conninfo="sqlite+aiosqlite:///:memory:")
+        step_id, parent_id = uuid.uuid4(), uuid.uuid4()
+        rows = [
+            {"id": step_id, "parentId": None, "metadata": {"key": "value"}},
+            {"id": parent_id, "parentId": step_id, "metadata": None},
+        ]
+
+        assert layer.clean_result(rows) == [
+            {"id": str(step_id), "parentId": None, "metadata": {"key": "value"}},
+            {"id": str(parent_id), "parentId": str(step_id), "metadata": None},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_thread_list_pages_follow_the_cursor(self, db_url) -> None:
+        """Test that pages are disjoint, newest first, and only of the user."""
+        seed_threads(db_url)
+        layer = PaginatedDataLayer(
+            conninfo=db_url.replace("sqlite:///", "sqlite+aiosqlite:///")
+        )
+
+        pages, cursor = [], None
+        while True:
+            page = await layer.list_threads(
+                Pagination(first=2, cursor=cursor), ThreadFilter(userId="u1")
+            )
+            pages.append([thread["id"] for thread in page.data])
+            cursor = page.pageInfo.endCursor
+            if not page.pageInfo.hasNextPage:
+                break
+
+        assert pages == [["t4", "t3"], ["t2", "t1"], ["t0"]]
+
+    @pytest.mark.asyncio
+    async def test_filters_are_applied_in_the_query(self, db_url) -> None:
+        """Test that search and feedback filters select threads by their steps."""
+        seed_threads(db_url)
+        layer = PaginatedDataLayer(
+            conninfo=db_url.replace("sqlite:///", "sqlite+aiosqlite:///")
+        )
+
+        async def ids(**filters) -> list[str]:
+            page = await layer.list_threads(
+                Pagination(first=10), ThreadFilter(userId="u1", **filters)
+            )
+            return [thread["id"] for thread in page.data]
+
+        assert await ids(search="ANSWER") == ["t4"]
+        # `%` is matched literally, not as a wildcard.
+        assert await ids(search="0%") == ["t1"]
+        assert await ids(feedback=1) == ["t4"]
+
+    @pytest.mark.asyncio
+    async def test_resumed_thread_steps_are_loaded_in_order(self, db_url) -> None:
+        """Test that all steps of the thread are loaded in order with feedback."""
+        seed_threads(db_url)
+        layer = PaginatedDataLayer(
+            conninfo=db_url.replace("sqlite:///", "sqlite+aiosqlite:///")
+        )
+
+        thread = await layer.get_thread("t4")
+
+        assert [s["output"] for s in thread["steps"]] == [
+            f"Answer {i}" for i in range(5)
+        ]
+        assert thread["steps"][2]["feedback"]["value"] == 1
+        assert await layer.get_thread("missing") is None
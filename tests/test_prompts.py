@@ -0,0 +1,57 @@
+import os
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from clinical_trials_assistant.prompts import (
+    ANSWER_PROMPT,
+    ESSIE_GUIDE,
+    RERANK_PROMPT,
+    VALIDATE_PROMPT,
+    retrieve_prompt,
+)
+
+
+def common_prefix(a: str, b: str) -> str:
+    return os.path.commonprefix([a, b])
+
+
+class TestPromptPrefixStability:
+    """Test suite ensuring the static part of each prompt is a stable prefix."""
+
+    def test_retrieve_prompt_static_guide_comes_first(self) -> None:
+        """Test that different user messages only change the end of the prompt."""
+        first = retrieve_prompt(1).format_messages(message="ibuprofen for back pain")
+        second = retrieve_prompt(1).format_messages(message="metformin in diabetes")
+
+        assert first[0] == second[0]
+        assert first[0].content.startswith(ESSIE_GUIDE)
+        assert len(first) == 2 and first[1].type == "human"
+
+    def test_retrieve_prompt_is_built_once(self) -> None:
+        """Test that the template is reused rather than rebuilt per call."""
+        assert retrieve_prompt(3) is retrieve_prompt(3)
+
+    def test_string_prompts_end_with_the_variable_parts(self) -> None:
+        """Test that instructions precede all per-request values."""
+        for prompt, inputs in [
+            (VALIDATE_PROMPT, {"message": "{}"}),
+            (RERANK_PROMPT, {"message": "{}", "trials": "{}"}),
+        ]:
+            first = prompt.format(**{k: v.format("a") for k, v in inputs.items()})
+            second = prompt.format(**{k: v.format("b") for k, v in inputs.items()})
+            static = prompt.template[: prompt.template.index("{")]
+
+            assert common_prefix(first, second) == static
+
+    def test_answer_prompt_prefix_is_stable_across_turns(self) -> None:
+        """Test that a new turn extends the previous turn's prompt."""
+        history = [HumanMessage("Does ibuprofen help?"), AIMessage("Yes.")]
+        previous_turn = ANSWER_PROMPT.format_messages(
+            trials="NCT00000001: Trial", messages=history[:1]
+        )
+        next_turn = ANSWER_PROMPT.format_messages(
+            trials="NCT00000001: Trial",
+            messages=[*history, HumanMessage("And caffeine?")],
+        )
+
+        assert next_turn[: len(previous_turn)] == previous_turn
@@ -1,19 +1,30 @@
-from unittest.mock import MagicMock, Mock, patch
+import json
+import threading
+import time
+from unittest.mock import ANY, MagicMock, Mock, patch
 
 import pytest
 import requests
 
+from clinical_trials_assistant.deadline import (
+    DeadlineExceededError,
+    RequestBudget,
+    RequestCancelledError,
+)
 from clinical_trials_assistant.providers import (
     CLINICAL_TRIALS_API_URL,
     MAX_TRIALS_PER_QUERY,
+    VERSION_FIELDS,
+    api_guard,
     fetch_clinical_trials,
 )
+from clinical_trials_assistant.resilience import CircuitOpenError
 
 
 class TestFetchClinicalTrialsDescriptions:
     """Test suite for fetch_clinical_trials_descriptions function."""
 
-    @patch("clinical_trials_assistant.providers.requests.get")
+    @patch("clinical_trials_assistant.providers.session.get")
     def test_http_error_raises_exception(self, mock_get: MagicMock) -> None:
         """Test that HTTP errors are properly propagated."""
         mock_response = Mock()
@@ -29,19 +40,20 @@ class TestFetchClinicalTrialsDescriptions:
             params={
                 "query.term": "test query",
                 "aggFilters": "results:with,status:com",
-                "fields": "NCTId,OfficialTitle,BriefSummary,ResultsSection",
+                "fields": VERSION_FIELDS,
                 "pageSize": MAX_TRIALS_PER_QUERY,
             },
+            timeout=ANY,
         )
 
-    @patch("clinical_trials_assistant.providers.requests.get")
+    @patch("clinical_trials_assistant.providers.session.get")
     def test_missing_studies_field_raises_value_error(
         self, mock_get: MagicMock
     ) -> None:
         """Test that missing 'studies' field in response raises ValueError."""
         mock_response = Mock()
         mock_response.raise_for_status.return_value = None
-        mock_response.json.return_value = {}  # Missing 'studies' field
+        mock_response.content = json.dumps({}).encode()  # Missing 'studies' field
         mock_get.return_value = mock_response
 
         with pytest.raises(
@@ -49,44 +61,48 @@ class TestFetchClinicalTrialsDescriptions:
         ):
             fetch_clinical_trials("test query")
 
-    @patch("clinical_trials_assistant.providers.requests.get")
+    @patch("clinical_trials_assistant.providers.session.get")
     def test_successful_response_with_complete_data(self, mock_get: MagicMock) -> None:
         """Test successful parsing of a complete API response."""
         # Mock a successful response with complete trial data
         mock_response = Mock()
         mock_response.raise_for_status.return_value = None
-        mock_response.json.return_value = {
-            "studies": [
-                {
-                    "protocolSection": {
-                        "identificationModule": {
-                            "nctId": "NCT12345678",
-                            "officialTitle": "Test Clinical Trial for Ibuprofen",
+        mock_response.content = json.dumps(
+            {
+                "studies": [
+                    {
+                        "protocolSection": {
+                            "identificationModule": {
+                                "nctId": "NCT12345678",
+                                "officialTitle": "Test Clinical Trial for Ibuprofen",
+                            },
+                            "descriptionModule": {
+                                "briefSummary": "This is a test summary of the clinical trial."
+                            },
                         },
-                        "descriptionModule": {
-                            "briefSummary": "This is a test summary of the clinical trial."
+                        "resultsSection": {
+                            "dummy_key_1": "dummy_value_1",
+                            "dummy_key_2": "dummy_value_2",
                         },
                     },
-                    "resultsSection": {
-                        "dummy_key_1": "dummy_value_1",
-                        "dummy_key_2": "dummy_value_2",
-                    },
-                },
-                {
-                    "protocolSection": {
-                        "identificationModule": {
-                            "nctId": "NCT87654321",
-                            "officialTitle": "Another Test Trial",
+                    {
+                        "protocolSection": {
+                            "identificationModule": {
+                                "nctId": "NCT87654321",
+                                "officialTitle": "Another Test Trial",
+                            },
+                            "descriptionModule": {
+                                "briefSummary": "Another test summary."
+                            },
+                        },
+                        "resultsSection": {
+                            "dummy_key_3": "dummy_value_3",
+                            "dummy_key_4": "dummy_value_4",
                         },
-                        "descriptionModule": {"briefSummary": "Another test summary."},
-                    },
-                    "resultsSection": {
-                        "dummy_key_3": "dummy_value_3",
-                        "dummy_key_4": "dummy_value_4",
                     },
-                },
-            ]
-        }
+                ]
+            }
+        ).encode()
         mock_get.return_value = mock_response
 
         results = fetch_clinical_trials("test query")
@@ -113,19 +129,19 @@ class TestFetchClinicalTrialsDescriptions:
             "dummy_key_4": "dummy_value_4",
         }
 
-    @patch("clinical_trials_assistant.providers.requests.get")
+    @patch("clinical_trials_assistant.providers.session.get")
     def test_empty_studies_list(self, mock_get: MagicMock) -> None:
         """Test handling of empty studies list."""
         mock_response = Mock()
         mock_response.raise_for_status.return_value = None
-        mock_response.json.return_value = {"studies": []}
+        mock_response.content = json.dumps({"studies": []}).encode()
         mock_get.return_value = mock_response
 
         results = fetch_clinical_trials("nonexistent query")
 
         assert results == []
 
-    @patch("clinical_trials_assistant.providers.requests.get")
+    @patch("clinical_trials_assistant.providers.session.get")
     @patch("clinical_trials_assistant.providers.logger")
     def test_incomplete_trial_data_logs_warning(
         self, mock_logger: MagicMock, mock_get: MagicMock
@@ -134,34 +150,36 @@ class TestFetchClinicalTrialsDescriptions:
         # Mock response with incomplete trial data
         mock_response = Mock()
         mock_response.raise_for_status.return_value = None
-        mock_response.json.return_value = {
-            "studies": [
-                {
-                    "protocolSection": {
-                        "identificationModule": {
-                            "nctId": "NCT12345678"
-                            # Missing officialTitle
-                        },
-                        "descriptionModule": {
-                            "briefSummary": "This is a test summary."
+        mock_response.content = json.dumps(
+            {
+                "studies": [
+                    {
+                        "protocolSection": {
+                            "identificationModule": {
+                                "nctId": "NCT12345678"
+                                # Missing officialTitle
+                            },
+                            "descriptionModule": {
+                                "briefSummary": "This is a test summary."
+                            },
+                        }
+                        # Missing resultsSection
+                    },
+                    {
+                        "protocolSection": {
+                            "identificationModule": {
+                                "nctId": "NCT87654321",
+                                "officialTitle": "Complete Trial",
+                            },
+                            "descriptionModule": {"briefSummary": "Complete summary."},
                         },
-                    }
-                    # Missing resultsSection
-                },
-                {
-                    "protocolSection": {
-                        "identificationModule": {
-                            "nctId": "NCT87654321",
-                            "officialTitle": "Complete Trial",
+                        "resultsSection": {
+                            "dummy_key": "dummy_value",
                         },
-                        "descriptionModule": {"briefSummary": "Complete summary."},
-                    },
-                    "resultsSection": {
-                        "dummy_key": "dummy_value",
                     },
-                },
-            ]
-        }
+                ]
+            }
+        ).encode()
         mock_get.return_value = mock_response
 
         results = fetch_clinical_trials("test query")
@@ -175,12 +193,12 @@ class TestFetchClinicalTrialsDescriptions:
         assert "Skipping trial with missing fields" in warning_call
         assert "NCT12345678" in warning_call
 
-    @patch("clinical_trials_assistant.providers.requests.get")
+    @patch("clinical_trials_assistant.providers.session.get")
     def test_correct_api_parameters(self, mock_get: MagicMock) -> None:
         """Test that the correct parameters are sent to the API."""
         mock_response = Mock()
         mock_response.raise_for_status.return_value = None
-        mock_response.json.return_value = {"studies": []}
+        mock_response.content = json.dumps({"studies": []}).encode()
         mock_get.return_value = mock_response
 
         query = "diabetes treatment"
@@ -192,12 +210,13 @@ class TestFetchClinicalTrialsDescriptions:
             params={
                 "query.term": query,
                 "aggFilters": "results:with,status:com",
-                "fields": "NCTId,OfficialTitle,BriefSummary,ResultsSection",
+                "fields": VERSION_FIELDS,
                 "pageSize": MAX_TRIALS_PER_QUERY,
             },
+            timeout=ANY,
         )
 
-    @patch("clinical_trials_assistant.providers.requests.get")
+    @patch("clinical_trials_assistant.providers.session.get")
     def test_network_timeout_error(self, mock_get: MagicMock) -> None:
         """Test handling of network timeout errors."""
         mock_get.side_effect = requests.Timeout("Request timed out")
@@ -205,10 +224,107 @@ class TestFetchClinicalTrialsDescriptions:
         with pytest.raises(requests.Timeout):
             fetch_clinical_trials("test query")
 
-    @patch("clinical_trials_assistant.providers.requests.get")
+    @patch("clinical_trials_assistant.providers.session.get")
     def test_connection_error(self, mock_get: MagicMock) -> None:
         """Test handling of connection errors."""
         mock_get.side_effect = requests.ConnectionError("Connection failed")
 
         with pytest.raises(requests.ConnectionError):
             fetch_clinical_trials("test query")
+
+    @patch("clinical_trials_assistant.providers.session.get")
+    def test_throttled_request_is_retried(self, mock_get: MagicMock) -> None:
+        """Test that 429 responses are retried by the shared API guard."""
+        throttled = Mock()
+        throttled.status_code = 429
+        throttled.headers = {"Retry-After": "0"}
+        throttled.raise_for_status.side_effect = requests.HTTPError(response=throttled)
+        ok = Mock()
+        ok.raise_for_status.return_value = None
+        ok.content = json.dumps({"studies": []}).encode()
+        mock_get.side_effect = [throttled, ok]
+
+        assert fetch_clinical_trials("test query") == []
+        assert mock_get.call_count == 2
+
+    @patch("clinical_trials_assistant.providers.session.get")
+    def test_open_circuit_serves_cached_results(self, mock_get: MagicMock) -> None:
+        """Test that cached results are returned while the circuit breaker is open."""
+        ok = Mock()
+        ok.raise_for_status.return_value = None
+        ok.content = json.dumps({"studies": []}).encode()
+        mock_get.return_value = ok
+        fetch_clinical_trials("cached query")
+
+        mock_get.side_effect = requests.ConnectionError("Connection failed")
+        for _ in range(api_guard.config.failure_threshold):
+            with pytest.raises(requests.ConnectionError):
+                fetch_clinical_trials("failing query")
+
+        mock_get.reset_mock()
+        assert fetch_clinical_trials("cached query") == []
+        mock_get.assert_not_called()
+        with pytest.raises(CircuitOpenError):
+            fetch_clinical_trials("failing query")
+
+    @patch("clinical_trials_assistant.providers.session.get")
+    def test_excluded_nct_ids_are_filtered(self, mock_get: MagicMock) -> None:
+        """Test that already held trials are excluded from the request and results."""
+        mock_response = Mock()
+        mock_response.raise_for_status.return_value = None
+        mock_response.content = json.dumps({"studies": []}).encode()
+        mock_get.return_value = mock_response
+
+        fetch_clinical_trials("test query", exclude_nct_ids=["NCT2", "NCT1"])
+
+        params = mock_get.call_args.kwargs["params"]
+        assert params["filter.advanced"] == "NOT AREA[NCTId](NCT1 OR NCT2)"
+
+    @patch("clinical_trials_assistant.providers.session.get")
+    def test_timeout_is_bounded_by_request_budget(self, mock_get: MagicMock) -> None:
+        """Test that the HTTP timeout shrinks to the time the request has left."""
+        mock_response = Mock()
+        mock_response.raise_for_status.return_value = None
+        mock_response.content = json.dumps({"studies": []}).encode()
+        mock_get.return_value = mock_response
+
+        fetch_clinical_trials("test query")
+        assert mock_get.call_args.kwargs["timeout"] <= api_guard.config.deadline
+
+        fetch_clinical_trials("other query", budget=RequestBudget(time.time() + 2))
+        assert 1 < mock_get.call_args.kwargs["timeout"] <= 2
+
+    @patch("clinical_trials_assistant.providers.session.get")
+    def test_expired_or_cancelled_request_is_not_sent(
+        self, mock_get: MagicMock
+    ) -> None:
+        """Test that no call is made for a request that is out of time or stopped."""
+        with pytest.raises(DeadlineExceededError):
+            fetch_clinical_trials("test query", budget=RequestBudget(time.time() - 1))
+
+        cancel_event = threading.Event()
+        cancel_event.set()
+        with pytest.raises(RequestCancelledError):
+            fetch_clinical_trials(
+                "test query", budget=RequestBudget(cancel_event=cancel_event)
+            )
+
+        mock_get.assert_not_called()
+
+    @patch("clinical_trials_assistant.providers.session.get")
+    def test_cancelled_request_is_not_retried(self, mock_get: MagicMock) -> None:
+        """Test that a request cancelled while its call failed stops retrying."""
+        cancel_event = threading.Event()
+
+        def reset(**kwargs):
+            cancel_event.set()
+            raise requests.ConnectionError("Connection reset")
+
+        mock_get.side_effect = reset
+
+        with pytest.raises(RequestCancelledError):
+            fetch_clinical_trials(
+                "test query", budget=RequestBudget(cancel_event=cancel_event)
+            )
+
+        assert mock_get.call_count == 1
@@ -0,0 +1,199 @@
+import threading
+import time
+
+import pytest
+
+from clinical_trials_assistant.deadline import RequestCancelledError
+from clinical_trials_assistant.resilience import (
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    ResilienceConfig,
+    ResilientCaller,
+    TokenBucket,
+)
+
+
+class TransientError(Exception):
+    pass
+
+
+def make_caller(**overrides) -> ResilientCaller:
+    return ResilientCaller(
+        ResilienceConfig(**{"rate_per_second": 1000.0, "burst": 100, **overrides}),
+        is_retryable=lambda exc: isinstance(exc, TransientError),
+        sleep=lambda _: None,
+    )
+
+
+class TestTokenBucket:
+    """Test suite for the token bucket rate limiter."""
+
+    def test_burst_then_deadline_exceeded(self) -> None:
+        """Test that the bucket grants `capacity` tokens and then honours the deadline."""
+        bucket = TokenBucket(rate=0.001, capacity=2)
+        bucket.acquire()
+        bucket.acquire()
+
+        with pytest.raises(TimeoutError):
+            bucket.acquire(deadline=time.monotonic() + 0.01)
+
+
+class TestAdaptiveConcurrencyLimiter:
+    """Test suite for the AIMD concurrency limiter."""
+
+    def test_additive_increase_and_multiplicative_decrease(self) -> None:
+        """Test that successes grow the limit slowly and congestion halves it."""
+        limiter = AdaptiveConcurrencyLimiter(initial=4, minimum=1, maximum=8)
+
+        for _ in range(8):
+            limiter.acquire()
+            limiter.release(congested=False)
+        assert limiter.limit == 5
+
+        limiter.acquire()
+        limiter.release(congested=True)
+        assert limiter.limit == 2
+
+    def test_acquire_times_out_when_saturated(self) -> None:
+        """Test that callers wait for a slot no longer than their deadline."""
+        limiter = AdaptiveConcurrencyLimiter(initial=1, minimum=1, maximum=1)
+        limiter.acquire()
+
+        with pytest.raises(TimeoutError):
+            limiter.acquire(deadline=time.monotonic() + 0.01)
+
+
+class TestCircuitBreaker:
+    """Test suite for the circuit breaker."""
+
+    def test_opens_after_threshold_and_probes_after_recovery(self) -> None:
+        """Test the closed -> open -> half-open -> closed cycle."""
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.01)
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert not breaker.allow()
+
+        time.sleep(0.02)
+        assert breaker.allow(), "A single probe should pass when half-open"
+        assert not breaker.allow(), "Only one probe may be in flight"
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestResilientCaller:
+    """Test suite for the combined resilient caller."""
+
+    def test_retries_transient_errors_until_success(self) -> None:
+        """Test that transient errors are retried and the result is returned."""
+        caller = make_caller(max_attempts=3)
+        outcomes = [TransientError(), TransientError(), "ok"]
+
+        def flaky():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        assert caller.call(flaky) == "ok"
+        assert caller.metrics()["retries"] == 2
+        assert caller.metrics()["successes"] == 1
+
+    def test_non_retryable_error_is_raised_immediately(self) -> None:
+        """Test that non-transient errors are not retried."""
+        caller = make_caller()
+        calls = []
+
+        def broken():
+            calls.append(1)
+            raise ValueError("bad request")
+
+        with pytest.raises(ValueError):
+            caller.call(broken)
+        assert len(calls) == 1
+
+    def test_non_retryable_error_does_not_close_a_half_open_breaker(self) -> None:
+        """Test that a probe failing with a non-transient error frees the probe slot."""
+        caller = make_caller(max_attempts=1, failure_threshold=1, recovery_timeout=0)
+
+        def failing():
+            raise TransientError()
+
+        def broken():
+            raise ValueError("unparsable response")
+
+        with pytest.raises(TransientError):
+            caller.call(failing)
+        with pytest.raises(ValueError):
+            caller.call(broken)
+
+        assert caller.breaker.state == CircuitBreaker.HALF_OPEN
+        assert caller.call(lambda: "ok") == "ok"
+        assert caller.breaker.state == CircuitBreaker.CLOSED
+
+    def test_cancelled_call_stops_retrying(self) -> None:
+        """Test that `check` is consulted before each retry and its error raised."""
+        caller = make_caller(max_attempts=5)
+        cancel_event = threading.Event()
+        calls = []
+
+        def failing():
+            calls.append(1)
+            cancel_event.set()
+            raise TransientError()
+
+        def check():
+            if cancel_event.is_set():
+                raise RequestCancelledError()
+
+        with pytest.raises(RequestCancelledError):
+            caller.call(failing, check=check)
+        assert len(calls) == 1
+        assert caller.metrics()["retries"] == 0
+        assert caller.breaker.state == CircuitBreaker.CLOSED
+
+    def test_open_breaker_serves_fallback_or_raises(self) -> None:
+        """Test that an open breaker short-circuits to the fallback result."""
+        caller = make_caller(max_attempts=1, failure_threshold=1)
+
+        def failing():
+            raise TransientError()
+
+        with pytest.raises(TransientError):
+            caller.call(failing)
+
+        assert caller.call(failing, fallback=lambda: "cached") == "cached"
+        with pytest.raises(CircuitOpenError):
+            caller.call(failing, fallback=lambda: None)
+        assert caller.metrics()["fallbacks"] == 1
+        assert caller.metrics()["circuit_state"] == CircuitBreaker.OPEN
+
+    def test_config_from_env(self, monkeypatch) -> None:
+        """Test that configuration fields can be overridden from the environment."""
+        monkeypatch.setenv("TEST_API_MAX_ATTEMPTS", "7")
+        monkeypatch.setenv("TEST_API_RATE_PER_SECOND", "2.5")
+
+        config = ResilienceConfig.from_env("TEST_API")
+
+        assert config.max_attempts == 7
+        assert config.rate_per_second == 2.5
+
+
+class TestLatencyTracker:
+    """Test suite for per-model latency percentiles."""
+
+    def test_percentiles(self) -> None:
+        """Test nearest-rank percentiles over the sliding window."""
+        tracker = LatencyTracker(window=100)
+        assert tracker.percentile(50) is None
+
+        for seconds in range(200, 0, -1):
+            tracker.record(seconds)
+
+        assert len(tracker) == 100
+        assert tracker.percentile(50) == 50
+        assert tracker.percentile(99) == 99
+        assert tracker.percentile(100) == 100
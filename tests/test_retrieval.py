@@ -0,0 +1,186 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from clinical_trials_assistant import nodes
+from clinical_trials_assistant.deadline import RequestBudget
+from clinical_trials_assistant.providers import ClinicalTrial
+from clinical_trials_assistant.retrieval import (
+    fetch_clinical_trials_multi,
+    reciprocal_rank_fusion,
+)
+
+
+def make_trial(nct_id: str) -> ClinicalTrial:
+    return ClinicalTrial(nct_id, f"Title {nct_id}", "Summary", {"key": "value"})
+
+
+class TestReciprocalRankFusion:
+    """Test suite for reciprocal rank fusion of query results."""
+
+    def test_trials_found_by_several_queries_rank_first(self) -> None:
+        """Test that fusion rewards agreement between queries and de-duplicates."""
+        a, b, c, d = (make_trial(f"NCT0000000{i}") for i in range(4))
+
+        fused = reciprocal_rank_fusion([[a, b, c], [c, d], [c, b]])
+
+        assert [t.nct_id for t in fused] == [c.nct_id, b.nct_id, a.nct_id, d.nct_id]
+
+    def test_limit_is_applied(self) -> None:
+        """Test that the fused list is truncated to the limit."""
+        trials = [make_trial(f"NCT0000000{i}") for i in range(5)]
+
+        assert len(reciprocal_rank_fusion([trials], limit=2)) == 2
+
+
+class TestFetchClinicalTrialsMulti:
+    """Test suite for concurrent multi-query retrieval."""
+
+    @patch("clinical_trials_assistant.retrieval.fetch_clinical_trials")
+    def test_failed_and_late_queries_are_dropped(self, mock_fetch) -> None:
+        """Test that partial results are fused when some queries fail or time out."""
+
+        def fetch(query, exclude_nct_ids=None, budget=None):
+            if query["query.term"] == "failing":
+                raise ValueError("bad query")
+            if query["query.term"] == "slow":
+                time.sleep(1)
+            return [make_trial("NCT00000001")]
+
+        mock_fetch.side_effect = fetch
+
+        started_at = time.monotonic()
+        results = fetch_clinical_trials_multi(
+            [{"query.term": "ok"}, {"query.term": "failing"}, {"query.term": "slow"}],
+            deadline=0.2,
+        )
+
+        assert time.monotonic() - started_at < 0.9
+        assert [t.nct_id for t in results] == ["NCT00000001"]
+
+    @patch("clinical_trials_assistant.retrieval.fetch_clinical_trials")
+    def test_each_query_is_bounded_by_the_retrieval_deadline(self, mock_fetch) -> None:
+        """Test that queries are given the retrieval deadline, not the request's."""
+        mock_fetch.return_value = [make_trial("NCT00000001")]
+        request_budget = RequestBudget(time.time() + 60)
+
+        fetch_clinical_trials_multi(
+            [{"query.term": "a"}, {"query.term": "b"}],
+            deadline=5,
+            budget=request_budget,
+        )
+
+        for call in mock_fetch.call_args_list:
+            assert 4 < call.kwargs["budget"].timeout() <= 5
+
+    @patch("clinical_trials_assistant.retrieval.fetch_clinical_trials")
+    def test_all_queries_failing_raises(self, mock_fetch) -> None:
+        """Test that an error is raised when no query succeeds."""
+        mock_fetch.side_effect = ValueError("bad query")
+
+        with pytest.raises(ValueError):
+            fetch_clinical_trials_multi([{"query.term": "a"}, {"query.term": "b"}])
+
+
+class TestRetrieveNodeMultiQuery:
+    """Test suite for the multi-query mode of the `retrieve` node."""
+
+    @patch("clinical_trials_assistant.retrieval.fetch_clinical_trials")
+    @patch("clinical_trials_assistant.nodes.init_chat_model")
+    def test_alternative_queries_are_fused(
+        self, mock_init_chat_model, mock_fetch, monkeypatch
+    ) -> None:
+        """Test that each generated query is fetched and the results fused."""
+        monkeypatch.setattr(nodes, "RETRIEVAL_QUERY_COUNT", 2)
+        mock_init_chat_model.return_value = FakeListChatModel(
+            responses=['[{"query.intr": "ibuprofen"}, {"query.term": "ibuprofen"}]']
+        )
+        mock_fetch.side_effect = lambda query, exclude_nct_ids=None, budget=None: [
+            make_trial("NCT00000001"),
+            make_trial("NCT00000002" if "query.intr" in query else "NCT00000003"),
+        ]
+
+        state = nodes.retrieve(
+            {
+                "messages": [HumanMessage("Does ibuprofen help?")],
+                "retrieved_trials": None,
+                "top_reranked_results_ids": None,
+                "is_valid_request": True,
+            }
+        )
+
+        assert mock_fetch.call_count == 2
+        assert [t.nct_id for t in state["retrieved_trials"]] == [
+            "NCT00000001",
+            "NCT00000002",
+            "NCT00000003",
+        ]
+
+
+class TestFollowupRetrieval:
+    """Test suite for incremental retrieval on follow-up questions."""
+
+    def make_state(self) -> dict:
+        return {
+            "messages": [
+                HumanMessage("Does ibuprofen help with back pain?"),
+                AIMessage("Yes, according to NCT00000001."),
+                HumanMessage("What about naproxen?"),
+            ],
+            "retrieved_trials": [make_trial("NCT00000001"), make_trial("NCT00000002")],
+            "top_reranked_results_ids": ["NCT00000001"],
+            "is_valid_request": True,
+            "needs_additional_trials": True,
+            "new_trial_ids": None,
+        }
+
+    @patch("clinical_trials_assistant.nodes.fetch_clinical_trials")
+    @patch("clinical_trials_assistant.nodes.init_chat_model")
+    def test_retrieve_more_fetches_only_the_delta(
+        self, mock_init_chat_model, mock_fetch
+    ) -> None:
+        """Test that held trials are excluded and new ones merged into the set."""
+        mock_init_chat_model.return_value = FakeListChatModel(
+            responses=['{"query.intr": "naproxen"}']
+        )
+        mock_fetch.return_value = [make_trial("NCT00000003")]
+
+        state = nodes.retrieve_more(self.make_state())
+
+        query, exclude_nct_ids = mock_fetch.call_args.args
+        assert query == {"query.intr": "naproxen"}
+        assert exclude_nct_ids == ["NCT00000001", "NCT00000002"]
+        assert [t.nct_id for t in state["retrieved_trials"]] == [
+            "NCT00000001",
+            "NCT00000002",
+            "NCT00000003",
+        ]
+        assert state["new_trial_ids"] == ["NCT00000003"]
+
+    @patch("clinical_trials_assistant.nodes.init_chat_model")
+    def test_incremental_rerank_only_considers_top_and_new_trials(
+        self, mock_init_chat_model
+    ) -> None:
+        """Test that rerank after a follow-up retrieval skips already-rejected trials."""
+        prompts: list[str] = []
+
+        def fake_llm(prompt_value) -> str:
+            prompts.append(prompt_value.to_string())
+            return "NCT00000001, NCT00000003"
+
+        mock_init_chat_model.return_value = RunnableLambda(fake_llm)
+        state = self.make_state()
+        state["retrieved_trials"].append(make_trial("NCT00000003"))
+        state["new_trial_ids"] = ["NCT00000003"]
+
+        state = nodes.rerank(state)
+
+        prompt = prompts[0]
+        assert "NCT00000002" not in prompt
+        assert "NCT00000003" in prompt
+        assert state["top_reranked_results_ids"] == ["NCT00000001", "NCT00000003"]
+        assert state["new_trial_ids"] is None
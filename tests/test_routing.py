@@ -0,0 +1,208 @@
+import threading
+import time
+from unittest.mock import ANY
+
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler, CallbackManager
+from langchain_core.language_models.fake_chat_models import (
+    FakeListChatModel,
+    FakeListChatModelError,
+)
+from langchain_core.runnables import RunnableLambda
+
+from clinical_trials_assistant import routing as routing_module
+from clinical_trials_assistant.routing import ModelRouter, Route
+
+
+def fake_model(*behaviours):
+    """Model whose n-th call sleeps and then answers or raises as configured."""
+    calls = []
+
+    def invoke(inputs):
+        delay, outcome = behaviours[min(len(calls), len(behaviours) - 1)]
+        calls.append(threading.current_thread().name)
+        time.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    model = RunnableLambda(invoke)
+    model.calls = calls
+    return model
+
+
+class TokenRecorder(BaseCallbackHandler):
+    def __init__(self) -> None:
+        self.tokens: list[str] = []
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.tokens.append(token)
+
+
+def make_router(route: Route, models: dict) -> ModelRouter:
+    return ModelRouter({"node": route}, get_model=models.__getitem__)
+
+
+class TestModelRouter:
+    """Test suite for latency-aware model routing."""
+
+    def test_falls_back_on_error(self) -> None:
+        """Test that the next model answers when the first one fails."""
+        models = {
+            "big": fake_model((0, RuntimeError("overloaded"))),
+            "small": fake_model((0, "small answer")),
+        }
+        router = make_router(Route(["big", "small"], budget=1), models)
+
+        assert router.invoke("node", lambda llm: llm, {}) == "small answer"
+        assert router.metrics()["node"]["big"]["errors"] == 1
+        assert router.metrics()["node"]["small"]["samples"] == 1
+
+    def test_falls_back_when_budget_is_exceeded(self) -> None:
+        """Test that a slow model is abandoned once its budget runs out."""
+        models = {
+            "big": fake_model((0.5, "late answer")),
+            "small": fake_model((0, "small answer")),
+        }
+        router = make_router(Route(["big", "small"], budget=0.1), models)
+
+        started_at = time.perf_counter()
+        assert router.invoke("node", lambda llm: llm, {}) == "small answer"
+        assert time.perf_counter() - started_at < 0.4
+        assert router.metrics()["node"]["big"]["timeouts"] == 1
+
+    def test_raises_last_error_when_all_models_fail(self) -> None:
+        """Test that the error of the last model is raised."""
+        models = {
+            "big": fake_model((0, RuntimeError("overloaded"))),
+            "small": fake_model((0, ValueError("bad request"))),
+        }
+        router = make_router(Route(["big", "small"], budget=1), models)
+
+        with pytest.raises(ValueError, match="bad request"):
+            router.invoke("node", lambda llm: llm, {})
+
+    def test_hedges_slow_call_after_percentile_delay(self, monkeypatch) -> None:
+        """Test that a duplicate is sent once a call is slower than usual."""
+        monkeypatch.setattr(routing_module, "MODEL_HEDGE_MIN_SAMPLES", 5)
+        model = fake_model((0.5, "slow answer"), (0, "hedged answer"))
+        router = make_router(Route(["big"], budget=2), {"big": model})
+        for _ in range(5):
+            router.latency("node", "big").record(0.02)
+
+        started_at = time.perf_counter()
+        assert router.invoke("node", lambda llm: llm, {}) == "hedged answer"
+        assert time.perf_counter() - started_at < 0.4
+        assert len(model.calls) == 2
+        assert router.metrics()["node"]["big"]["hedges"] == 1
+
+    def test_does_not_hedge_without_enough_samples(self) -> None:
+        """Test that hedging waits until the latency percentile is meaningful."""
+        model = fake_model((0.1, "answer"))
+        router = make_router(Route(["big"], budget=2), {"big": model})
+
+        assert router.invoke("node", lambda llm: llm, {}) == "answer"
+        assert len(model.calls) == 1
+
+    def test_unbudgeted_route_runs_on_caller_thread(self) -> None:
+        """Test that streamed routes stay on the caller's thread and only fall back."""
+        models = {
+            "big": fake_model((0, RuntimeError("overloaded"))),
+            "small": fake_model((0, "small answer")),
+        }
+        router = make_router(Route(["big", "small"], hedge=False), models)
+
+        assert router.invoke("node", lambda llm: llm, {}) == "small answer"
+        assert models["small"].calls == [threading.current_thread().name]
+
+    def test_streamed_route_does_not_fall_back_after_first_token(self) -> None:
+        """Test that a partly streamed answer is not followed by another one."""
+        models = {
+            "big": FakeListChatModel(responses=["partial"], error_on_chunk_number=3),
+            "small": FakeListChatModel(responses=["small answer"]),
+        }
+        router = make_router(Route(["big", "small"], hedge=False), models)
+
+        with pytest.raises(FakeListChatModelError):
+            router.invoke("node", lambda llm: llm.bind(stream=True), "Hi")
+        assert router.metrics()["node"].keys() == {"big"}
+
+    def test_streamed_route_falls_back_before_first_token(self) -> None:
+        """Test that a streamed answer failing before any token falls back."""
+        models = {
+            "big": FakeListChatModel(responses=["partial"], error_on_chunk_number=0),
+            "small": FakeListChatModel(responses=["small answer"]),
+        }
+        router = make_router(Route(["big", "small"], hedge=False), models)
+
+        answer = router.invoke("node", lambda llm: llm.bind(stream=True), "Hi")
+
+        assert answer.content == "small answer"
+
+    def test_streamed_route_falls_back_on_slow_first_token(self) -> None:
+        """Test that a model silent past the first-token budget is abandoned unseen."""
+        models = {
+            "big": FakeListChatModel(responses=["late"], sleep=0.3),
+            "small": FakeListChatModel(responses=["small answer"]),
+        }
+        router = make_router(
+            Route(["big", "small"], hedge=False, first_token_budget=0.1), models
+        )
+        recorder = TokenRecorder()
+        callbacks = CallbackManager(
+            handlers=[recorder], inheritable_handlers=[recorder]
+        )
+
+        started_at = time.perf_counter()
+        answer = router.invoke(
+            "node",
+            lambda llm: llm.bind(stream=True),
+            "Hi",
+            config={"callbacks": callbacks},
+        )
+
+        assert answer.content == "small answer"
+        assert time.perf_counter() - started_at < 0.25
+        assert router.metrics()["node"]["big"]["timeouts"] == 1
+        time.sleep(0.4)
+        assert "".join(recorder.tokens) == "small answer"
+
+    def test_streamed_route_keeps_a_model_past_its_first_token(self) -> None:
+        """Test that the first-token budget does not limit the rest of the stream."""
+        models = {
+            "big": FakeListChatModel(responses=["slow answer"], sleep=0.02),
+            "small": FakeListChatModel(responses=["small answer"]),
+        }
+        router = make_router(
+            Route(["big", "small"], hedge=False, first_token_budget=0.1), models
+        )
+
+        answer = router.invoke("node", lambda llm: llm.bind(stream=True), "Hi")
+
+        assert answer.content == "slow answer"
+        assert router.metrics()["node"].keys() == {"big"}
+
+    def test_latency_is_tracked_per_node(self) -> None:
+        """Test that calls of different nodes to one model do not share a window."""
+        model = fake_model((0, "answer"))
+        router = ModelRouter(
+            {"short": Route(["big"], budget=1), "long": Route(["big"], budget=1)},
+            get_model={"big": model}.__getitem__,
+        )
+
+        router.invoke("short", lambda llm: llm, {})
+
+        assert router.metrics() == {"short": {"big": ANY}}
+        assert len(router.latency("long", "big")) == 0
+
+    def test_route_overrides_from_env(self, monkeypatch) -> None:
+        """Test that models and budget can be configured per node."""
+        monkeypatch.setenv("MODEL_ROUTE_RERANK_MODELS", "openai:a, anthropic:b")
+        monkeypatch.setenv("MODEL_ROUTE_RERANK_BUDGET", "0")
+        monkeypatch.setenv("MODEL_ROUTE_RERANK_FIRST_TOKEN_BUDGET", "5")
+
+        route = Route.from_env("rerank", ["openai:default"], budget=30)
+
+        assert route.models == ["openai:a", "anthropic:b"]
+        assert route.budget is None
+        assert route.first_token_budget == 5
@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from unittest.mock import Mock, patch
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+
+from clinical_trials_assistant import nodes, providers
+from clinical_trials_assistant.nodes import validate
+from clinical_trials_assistant.singleflight import SingleFlight
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 5) -> None:
+    """Wait for `condition` to hold, failing the test instead of hanging."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out waiting for callers."
+        time.sleep(0.01)
+
+
+class GatedChatModel(FakeListChatModel):
+    """Fake chat model that answers once `release` is set and records its calls."""
+
+    release: Any
+    calls: list[dict[str, Any]] = []
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs) -> str:
+        self.calls.append(kwargs)
+        self.release.wait(timeout=5)
+        return super()._call(messages, stop, run_manager, **kwargs)
+
+
+class TestSingleFlight:
+    """Test suite for single-flight request coalescing."""
+
+    def test_concurrent_identical_calls_share_one_execution(self) -> None:
+        """Test that callers arriving while the leader runs get the leader's result."""
+        flights = SingleFlight()
+        release = threading.Event()
+        executions = []
+
+        def slow_call():
+            executions.append(1)
+            release.wait(timeout=5)
+            return "result"
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(flights.do, "key", slow_call) for _ in range(4)]
+            wait_until(lambda: flights.metrics()["calls"] == 4)
+            release.set()
+            results = [f.result(timeout=5) for f in futures]
+
+        assert results == ["result"] * 4
+        assert len(executions) == 1
+        assert flights.metrics() == {"calls": 4, "coalesced": 3, "in_flight": 0}
+
+    def test_different_keys_are_not_coalesced(self) -> None:
+        """Test that distinct keys run independently."""
+        flights = SingleFlight()
+
+        assert flights.do("a", lambda: 1) == 1
+        assert flights.do("b", lambda: 2) == 2
+        assert flights.metrics()["coalesced"] == 0
+
+    def test_exception_is_shared_and_key_released(self) -> None:
+        """Test that the leader's exception propagates and the key can be retried."""
+        flights = SingleFlight()
+
+        def failing():
+            raise RuntimeError("upstream failed")
+
+        with pytest.raises(RuntimeError):
+            flights.do("key", failing)
+
+        assert flights.do("key", lambda: "recovered") == "recovered"
+
+    def test_each_caller_gets_its_own_copy(self) -> None:
+        """Test that a caller modifying its result does not affect the others."""
+        flights = SingleFlight()
+        release = threading.Event()
+
+        def slow_call():
+            release.wait(timeout=5)
+            return ["NCT00000001", "NCT00000002"]
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(flights.do, "key", slow_call) for _ in range(2)]
+            wait_until(lambda: flights.metrics()["calls"] == 2)
+            release.set()
+            first, second = [f.result(timeout=5) for f in futures]
+
+        first.pop()
+        assert second == ["NCT00000001", "NCT00000002"]
+
+
+class TestCoalescedCalls:
+    """Test suite for the upstream calls coalesced across sessions."""
+
+    def test_identical_searches_share_one_request(self) -> None:
+        """Test that concurrent identical searches make a single API request."""
+        release = threading.Event()
+
+        def get(**kwargs):
+            release.wait(timeout=5)
+            response = Mock()
+            response.content = json.dumps({"studies": []}).encode()
+            return response
+
+        calls_before = providers.provider_flights.metrics()["calls"]
+        with (
+            patch.object(providers.session, "get", side_effect=get) as mock_get,
+            ThreadPoolExecutor(max_workers=4) as pool,
+        ):
+            futures = [
+                pool.submit(providers.fetch_clinical_trials, "ibuprofen")
+                for _ in range(4)
+            ]
+            wait_until(
+                lambda: providers.provider_flights.metrics()["calls"] - calls_before
+                == 4
+            )
+            release.set()
+            results = [f.result(timeout=5) for f in futures]
+
+        assert mock_get.call_count == 1
+        assert results == [[]] * 4
+        assert len({id(result) for result in results}) == 4
+
+    def test_identical_prompts_share_one_model_call(self, monkeypatch) -> None:
+        """Test that concurrent identical validations call the model once, at a
+        temperature of 0."""
+        model = GatedChatModel(responses=["YES"], release=threading.Event())
+        monkeypatch.setattr(nodes, "get_chat_model", lambda _: model)
+        state = {"messages": [HumanMessage("Ibuprofen for back pain?")]}
+
+        calls_before = nodes.llm_flights.metrics()["calls"]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(validate, dict(state)) for _ in range(4)]
+            wait_until(lambda: nodes.llm_flights.metrics()["calls"] - calls_before == 4)
+            model.release.set()
+            results = [f.result(timeout=5) for f in futures]
+
+        assert [result["is_valid_request"] for result in results] == [True] * 4
+        assert len(model.calls) == 1
+        assert model.calls[0]["temperature"] == 0
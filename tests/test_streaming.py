@@ -0,0 +1,155 @@
+import json
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+
+from clinical_trials_assistant import api as api_module
+from clinical_trials_assistant import nodes
+from clinical_trials_assistant.providers import ClinicalTrial
+from clinical_trials_assistant.streaming import (
+    RelevantTrialsHeader,
+    split_relevant_trials,
+)
+
+FUSED_REPLY = "RELEVANT: NCT00000002, NCT99999999\n\nNaproxen helps (NCT00000002)."
+
+
+def make_trial(nct_id: str) -> ClinicalTrial:
+    return ClinicalTrial(nct_id, f"Title {nct_id}", "Summary", {"key": "value"})
+
+
+class TestRelevantTrialsHeader:
+    """Test suite for separating the trial header from a fused reply."""
+
+    def test_header_split_across_tokens_is_not_streamed(self) -> None:
+        """Test that the header is parsed once complete and only the answer passes."""
+        header = RelevantTrialsHeader()
+
+        streamed = [header.feed(token) for token in FUSED_REPLY]
+
+        assert "".join(streamed) == "Naproxen helps (NCT00000002)."
+        assert header.relevant_ids == ["NCT00000002", "NCT99999999"]
+
+    def test_reply_without_header_is_passed_through(self) -> None:
+        """Test that a model ignoring the format still has its answer streamed."""
+        header = RelevantTrialsHeader()
+
+        streamed = [header.feed(token) for token in ["Naproxen ", "helps."]]
+
+        assert "".join(streamed) == "Naproxen helps."
+        assert header.relevant_ids == []
+
+    def test_none_header_selects_no_trials(self) -> None:
+        """Test that `RELEVANT: NONE` yields an empty selection."""
+        assert split_relevant_trials("RELEVANT: NONE\n\nNo trials found.") == (
+            [],
+            "No trials found.",
+        )
+
+
+class TestFusedRerankAnswer:
+    """Test suite for the single-call rerank-and-answer graph mode."""
+
+    @patch("clinical_trials_assistant.nodes.init_chat_model")
+    def test_selection_is_limited_to_candidates(self, mock_init_chat_model) -> None:
+        """Test that unknown IDs in the header are dropped and the answer kept."""
+        mock_init_chat_model.return_value = FakeListChatModel(responses=[FUSED_REPLY])
+        state = {
+            "messages": [HumanMessage("Does naproxen help?")],
+            "retrieved_trials": [make_trial("NCT00000001"), make_trial("NCT00000002")],
+            "top_reranked_results_ids": None,
+            "new_trial_ids": None,
+        }
+
+        state = nodes.rerank_answer(state)
+
+        assert state["top_reranked_results_ids"] == ["NCT00000002"]
+        assert state["messages"][-1].content == "Naproxen helps (NCT00000002)."
+
+    @patch("clinical_trials_assistant.nodes.init_chat_model")
+    def test_candidates_are_given_in_compact_form(self, mock_init_chat_model) -> None:
+        """Test that the fused prompt has outcome tables but no raw results."""
+        mock_init_chat_model.return_value = FakeListChatModel(responses=[FUSED_REPLY])
+        prompts = []
+
+        class PromptRecorder(BaseCallbackHandler):
+            def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+                prompts.append(messages[0][0].content)
+
+        trial = ClinicalTrial(
+            "NCT00000002",
+            "Title",
+            "Summary",
+            {
+                "outcomeMeasuresModule": {
+                    "outcomeMeasures": [
+                        {
+                            "title": "Pain relief",
+                            "groups": [{"id": "OG000", "title": "Naproxen"}],
+                            "classes": [
+                                {
+                                    "categories": [
+                                        {
+                                            "measurements": [
+                                                {"groupId": "OG000", "value": "7"}
+                                            ]
+                                        }
+                                    ]
+                                }
+                            ],
+                        }
+                    ]
+                },
+                "adverseEventsModule": {"frequencyThreshold": "5"},
+            },
+        )
+        state = {
+            "messages": [HumanMessage("Does naproxen help?")],
+            "retrieved_trials": [trial],
+            "top_reranked_results_ids": None,
+            "new_trial_ids": None,
+        }
+
+        nodes.rerank_answer(state, {"callbacks": [PromptRecorder()]})
+
+        assert "1. Naproxen: 7" in prompts[0]
+        assert "adverseEventsModule" not in prompts[0]
+
+    @patch("clinical_trials_assistant.nodes.fetch_clinical_trials")
+    @patch("clinical_trials_assistant.nodes.init_chat_model")
+    def test_trials_are_streamed_before_the_answer(
+        self, mock_init_chat_model, mock_fetch, monkeypatch
+    ) -> None:
+        """Test that the API emits the selected trials ahead of the answer tokens."""
+        mock_init_chat_model.return_value = FakeListChatModel(
+            responses=["YES", '{"query.intr": "naproxen"}', FUSED_REPLY]
+        )
+        mock_fetch.return_value = [make_trial("NCT00000001"), make_trial("NCT00000002")]
+        monkeypatch.setattr(api_module, "graph", nodes.build_graph(fused=True))
+        app = FastAPI()
+        app.include_router(api_module.router)
+
+        response = TestClient(app).post(
+            "/api/ask",
+            json={"messages": [{"role": "user", "content": "Does naproxen help?"}]},
+        )
+
+        events = [
+            (block.split("\n")[0].removeprefix("event: "), block.split("data: ")[1])
+            for block in response.text.strip().split("\n\n")
+        ]
+        names = [name for name, _ in events]
+        assert [n for n in names if n == "node"] == ["node"] * 3
+        assert names.index("trials") < names.index("token")
+        trials = json.loads(events[names.index("trials")][1])
+        # The hallucinated NCT99999999 is not among the retrieved trials.
+        assert trials == {"top_reranked_results_ids": ["NCT00000002"]}
+        tokens = "".join(json.loads(d)["content"] for n, d in events if n == "token")
+        assert tokens == "Naproxen helps (NCT00000002)."
+        final = json.loads(events[-1][1])
+        assert final["top_reranked_results_ids"] == ["NCT00000002"]
+        assert final["messages"][-1]["content"] == tokens
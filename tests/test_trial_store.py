@@ -0,0 +1,134 @@
+import json
+import re
+from pathlib import Path
+from unittest.mock import MagicMock, Mock, patch
+
+import sqlalchemy
+
+from clinical_trials_assistant import providers
+from clinical_trials_assistant.providers import (
+    MAX_TRIALS_PER_QUERY,
+    TRIAL_FIELDS,
+    VERSION_FIELDS,
+    ClinicalTrial,
+    fetch_clinical_trials,
+    fetch_trials_by_id,
+)
+from clinical_trials_assistant.trial_store import TrialStore
+
+DDL_PATH = Path(__file__).parent.parent / "scripts" / "ddl.sql"
+
+
+def make_study(nct_id: str, last_update: str) -> dict:
+    return {
+        "protocolSection": {
+            "identificationModule": {
+                "nctId": nct_id,
+                "officialTitle": f"Title {nct_id}",
+            },
+            "descriptionModule": {"briefSummary": "Summary"},
+            "statusModule": {"lastUpdatePostDateStruct": {"date": last_update}},
+        },
+        "resultsSection": {"key": nct_id},
+    }
+
+
+class FakeApi:
+    """Serves searches and ID lookups from a dict of studies by NCT ID."""
+
+    def __init__(self, studies: dict[str, dict], results: dict[str, list[str]]):
+        self.studies = studies
+        self.results = results
+        self.downloaded: list[str] = []
+
+    def get(self, url, params, timeout):
+        if params["fields"] == VERSION_FIELDS:
+            nct_ids = self.results[params["query.term"]]
+        else:
+            assert params["fields"] == TRIAL_FIELDS
+            nct_ids = params["filter.ids"].split(",")
+            self.downloaded.extend(nct_ids)
+        response = Mock()
+        response.raise_for_status.return_value = None
+        response.content = json.dumps(
+            {"studies": [self.studies[i] for i in nct_ids if i in self.studies]}
+        ).encode()
+        return response
+
+
+class TestTrialStore:
+    """Test suite for the per-trial store used by searches."""
+
+    @patch("clinical_trials_assistant.providers.session.get")
+    def test_overlapping_searches_download_each_trial_once(
+        self, mock_get: MagicMock
+    ) -> None:
+        """Test that only trials missing from the store are downloaded in full."""
+        api = FakeApi(
+            {i: make_study(i, "2024-01-01") for i in ["NCT1", "NCT2", "NCT3"]},
+            {"first": ["NCT1", "NCT2"], "second": ["NCT3", "NCT2", "NCT1"]},
+        )
+        mock_get.side_effect = api.get
+
+        fetch_clinical_trials("first")
+        trials = fetch_clinical_trials("second")
+
+        assert [t.nct_id for t in trials] == ["NCT3", "NCT2", "NCT1"]
+        assert api.downloaded == ["NCT1", "NCT2", "NCT3"]
+        assert trials[1].last_update == "2024-01-01"
+        assert providers.trial_store.metrics()["hits"] == 2
+
+    @patch("clinical_trials_assistant.providers.session.get")
+    def test_updated_trials_are_downloaded_again(self, mock_get: MagicMock) -> None:
+        """Test that a newer `LastUpdatePostDate` invalidates the stored trial."""
+        api = FakeApi(
+            {i: make_study(i, "2024-01-01") for i in ["NCT1", "NCT2"]},
+            {"query": ["NCT1", "NCT2"]},
+        )
+        mock_get.side_effect = api.get
+        fetch_clinical_trials("query")
+
+        api.studies["NCT2"] = make_study("NCT2", "2025-06-01")
+        trials = fetch_clinical_trials("query")
+
+        assert api.downloaded == ["NCT1", "NCT2", "NCT2"]
+        assert trials[1].last_update == "2025-06-01"
+        assert providers.trial_store.metrics()["stale"] == 1
+
+    @patch("clinical_trials_assistant.providers.session.get")
+    def test_trials_are_restored_by_id(self, mock_get: MagicMock) -> None:
+        """Test that stored trials are reused and the rest downloaded in pages."""
+        nct_ids = [f"NCT{i}" for i in range(MAX_TRIALS_PER_QUERY + 5)]
+        api = FakeApi(
+            {i: make_study(i, "2024-01-01") for i in nct_ids},
+            {"query": nct_ids[:2]},
+        )
+        mock_get.side_effect = api.get
+        fetch_clinical_trials("query")
+        api.downloaded.clear()
+
+        trials = fetch_trials_by_id([*reversed(nct_ids), "NCT_UNKNOWN"])
+
+        assert [t.nct_id for t in trials] == list(reversed(nct_ids))
+        assert sorted(api.downloaded) == sorted([*nct_ids[2:], "NCT_UNKNOWN"])
+        assert [
+            c.kwargs["params"]["pageSize"] for c in mock_get.call_args_list[2:]
+        ] == [
+            MAX_TRIALS_PER_QUERY,
+            4,
+        ]
+
+    def test_trials_are_shared_through_the_database(self, tmp_path) -> None:
+        """Test that a trial saved by one worker is found by another one."""
+        url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+        with sqlalchemy.create_engine(url).begin() as conn:
+            for statement in re.split(r";\s*$", DDL_PATH.read_text(), flags=re.M):
+                if statement.strip():
+                    conn.execute(sqlalchemy.text(statement))
+        trial = ClinicalTrial("NCT1", "Title", "Summary", {"key": [1, 2]}, "2024-01-01")
+        TrialStore(url).put_many([trial])
+
+        other_worker = TrialStore(url.replace("sqlite:///", "sqlite+aiosqlite:///"))
+
+        assert other_worker.get_fresh({"NCT1": "2024-01-01"}) == {"NCT1": trial}
+        assert other_worker.get_fresh({"NCT1": "2025-01-01"}) == {}
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from clinical_trials_assistant import graph as graph_module
+from clinical_trials_assistant import warmup as warmup_module
+from clinical_trials_assistant.warmup import Warmup, WarmupStep
+
+
+async def succeed() -> None:
+    await asyncio.sleep(0)
+
+
+async def fail() -> None:
+    raise RuntimeError("unreachable")
+
+
+async def wait_until(condition, timeout: float = 5) -> None:
+    async def poll() -> None:
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+class TestWarmup:
+    """Test suite for the startup warm-up subsystem."""
+
+    @pytest.mark.asyncio
+    async def test_ready_after_all_critical_steps_succeed(self) -> None:
+        """Test that readiness waits for all steps and tolerates non-critical failures."""
+        warmup = Warmup(
+            [
+                [WarmupStep("a", succeed), WarmupStep("b", succeed)],
+                [WarmupStep("optional", fail, critical=False)],
+            ]
+        )
+        assert not warmup.ready
+        assert warmup.status()["progress"] == "0/3"
+
+        await warmup.start()
+
+        status = warmup.status()
+        assert status["ready"]
+        assert status["progress"] == "3/3"
+        assert status["steps"]["optional"]["status"] == "failed"
+        assert "unreachable" in status["steps"]["optional"]["error"]
+
+    @pytest.mark.asyncio
+    async def test_not_ready_when_critical_step_fails(self) -> None:
+        """Test that a failed critical step keeps the worker out of rotation."""
+        warmup = Warmup([[WarmupStep("database", fail), WarmupStep("b", succeed)]])
+
+        warmup.start()
+        await wait_until(lambda: warmup.status()["steps"]["database"]["attempts"])
+
+        assert not warmup.ready
+        assert warmup.status()["steps"]["database"]["status"] == "failed"
+        assert warmup.status()["steps"]["b"]["status"] == "done"
+        warmup.task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await warmup.task
+
+    @pytest.mark.asyncio
+    async def test_failed_critical_step_is_retried(self, monkeypatch) -> None:
+        """Test that the worker becomes ready once a failed critical step succeeds."""
+        monkeypatch.setattr(warmup_module, "WARMUP_RETRY_DELAY", 0.01)
+        outcomes = [RuntimeError("outage"), RuntimeError("outage"), None]
+
+        async def recover() -> None:
+            if error := outcomes.pop(0):
+                raise error
+
+        warmup = Warmup(
+            [
+                [WarmupStep("model_clients", recover)],
+                [WarmupStep("optional", fail, critical=False)],
+            ]
+        )
+
+        await asyncio.wait_for(warmup.start(), timeout=5)
+
+        status = warmup.status()
+        assert status["ready"]
+        assert status["steps"]["model_clients"]["attempts"] == 3
+        assert status["steps"]["model_clients"]["error"] is None
+        assert status["steps"]["optional"]["attempts"] == 1
+
+    @pytest.mark.asyncio
+    async def test_starter_answers_are_precomputed(self, monkeypatch) -> None:
+        """Test that starter prompts are answered and cached by message."""
+        invoked = []
+
+        class FakeGraph:
+            async def ainvoke(self, state):
+                invoked.append(state["messages"][-1].content)
+                return {**state, "top_reranked_results_ids": ["NCT00000001"]}
+
+        monkeypatch.setattr(graph_module, "_graph", FakeGraph())
+        monkeypatch.setattr(
+            warmup_module, "STARTERS", [("label", "What about ibuprofen?")]
+        )
+        warmup_module.starter_answers.clear()
+
+        await warmup_module.precompute_starter_answers()
+
+        assert invoked == ["What about ibuprofen?"]
+        cached = warmup_module.starter_answers.get("What about ibuprofen?")
+        assert cached["top_reranked_results_ids"] == ["NCT00000001"]
@@ -0,0 +1,69 @@
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from clinical_trials_assistant import workers
+from clinical_trials_assistant.providers import ClinicalTrial, parse_studies_payload
+
+PAYLOAD = json.dumps(
+    {
+        "studies": [
+            {
+                "protocolSection": {
+                    "identificationModule": {
+                        "nctId": "NCT12345678",
+                        "officialTitle": "Test Clinical Trial",
+                    },
+                    "descriptionModule": {"briefSummary": "Summary."},
+                },
+                "resultsSection": {"outcomeMeasuresModule": {}},
+            }
+        ]
+    }
+).encode()
+
+
+def current_thread_name() -> str:
+    return threading.current_thread().name
+
+
+class TestRunCpuBound:
+    """Test suite for offloading CPU-bound work to the worker pool."""
+
+    def test_small_inputs_run_inline(self, monkeypatch) -> None:
+        """Test that work below the size threshold stays on the calling thread."""
+        monkeypatch.setattr(workers, "WORKER_OFFLOAD_THRESHOLD", 100)
+
+        assert (
+            workers.run_cpu_bound(current_thread_name, size=10)
+            == threading.current_thread().name
+        )
+
+    def test_large_inputs_are_offloaded(self, monkeypatch) -> None:
+        """Test that work above the size threshold runs on the pool."""
+        monkeypatch.setattr(workers, "WORKER_OFFLOAD_THRESHOLD", 100)
+        with ThreadPoolExecutor(thread_name_prefix="test-pool") as pool:
+            monkeypatch.setattr(workers, "get_executor", lambda: pool)
+
+            assert workers.run_cpu_bound(current_thread_name, size=1000).startswith(
+                "test-pool"
+            )
+
+    def test_studies_payload_is_parsed_in_a_process_pool(self, monkeypatch) -> None:
+        """Test that raw response bytes can be parsed in a separate process."""
+        monkeypatch.setattr(workers, "WORKER_OFFLOAD_THRESHOLD", 0)
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            monkeypatch.setattr(workers, "get_executor", lambda: pool)
+
+            trials = workers.run_cpu_bound(
+                parse_studies_payload, PAYLOAD, size=len(PAYLOAD)
+            )
+
+        assert trials == [
+            ClinicalTrial(
+                "NCT12345678",
+                "Test Clinical Trial",
+                "Summary.",
+                {"outcomeMeasuresModule": {}},
+            )
+        ]